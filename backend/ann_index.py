@@ -0,0 +1,157 @@
+"""
+Approximate nearest-neighbour index over reduced movie embeddings.
+
+The TF-IDF matrix is reduced with TruncatedSVD to a small dense embedding and
+partitioned with spherical k-means into inverted lists (IVF). A profile query
+only scans the lists whose centroids are closest to it, so the cost grows with
+`n_probe * N / n_lists` instead of with the full catalog.
+"""
+
+import numpy as np
+from sklearn.decomposition import TruncatedSVD
+
+
+def _normalize_rows(x):
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return x / norms
+
+
+def _spherical_kmeans(embeddings, n_lists, n_iter, rng, max_train_size=50000):
+    """
+    Plain NumPy spherical k-means (cosine distance) on a sample of the rows.
+    """
+    if len(embeddings) > max_train_size:
+        train = embeddings[rng.choice(len(embeddings), max_train_size, replace=False)]
+    else:
+        train = embeddings
+
+    centroids = train[rng.choice(len(train), n_lists, replace=False)].copy()
+    for _ in range(n_iter):
+        assign = np.argmax(train @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, train)
+        counts = np.bincount(assign, minlength=n_lists)
+
+        # Re-seed empty lists with random rows so no list is wasted
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = train[rng.choice(len(train), int(empty.sum()), replace=False)]
+        centroids = _normalize_rows(sums)
+    return centroids
+
+
+def build_ann_index(tfidf_matrix, n_components=128, n_lists=None, n_iter=15, random_state=42):
+    """
+    Builds an IVF index over a TruncatedSVD embedding of `tfidf_matrix`.
+
+    Parameters:
+        tfidf_matrix (sparse matrix): Catalog TF-IDF rows, one per movie.
+        n_components (int): Dimension of the reduced embedding.
+        n_lists (int): Number of inverted lists, defaults to ~sqrt(N).
+        n_iter (int): k-means iterations.
+        random_state (int): Seed for SVD and k-means.
+
+    Returns:
+        dict: Index arrays, safe to joblib.dump.
+    """
+    n_movies, n_features = tfidf_matrix.shape
+    n_components = max(1, min(n_components, n_features - 1, n_movies - 1))
+    n_lists = n_lists or max(1, int(np.sqrt(n_movies)))
+    n_lists = min(n_lists, n_movies)
+
+    svd = TruncatedSVD(n_components=n_components, random_state=random_state)
+    embeddings = _normalize_rows(svd.fit_transform(tfidf_matrix)).astype(np.float32)
+
+    rng = np.random.default_rng(random_state)
+    centroids = _spherical_kmeans(embeddings, n_lists, n_iter, rng).astype(np.float32)
+
+    assign = np.argmax(embeddings @ centroids.T, axis=1)
+    list_items = np.argsort(assign, kind="stable").astype(np.int32)
+    list_offsets = np.searchsorted(assign[list_items], np.arange(n_lists + 1))
+
+    return {
+        "components": svd.components_.astype(np.float32),
+        "embeddings": embeddings,
+        "centroids": centroids,
+        "list_items": list_items,
+        "list_offsets": list_offsets,
+    }
+
+
+def project(index, vector):
+    """
+    Maps a TF-IDF space vector (dense 1-D or 1xV sparse) into the index space.
+    """
+    if hasattr(vector, "toarray"):
+        q = np.asarray(vector @ index["components"].T).ravel()
+    else:
+        q = index["components"] @ np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(q)
+    return (q / norm if norm else q).astype(np.float32)
+
+
+def search(index, vector, k, n_probe=8):
+    """
+    Returns the (approximate) k movies closest to `vector`.
+
+    Parameters:
+        index (dict): Output of `build_ann_index`.
+        vector: Query in TF-IDF space.
+        k (int): Number of neighbours to return.
+        n_probe (int): Number of inverted lists to scan.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Movie indices and embedding similarities,
+        best first.
+    """
+    q = project(index, vector)
+    centroids = index["centroids"]
+    n_probe = min(n_probe, len(centroids))
+
+    closest_lists = np.argpartition(-(centroids @ q), n_probe - 1)[:n_probe]
+    offsets, items = index["list_offsets"], index["list_items"]
+    candidates = np.concatenate([items[offsets[l]:offsets[l + 1]] for l in closest_lists])
+    if len(candidates) == 0:
+        return candidates, np.zeros(0, dtype=np.float32)
+
+    sims = index["embeddings"][candidates] @ q
+    k = min(k, len(candidates))
+    top = np.argpartition(-sims, k - 1)[:k]
+    top = top[np.argsort(-sims[top])]
+    return candidates[top], sims[top]
+
+
+def add_items(index, rows, positions):
+    """
+    Returns a copy of `index` with movies inserted or re-embedded, using the
+    existing SVD projection and centroids (no retraining).
+
+    Parameters:
+        index (dict): Output of `build_ann_index`.
+        rows (sparse matrix): TF-IDF rows of the new or changed movies.
+        positions (np.ndarray): Catalog index of each row; positions past the
+            end of the index are appended.
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    n_lists = len(index["centroids"])
+    offsets = index["list_offsets"]
+
+    n_movies = max(len(index["embeddings"]), int(positions.max()) + 1 if len(positions) else 0)
+    embeddings = np.zeros((n_movies, index["embeddings"].shape[1]), dtype=np.float32)
+    embeddings[:len(index["embeddings"])] = index["embeddings"]
+    assign = np.zeros(n_movies, dtype=np.int64)
+    assign[index["list_items"]] = np.repeat(np.arange(n_lists), np.diff(offsets))
+
+    if len(positions):
+        new_embeddings = _normalize_rows(np.asarray(rows @ index["components"].T)).astype(np.float32)
+        embeddings[positions] = new_embeddings
+        assign[positions] = np.argmax(new_embeddings @ index["centroids"].T, axis=1)
+
+    list_items = np.argsort(assign, kind="stable").astype(np.int32)
+    return {
+        **index,
+        "embeddings": embeddings,
+        "list_items": list_items,
+        "list_offsets": np.searchsorted(assign[list_items], np.arange(n_lists + 1)),
+    }
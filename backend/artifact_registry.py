@@ -0,0 +1,236 @@
+"""
+Versioned artifact registry.
+
+Every published catalog gets its own directory under `artifacts/versions/`
+holding the joblib bundle and a manifest with its checksum. A one-line
+`artifacts/CURRENT` file names the version workers should serve; it is only
+ever replaced atomically, so publishing and rolling back are a single rename.
+
+Workers poll CURRENT, load and validate a changed version in the background
+and then swap it in (see main.reload_catalog).
+
+Run from backend/:
+    python artifact_registry.py list
+    python artifact_registry.py rollback [--to v000003]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime
+
+import joblib
+import numpy as np
+
+import quantized_features
+from hashing_features import feature_count, text_features_mode
+
+ARTIFACTS_DIR = os.getenv("ARTIFACTS_DIR", "./artifacts")
+# Published versions kept on disk besides the current one (0 = keep all)
+ARTIFACT_KEEP_VERSIONS = int(os.getenv("ARTIFACT_KEEP_VERSIONS", "5"))
+
+BUNDLE_NAME = "catalog.joblib"
+MANIFEST_NAME = "manifest.json"
+
+
+def versions_dir(root=ARTIFACTS_DIR):
+    return os.path.join(root, "versions")
+
+
+def version_label(version):
+    return f"v{version:06d}"
+
+
+def label_version(label):
+    return int(label.lstrip("v"))
+
+
+def write_atomic(path, data):
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def list_versions(root=ARTIFACTS_DIR):
+    """
+    Returns the labels of all complete (manifest written) versions, oldest first.
+    """
+    if not os.path.isdir(versions_dir(root)):
+        return []
+    return sorted(
+        label for label in os.listdir(versions_dir(root))
+        if label.startswith("v") and os.path.exists(os.path.join(versions_dir(root), label, MANIFEST_NAME))
+    )
+
+
+def current_label(root=ARTIFACTS_DIR):
+    try:
+        with open(os.path.join(root, "CURRENT")) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def read_manifest(label, root=ARTIFACTS_DIR):
+    with open(os.path.join(versions_dir(root), label, MANIFEST_NAME)) as f:
+        return json.load(f)
+
+
+def set_current(label, root=ARTIFACTS_DIR):
+    if label not in list_versions(root):
+        raise ValueError(f"Unknown artifact version: {label}")
+    write_atomic(os.path.join(root, "CURRENT"), label + "\n")
+
+
+def publish(catalog, root=ARTIFACTS_DIR, make_current=True):
+    """
+    Writes `catalog` as the next version and (by default) points CURRENT at it.
+    The catalog's version number is set to the new version's.
+
+    Returns:
+        str: Label of the published version.
+    """
+    existing = list_versions(root)
+    version = label_version(existing[-1]) + 1 if existing else 1
+    label = version_label(version)
+    catalog.version = version
+
+    # Write into a staging directory and rename it, so a crash never leaves a
+    # half-written version that looks complete
+    staging = os.path.join(versions_dir(root), f".{label}.tmp-{os.getpid()}")
+    os.makedirs(staging, exist_ok=True)
+    bundle_path = os.path.join(staging, BUNDLE_NAME)
+    joblib.dump(catalog, bundle_path)
+    manifest = {
+        "version": version,
+        "created_at": datetime.utcnow().isoformat(),
+        "movies": len(catalog.movies),
+        "features": int(catalog.tfidf_matrix.shape[1]),
+        "vocabulary_id": catalog.vocabulary_id,
+        "text_features": text_features_mode(catalog.tfidf),
+        "precision": quantized_features.precision_of(catalog.tfidf_matrix),
+        "ann_index": catalog.ann_index is not None,
+        "sha256": file_sha256(bundle_path),
+    }
+    with open(os.path.join(staging, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(staging, os.path.join(versions_dir(root), label))
+
+    if make_current:
+        set_current(label, root)
+    prune(root)
+    return label
+
+
+def validate(catalog, manifest):
+    """
+    Raises ValueError if a loaded catalog is inconsistent with itself or with
+    its manifest, or cannot score a query.
+    """
+    n_movies, n_features = catalog.tfidf_matrix.shape
+    if n_movies != len(catalog.movies) or n_movies != manifest["movies"]:
+        raise ValueError(f"matrix has {n_movies} rows for {len(catalog.movies)} movies")
+    if n_features != feature_count(catalog.tfidf) or n_features != manifest["features"]:
+        raise ValueError(f"matrix has {n_features} columns for {feature_count(catalog.tfidf)} terms")
+    if catalog.vocabulary_id != manifest["vocabulary_id"]:
+        raise ValueError("vocabulary does not match the manifest")
+    if catalog.ann_index is not None and len(catalog.ann_index["embeddings"]) != n_movies:
+        raise ValueError("ANN index does not cover the catalog")
+    if not catalog.movies['weighted_rating_norm'].notnull().all():
+        raise ValueError("missing rating normalization")
+    if n_movies:
+        # Score the first movie against the catalog; nothing may beat itself
+        # by more than the stored precision allows
+        row = quantized_features.dequantize(catalog.tfidf_matrix[0])
+        sims = quantized_features.dot(catalog.tfidf_matrix, row.toarray().ravel())
+        tolerance = quantized_features.SCORE_TOLERANCE[quantized_features.precision_of(catalog.tfidf_matrix)]
+        if not np.isfinite(sims).all() or (row.nnz and sims[0] < sims.max() - tolerance):
+            raise ValueError("self-similarity check failed")
+
+
+def load_version(label, root=ARTIFACTS_DIR):
+    """
+    Loads and validates a published version.
+
+    Returns:
+        Catalog: The loaded catalog, with `version` matching the label.
+    """
+    manifest = read_manifest(label, root)
+    bundle_path = os.path.join(versions_dir(root), label, BUNDLE_NAME)
+    if file_sha256(bundle_path) != manifest["sha256"]:
+        raise ValueError(f"{label}: checksum mismatch")
+    catalog = joblib.load(bundle_path)
+    catalog.version = manifest["version"]
+    try:
+        validate(catalog, manifest)
+    except ValueError as e:
+        raise ValueError(f"{label}: {e}")
+    return catalog
+
+
+def load_current(root=ARTIFACTS_DIR):
+    label = current_label(root)
+    return (label, load_version(label, root)) if label else (None, None)
+
+
+def rollback(to=None, root=ARTIFACTS_DIR):
+    """
+    Points CURRENT at `to`, or at the version published before the current one.
+    The target is validated first so a rollback can't install a broken version.
+
+    Returns:
+        str: Label now current.
+    """
+    versions = list_versions(root)
+    current = current_label(root)
+    if to is None:
+        older = [label for label in versions if current is None or label < current]
+        if not older:
+            raise ValueError("No earlier version to roll back to")
+        to = older[-1]
+    load_version(to, root)
+    set_current(to, root)
+    return to
+
+
+def prune(root=ARTIFACTS_DIR, keep=ARTIFACT_KEEP_VERSIONS):
+    if keep <= 0:
+        return
+    current = current_label(root)
+    for label in [label for label in list_versions(root) if label != current][:-keep]:
+        shutil.rmtree(os.path.join(versions_dir(root), label), ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="list published versions")
+    rollback_parser = commands.add_parser("rollback", help="serve an earlier version")
+    rollback_parser.add_argument("--to", help="version label, defaults to the one before CURRENT")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        current = current_label()
+        for label in list_versions():
+            manifest = read_manifest(label)
+            print(f"{'*' if label == current else ' '} {label}  {manifest['created_at']}  "
+                  f"{manifest['movies']} movies  vocabulary {manifest['vocabulary_id']}")
+    else:
+        print(f"✅ CURRENT -> {rollback(args.to)}")
+
+
+if __name__ == "__main__":
+    main()
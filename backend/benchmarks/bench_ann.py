@@ -0,0 +1,101 @@
+"""
+Recall-versus-latency benchmark of the ANN index against the exact scan.
+
+Run from backend/:
+    python -m benchmarks.bench_ann                       # uses ./artifacts/tfidf_matrix.joblib
+    python -m benchmarks.bench_ann --synthetic 200000    # random sparse catalog
+"""
+
+import argparse
+import time
+
+import joblib
+import numpy as np
+import scipy.sparse as sp
+from sklearn.preprocessing import normalize
+
+from ann_index import build_ann_index, search
+
+
+def synthetic_tfidf(n_movies, n_features=20000, terms_per_movie=40, n_topics=200, seed=0):
+    """
+    Random L2-normalized sparse rows drawn from a few hundred "topics", so the
+    catalog has neighbourhood structure like real TF-IDF data.
+    """
+    rng = np.random.default_rng(seed)
+    topic_terms = rng.integers(0, n_features, size=(n_topics, terms_per_movie * 2))
+    topics = rng.integers(0, n_topics, size=n_movies)
+    picks = rng.integers(0, terms_per_movie * 2, size=(n_movies, terms_per_movie))
+    cols = np.take_along_axis(topic_terms[topics], picks, axis=1).ravel()
+    rows = np.repeat(np.arange(n_movies), terms_per_movie)
+    data = rng.random(len(cols)).astype(np.float32)
+    matrix = sp.csr_matrix((data, (rows, cols)), shape=(n_movies, n_features))
+    matrix.sum_duplicates()
+    return normalize(matrix)
+
+
+def exact_top_k(tfidf_matrix, profile, k):
+    sims = tfidf_matrix @ profile
+    top = np.argpartition(-sims, k - 1)[:k]
+    return top[np.argsort(-sims[top])]
+
+
+def percentile_ms(samples, q):
+    return np.percentile(samples, q) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--synthetic", type=int, default=0, help="Generate a synthetic catalog of this size")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=50)
+    parser.add_argument("--components", type=int, default=128)
+    parser.add_argument("--lists", type=int, default=0)
+    parser.add_argument("--probes", default="1,2,4,8,16,32")
+    parser.add_argument("--shortlist", type=int, default=10, help="Candidates reranked exactly, as a multiple of k")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        tfidf_matrix = synthetic_tfidf(args.synthetic)
+    else:
+        tfidf_matrix = joblib.load("./artifacts/tfidf_matrix.joblib")
+    tfidf_matrix = sp.csr_matrix(tfidf_matrix)
+    n_movies = tfidf_matrix.shape[0]
+    print(f"Catalog: {n_movies} movies x {tfidf_matrix.shape[1]} features")
+
+    start = time.perf_counter()
+    index = build_ann_index(tfidf_matrix, n_components=args.components, n_lists=args.lists or None)
+    print(f"Index build: {time.perf_counter() - start:.1f}s, {len(index['centroids'])} lists")
+
+    # Query profiles look like real ones: the mean of a few watched movies
+    rng = np.random.default_rng(1)
+    profiles = []
+    for _ in range(args.queries):
+        watched = rng.choice(n_movies, rng.integers(1, 6), replace=False)
+        profiles.append(np.asarray(tfidf_matrix[watched].mean(axis=0)).ravel())
+
+    exact_times, truth = [], []
+    for profile in profiles:
+        start = time.perf_counter()
+        truth.append(exact_top_k(tfidf_matrix, profile, args.k))
+        exact_times.append(time.perf_counter() - start)
+    print(f"\n{'mode':>12} {'recall@' + str(args.k):>10} {'p50 ms':>8} {'p95 ms':>8} {'speedup':>8}")
+    print(f"{'exact':>12} {1.0:>10.3f} {percentile_ms(exact_times, 50):>8.2f} {percentile_ms(exact_times, 95):>8.2f} {1.0:>8.1f}")
+
+    for n_probe in (int(p) for p in args.probes.split(",")):
+        ann_times, recalls = [], []
+        for profile, expected in zip(profiles, truth):
+            start = time.perf_counter()
+            # Same two-stage path as model.profile_candidates: ANN shortlist, exact rerank
+            candidates, _ = search(index, profile, args.shortlist * args.k, n_probe=n_probe)
+            sims = tfidf_matrix[candidates] @ profile
+            found = candidates[np.argsort(-sims)[:args.k]]
+            ann_times.append(time.perf_counter() - start)
+            recalls.append(len(np.intersect1d(found, expected)) / len(expected))
+        speedup = np.median(exact_times) / np.median(ann_times)
+        print(f"{'ivf/' + str(n_probe):>12} {np.mean(recalls):>10.3f} {percentile_ms(ann_times, 50):>8.2f} "
+              f"{percentile_ms(ann_times, 95):>8.2f} {speedup:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Hashed versus fitted-vocabulary text features: footprint, speed and ranking quality.
+
+Both modes are fitted on the same catalog text. For each one the report lists
+the pickled vectorizer size and load time, the matrix width and the query
+transform latency. Ranking quality is the overlap of the hashed mode's top k
+with the fitted mode's top k, for profile queries (the mean of a few watched
+movies, as in the history and blend recommenders) and for descriptive text
+queries (as in voice search).
+
+Run from backend/:
+    python -m benchmarks.bench_features                        # catalog from ./data
+    python -m benchmarks.bench_features --synthetic 200000     # synthetic catalog
+    python -m benchmarks.bench_features --hash-features 65536,262144,1048576
+"""
+
+import argparse
+import pickle
+import time
+
+import numpy as np
+
+import columnar
+from catalog import CATALOG_SOURCE_PATH, combined_text, make_vectorizer, prepare_movies
+
+
+def load_texts(args):
+    if args.synthetic:
+        from benchmarks.synthetic import generate_catalog
+        return prepare_movies(generate_catalog(args.synthetic, seed=0))['combined']
+    columns, schema = columnar.load_columns(columnar.ensure_columns(args.csv))
+    return combined_text(columnar.catalog_frame(columns, schema))
+
+
+def top_k(matrix, query, k):
+    sims = matrix @ query
+    top = np.argpartition(-sims, k - 1)[:k]
+    return top[np.argsort(-sims[top], kind='stable')]
+
+
+def overlap(found, expected):
+    return len(np.intersect1d(found, expected)) / len(expected) if len(expected) else 1.0
+
+
+def profile_queries(n_movies, n_queries, rng):
+    return [rng.choice(n_movies, rng.integers(1, 6), replace=False) for _ in range(n_queries)]
+
+
+def text_queries(texts, n_queries, rng):
+    queries = []
+    for i in rng.choice(len(texts), n_queries):
+        words = texts.iloc[i].split()
+        start = rng.integers(max(len(words) - 4, 1))
+        queries.append(" ".join(words[start:start + 4]))
+    return queries
+
+
+def fit_mode(mode, texts, n_features):
+    vectorizer = make_vectorizer(mode, n_features)
+    start = time.perf_counter()
+    matrix = vectorizer.fit_transform(texts).tocsr()
+    fit_seconds = time.perf_counter() - start
+    blob = pickle.dumps(vectorizer)
+    start = time.perf_counter()
+    pickle.loads(blob)
+    load_seconds = time.perf_counter() - start
+    return vectorizer, matrix, {"fit_s": fit_seconds, "pickle_mb": len(blob) / 2 ** 20, "load_ms": load_seconds * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default=CATALOG_SOURCE_PATH)
+    parser.add_argument("--synthetic", type=int, default=0, help="Generate a synthetic catalog of this size")
+    parser.add_argument("--hash-features", default="262144", help="Comma-separated hashed widths to compare")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=20)
+    args = parser.parse_args()
+
+    texts = load_texts(args).reset_index(drop=True)
+    rng = np.random.default_rng(1)
+    profiles = profile_queries(len(texts), args.queries, rng)
+    queries = text_queries(texts, args.queries, rng)
+    print(f"Catalog: {len(texts)} movies, {args.queries} profile and {args.queries} text queries, k={args.k}")
+
+    modes = [("tfidf", None)] + [("hashing", int(n)) for n in args.hash_features.split(",")]
+    truth = None
+    print(f"\n{'mode':>16} {'columns':>9} {'fit s':>7} {'pickle MB':>10} {'load ms':>8} {'query ms':>9} "
+          f"{'profile@k':>10} {'text@k':>8}")
+    for mode, n_features in modes:
+        vectorizer, matrix, stats = fit_mode(mode, texts, n_features or 0)
+
+        start = time.perf_counter()
+        query_vectors = [vectorizer.transform([q]) for q in queries]
+        query_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+        ranked = {
+            "profile": [top_k(matrix, np.asarray(matrix[watched].mean(axis=0)).ravel(), args.k) for watched in profiles],
+            "text": [top_k(matrix, vector.toarray().ravel(), args.k) for vector in query_vectors],
+        }
+        if truth is None:
+            truth = ranked
+        quality = {kind: np.mean([overlap(f, e) for f, e in zip(ranked[kind], truth[kind])]) for kind in ranked}
+        label = mode if n_features is None else f"{mode}/{n_features}"
+        print(f"{label:>16} {matrix.shape[1]:>9} {stats['fit_s']:>7.2f} {stats['pickle_mb']:>10.2f} "
+              f"{stats['load_ms']:>8.1f} {query_ms:>9.3f} {quality['profile']:>10.3f} {quality['text']:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
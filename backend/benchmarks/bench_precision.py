@@ -0,0 +1,91 @@
+"""
+Stored feature precision: memory saved and how rankings change.
+
+The TF-IDF matrix is fitted once and stored as float64, float32 and int8
+with per-row scales (see quantized_features.py). For each precision the
+report lists the bytes held by the matrix (and by the dense content
+similarity matrix, for catalogs small enough to build one), the latency of
+a full-catalog profile scan, the top-k overlap with float64 for profile
+queries (as in the history and blend recommenders) and text queries (through
+the inverted index, as in voice search), and the largest score error.
+
+Run from backend/:
+    python -m benchmarks.bench_precision                        # catalog from ./data
+    python -m benchmarks.bench_precision --synthetic 200000     # synthetic catalog
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+import quantized_features
+from benchmarks.bench_features import load_texts, overlap, profile_queries, text_queries
+from catalog import CATALOG_SOURCE_PATH, make_vectorizer
+from text_index import TextIndex
+
+
+def text_top_k(index, query_vector, k):
+    docs, scores = index.text_scores(query_vector)
+    sims = np.zeros(index.n_movies)
+    sims[docs] = scores
+    return top_k_of(sims, k), sims
+
+
+def top_k_of(sims, k):
+    top = np.argpartition(-sims, k - 1)[:k]
+    return top[np.argsort(-sims[top], kind='stable')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default=CATALOG_SOURCE_PATH)
+    parser.add_argument("--synthetic", type=int, default=0, help="Generate a synthetic catalog of this size")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--content-sim-limit", type=int, default=10000,
+                        help="Largest catalog to build the dense content similarity matrix for")
+    args = parser.parse_args()
+
+    texts = load_texts(args).reset_index(drop=True)
+    vectorizer = make_vectorizer()
+    full = vectorizer.fit_transform(texts).tocsr()
+    rng = np.random.default_rng(1)
+    profiles = [np.asarray(full[watched].mean(axis=0)).ravel() for watched in profile_queries(len(texts), args.queries, rng)]
+    queries = [vectorizer.transform([q]) for q in text_queries(texts, args.queries, rng)]
+    content_sim = (full @ full.T).toarray() if len(texts) <= args.content_sim_limit else None
+    ratings = np.zeros(len(texts))
+    print(f"Catalog: {len(texts)} movies x {full.shape[1]} features, {full.nnz} weights, "
+          f"{args.queries} profile and {args.queries} text queries, k={args.k}")
+
+    truth = None
+    print(f"\n{'precision':>10} {'matrix MB':>10} {'saved':>6} {'sim MB':>8} {'scan ms':>8} "
+          f"{'profile@k':>10} {'text@k':>8} {'max err':>9}")
+    for precision in quantized_features.PRECISIONS:
+        matrix = quantized_features.quantize(full, precision)
+        index = TextIndex({'Keywords': [], 'Genres': []}, matrix, ratings)
+
+        start = time.perf_counter()
+        profile_sims = [quantized_features.cosine_to(matrix, profile) for profile in profiles]
+        scan_ms = (time.perf_counter() - start) / len(profiles) * 1000
+        text = [text_top_k(index, query, args.k) for query in queries]
+
+        ranked = {
+            "profile": [top_k_of(sims, args.k) for sims in profile_sims],
+            "text": [found for found, _ in text],
+        }
+        scores = profile_sims + [sims for _, sims in text]
+        if truth is None:
+            truth, truth_scores, full_bytes = ranked, scores, quantized_features.nbytes(matrix)
+        quality = {kind: np.mean([overlap(f, e) for f, e in zip(ranked[kind], truth[kind])]) for kind in ranked}
+        error = max(np.abs(s - t).max() for s, t in zip(scores, truth_scores))
+        matrix_bytes = quantized_features.nbytes(matrix)
+        sim_mb = "-"
+        if content_sim is not None:
+            sim_mb = f"{quantized_features.nbytes(quantized_features.quantize(content_sim, precision)) / 2 ** 20:.1f}"
+        print(f"{precision:>10} {matrix_bytes / 2 ** 20:>10.2f} {1 - matrix_bytes / full_bytes:>6.0%} {sim_mb:>8} "
+              f"{scan_ms:>8.2f} {quality['profile']:>10.3f} {quality['text']:>8.3f} {error:>9.2e}")
+
+
+if __name__ == "__main__":
+    main()
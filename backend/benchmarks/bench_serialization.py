@@ -0,0 +1,117 @@
+"""
+Serialization cost per 100 recommendations: the old iterrows + Pydantic path
+against the column-wise + orjson fast path used by the recommendation routes.
+
+Run from backend/:
+    python -m benchmarks.bench_serialization
+"""
+
+import argparse
+import json
+import timeit
+from typing import List
+
+import numpy as np
+import orjson
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+
+# Same shape as main.MovieRecommendation / main.HistoryRecommendationResponse
+class MovieRecommendation(BaseModel):
+    title: str
+    score: float
+    genres: List[str]
+    poster_path: str
+    release_date: str
+
+
+class HistoryRecommendationResponse(BaseModel):
+    recommendations: List[MovieRecommendation]
+    overall_match_score: str
+
+
+def synthetic_movies(n_movies, seed=0):
+    rng = np.random.default_rng(seed)
+    genres = ["action", "comedy", "drama", "horror", "romance", "thriller", "family", "documentary"]
+    return pd.DataFrame({
+        "title": [f"Movie {i}" for i in range(n_movies)],
+        "Genres": [list(rng.choice(genres, rng.integers(1, 4), replace=False)) for _ in range(n_movies)],
+        "poster_path": [f"/poster{i}.jpg" for i in range(n_movies)],
+        "release_date": [f"{rng.integers(1970, 2025)}-01-01" for _ in range(n_movies)],
+    })
+
+
+def old_path(movies, indices, scores):
+    # Per-row dicts from iterrows, response_model validation, jsonable_encoder + json.dumps
+    top = movies.iloc[indices].assign(score=scores)
+    content = {
+        "recommendations": [
+            {
+                "title": row["title"],
+                "score": round(row["score"], 4),
+                "genres": row["Genres"],
+                "poster_path": row["poster_path"],
+                "release_date": row["release_date"]
+            }
+            for _, row in top.iterrows()
+        ],
+        "overall_match_score": "50.0%"
+    }
+    validated = HistoryRecommendationResponse.model_validate(content)
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+def fast_path(columns, indices, scores):
+    # Same construction as model.format_ranked_movies + ORJSONResponse
+    titles, genres = columns["title"], columns["genres"]
+    poster_paths, release_dates = columns["poster_path"], columns["release_date"]
+    content = {
+        "recommendations": [
+            {
+                "title": titles[i],
+                "genres": genres[i],
+                "score": score,
+                "poster_path": poster_paths[i],
+                "release_date": release_dates[i]
+            }
+            for i, score in zip(indices.tolist(), np.round(scores, 4).tolist())
+        ],
+        "overall_match_score": "50.0%"
+    }
+    return orjson.dumps(content)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--catalog", type=int, default=10000)
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    movies = synthetic_movies(args.catalog)
+    columns = {
+        "title": movies["title"].tolist(),
+        "genres": movies["Genres"].tolist(),
+        "poster_path": movies["poster_path"].tolist(),
+        "release_date": movies["release_date"].tolist(),
+    }
+    rng = np.random.default_rng(1)
+    indices = rng.choice(args.catalog, args.items, replace=False)
+    scores = rng.random(args.items)
+
+    # Both paths must produce the same public payload
+    assert json.loads(old_path(movies, indices, scores)) == json.loads(fast_path(columns, indices, scores))
+
+    per_100 = 100 / args.items
+    old = min(timeit.repeat(lambda: old_path(movies, indices, scores), number=args.repeat, repeat=3)) / args.repeat
+    fast = min(timeit.repeat(lambda: fast_path(columns, indices, scores), number=args.repeat, repeat=3)) / args.repeat
+    print(f"{'path':>22} {'us / 100 items':>16}")
+    print(f"{'iterrows + pydantic':>22} {old * per_100 * 1e6:>16.1f}")
+    print(f"{'columns + orjson':>22} {fast * per_100 * 1e6:>16.1f}")
+    print(f"{'speedup':>22} {old / fast:>16.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""
+Benchmark harness for the recommenders and the API routes.
+
+Each catalog scale runs in a fresh worker process, which:
+  1. writes a synthetic catalog (benchmarks/synthetic.py) into a scratch
+     directory and builds the artifacts by importing model.py there,
+  2. microbenchmarks every recommender function,
+  3. load-tests every recommendation/history/blend/search route in-process
+     through httpx's ASGI transport, against a scratch SQLite database.
+
+Latencies are reported as p50/p95/p99 in milliseconds together with the
+worker's peak RSS. Results are written to benchmarks/results/ and compared
+against benchmarks/baseline.json when it exists.
+
+Run from backend/ (needs the backend requirements plus httpx):
+    python -m benchmarks.run --scales 10000
+    python -m benchmarks.run --scales 10000,100000,500000 --save-baseline
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(BACKEND_DIR, "benchmarks")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+MOODS = ["happy", "sad", "thrilled", "scared", "curious", "nostalgic", "anxious", "bored"]
+
+
+def summarize(samples):
+    ms = np.asarray(samples) * 1000
+    return {
+        "n": len(ms),
+        "mean": float(ms.mean()),
+        "p50": float(np.percentile(ms, 50)),
+        "p95": float(np.percentile(ms, 95)),
+        "p99": float(np.percentile(ms, 99)),
+    }
+
+
+def measure(fn, iterations, time_budget):
+    """
+    Calls fn(i) up to `iterations` times, stopping early once `time_budget`
+    seconds are spent (after at least 3 samples).
+    """
+    samples = []
+    deadline = time.perf_counter() + time_budget
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - start)
+        if time.perf_counter() > deadline and len(samples) >= 3:
+            break
+    return summarize(samples)
+
+
+def bench_functions(model, histories, catalog, args):
+    titles = [[title for _, title, _ in history] for history in histories.values()]
+    overviews = catalog["overview"].dropna().to_numpy()
+    rng = np.random.default_rng(2)
+    queries = []
+    for i in range(64):
+        words = " ".join(overviews[rng.integers(len(overviews))].split()[:4])
+        queries.append(f"something like {words}" if i % 2 else f"a {MOODS[i % 8]} movie about {words}")
+
+    # Members without a catalog movie are left out of a blend, not an error
+    unmatched = ["no such movie in the catalog"]
+    assert model.recommend_blend([titles[0], unmatched]) == model.recommend_blend([titles[0]])
+    assert model.recommend_blend([unmatched, unmatched]) == []
+
+    functions = {
+        "recommend_movies_by_mood": lambda i: model.recommend_movies_by_mood(
+            MOODS[i % len(MOODS)], user_history_titles=titles[i % len(titles)], top_n=20
+        ),
+        "recommend_for_user": lambda i: model.recommend_for_user(titles[i % len(titles)], top_n=20),
+        "recommend_blend": lambda i: model.recommend_blend(
+            [titles[(i + k) % len(titles)] for k in range(3)], top_n=50
+        ),
+        "enhanced_descriptive_recommendation": lambda i: model.enhanced_descriptive_recommendation(
+            queries[i % len(queries)], model.movies, model.tfidf, model.tfidf_matrix,
+            user_history_titles=titles[i % len(titles)], top_n=10
+        ),
+        "assign_tag_from_movie_history": lambda i: model.assign_tag_from_movie_history(titles[i % len(titles)]),
+    }
+    results = {}
+    for name, fn in functions.items():
+        results[name] = measure(fn, args.iterations, args.time_budget)
+        print(f"  {name}: p50 {results[name]['p50']:.1f} ms", flush=True)
+    return results
+
+
+async def load_test(make_request, requests, concurrency, time_budget):
+    latencies, errors = [], 0
+    counter = itertools.count()
+    deadline = time.perf_counter() + time_budget
+
+    async def worker():
+        nonlocal errors
+        while True:
+            i = next(counter)
+            if i >= requests or (time.perf_counter() > deadline and len(latencies) >= 3):
+                return
+            start = time.perf_counter()
+            response = await make_request(i)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    result = summarize(latencies)
+    result["errors"] = errors
+    result["rps"] = len(latencies) / elapsed if elapsed else 0.0
+    return result
+
+
+async def seed_database(main, histories):
+    """
+    Inserts users, watch histories and one blend straight into the database and
+    returns (auth headers per user, blend code).
+    """
+    hashed = main.hash_password("bench")
+    headers = []
+    for user, history in histories.items():
+        user_id = f"bench-{user}"
+        await main.database.execute(main.users.insert().values(id=user_id, username=user_id, hashed_password=hashed))
+        await main.database.execute_many(
+            main.watch_history.insert(),
+            [
+                {"id": str(uuid.uuid4()), "user_id": user_id, "movie_id": movie_id,
+                 "movie_name": title, "watched_at": watched_at}
+                for movie_id, title, watched_at in history
+            ],
+        )
+        headers.append({"Authorization": f"Bearer {main.create_token(user_id)}"})
+
+    blend_code = "benchbl"
+    await main.database.execute(main.blends.insert().values(code=blend_code, creator_id="bench-0", name="bench"))
+    for user in range(min(3, len(histories))):
+        await main.database.execute(
+            main.blend_members.insert().values(id=str(uuid.uuid4()), blend_code=blend_code, user_id=f"bench-{user}")
+        )
+    return headers, blend_code
+
+
+async def bench_routes(main, histories, catalog, args):
+    import httpx
+
+    await main.startup()
+    try:
+        headers, blend_code = await seed_database(main, histories)
+        blend_headers = headers[:3]
+        movie_ids = catalog["Movie_id"].astype(str).to_numpy()
+        search_terms = [title.split()[0].lower() for title in catalog["title"].to_numpy()[:64]]
+
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            routes = {
+                "POST /recommend": lambda i: client.post(
+                    "/recommend", json={"mood": MOODS[i % len(MOODS)], "top_n": 20}, headers=headers[i % len(headers)]
+                ),
+                "POST /recommend/history": lambda i: client.post(
+                    "/recommend/history", json={"top_n": 20}, headers=headers[i % len(headers)]
+                ),
+                "GET /blend/{code}": lambda i: client.get(
+                    f"/blend/{blend_code}", headers=blend_headers[i % len(blend_headers)]
+                ),
+                "GET /history": lambda i: client.get("/history", headers=headers[i % len(headers)]),
+                "POST /history/add": lambda i: client.post(
+                    "/history/add",
+                    json={"movie_id": movie_ids[i % len(movie_ids)], "movie_name": f"movie {i}"},
+                    headers=headers[i % len(headers)],
+                ),
+                "GET /search": lambda i: client.get("/search", params={"title": search_terms[i % len(search_terms)]}),
+            }
+            results = {}
+            for name, make_request in routes.items():
+                results[name] = await load_test(make_request, args.requests, args.concurrency, args.time_budget)
+                print(f"  {name}: p50 {results[name]['p50']:.1f} ms, {results[name]['rps']:.1f} req/s", flush=True)
+            return results
+    finally:
+        await main.shutdown()
+
+
+def run_worker(args):
+    """
+    Runs every benchmark for one scale inside `args.workdir` and writes the
+    results to `args.out`.
+    """
+    sys.path.insert(0, BACKEND_DIR)
+    from benchmarks.synthetic import generate_catalog, generate_histories, write_catalog
+
+    print(f"[{args.scale} movies] generating catalog", flush=True)
+    catalog = generate_catalog(args.scale, seed=args.seed)
+    write_catalog(catalog, os.path.join(args.workdir, "data", "10000 Movies Data"))
+    os.makedirs(os.path.join(args.workdir, "artifacts"), exist_ok=True)
+    histories = generate_histories(catalog, args.users, seed=args.seed + 1)
+
+    os.chdir(args.workdir)
+    os.environ["DATABASE_URL"] = "sqlite:///./bench.db"
+    # The dense N x N similarity matrix does not fit in memory at large scales
+    os.environ.setdefault("BUILD_CONTENT_SIM", "true" if args.scale <= 20000 else "false")
+
+    print(f"[{args.scale} movies] building artifacts", flush=True)
+    start = time.perf_counter()
+    import model
+    build_seconds = time.perf_counter() - start
+    rss_after_build = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    print(f"[{args.scale} movies] recommender functions", flush=True)
+    functions = bench_functions(model, histories, catalog, args)
+
+    print(f"[{args.scale} movies] API routes", flush=True)
+    import main
+    routes = asyncio.run(bench_routes(main, histories, catalog, args))
+
+    results = {
+        "scale": args.scale,
+        "users": args.users,
+        "artifact_build_s": build_seconds,
+        "rss_after_build_mb": rss_after_build,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "functions": functions,
+        "routes": routes,
+    }
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+def compare(current, baseline, threshold):
+    """
+    Prints one line per benchmark with the change against the baseline and
+    returns the number of regressions above `threshold` (a fraction).
+    """
+    regressions = 0
+    base_by_scale = {r["scale"]: r for r in baseline.get("results", [])} if baseline else {}
+    for result in current:
+        base = base_by_scale.get(result["scale"], {})
+        print(f"\n=== {result['scale']} movies: build {result['artifact_build_s']:.1f}s, "
+              f"peak RSS {result['peak_rss_mb']:.0f} MB"
+              + (f" (baseline {base['peak_rss_mb']:.0f} MB)" if base else "") + " ===")
+        print(f"{'benchmark':<38} {'p50':>9} {'p95':>9} {'p99':>9} {'vs base p50':>12} {'vs base p95':>12}")
+        for group in ("functions", "routes"):
+            for name, stats in result[group].items():
+                base_stats = base.get(group, {}).get(name)
+                deltas = []
+                for key in ("p50", "p95"):
+                    if base_stats and base_stats[key] > 0:
+                        delta = stats[key] / base_stats[key] - 1
+                        regressed = delta > threshold
+                        regressions += regressed
+                        deltas.append(f"{delta:+.0%}" + (" !" if regressed else ""))
+                    else:
+                        deltas.append("-")
+                print(f"{name:<38} {stats['p50']:>9.2f} {stats['p95']:>9.2f} {stats['p99']:>9.2f} "
+                      f"{deltas[0]:>12} {deltas[1]:>12}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="10000,100000,500000", help="Comma-separated catalog sizes")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--iterations", type=int, default=50, help="Calls per recommender function")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per route")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--time-budget", type=float, default=30.0, help="Max seconds per benchmark")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Slowdown reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    # Internal: run a single scale in this process
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--scale", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    results = []
+    for scale in (int(s) for s in args.scales.split(",")):
+        with tempfile.TemporaryDirectory(prefix=f"bench-{scale}-") as workdir:
+            out = os.path.join(workdir, "result.json")
+            subprocess.run(
+                [sys.executable, "-m", "benchmarks.run", "--worker", "--scale", str(scale),
+                 "--workdir", workdir, "--out", out, "--users", str(args.users), "--seed", str(args.seed),
+                 "--iterations", str(args.iterations), "--requests", str(args.requests),
+                 "--concurrency", str(args.concurrency), "--time-budget", str(args.time_budget)],
+                cwd=BACKEND_DIR,
+                check=True,
+            )
+            with open(out) as f:
+                results.append(json.load(f))
+
+    report = {
+        "created_at": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()} / {os.cpu_count()} CPUs",
+        "results": results,
+    }
+    os.makedirs(os.path.join(BENCH_DIR, "results"), exist_ok=True)
+    report_path = os.path.join(BENCH_DIR, "results", f"{datetime.utcnow():%Y%m%d-%H%M%S}.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    print(f"\nResults written to {report_path}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
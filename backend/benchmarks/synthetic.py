@@ -0,0 +1,129 @@
+"""
+Synthetic catalog, user and watch-history generator for benchmarks.
+
+The catalog is written in the same CSV schema as `data/10000 Movies Data`, so
+it can be fed through model.py unchanged. Text fields are drawn from a
+Zipf-distributed pseudo-word vocabulary to give TF-IDF a realistic shape.
+
+Run from backend/:
+    python -m benchmarks.synthetic --movies 100000 --out /tmp/bench/data/10000\\ Movies\\ Data
+"""
+
+import argparse
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+TMDB_GENRES = [
+    (28, "Action"), (12, "Adventure"), (16, "Animation"), (35, "Comedy"), (80, "Crime"),
+    (99, "Documentary"), (18, "Drama"), (10751, "Family"), (14, "Fantasy"), (36, "History"),
+    (27, "Horror"), (10402, "Music"), (9648, "Mystery"), (10749, "Romance"),
+    (878, "Science Fiction"), (10770, "TV Movie"), (53, "Thriller"), (10752, "War"), (37, "Western"),
+]
+
+CSV_COLUMNS = [
+    "Unnamed: 0", "Movie_id", "title", "release_date", "Genres", "Keywords", "overview",
+    "poster_path", "Budget", "Revenue", "popularity", "vote_average", "vote_count",
+]
+
+
+def make_vocabulary(size, rng):
+    syllables = np.array(["ka", "lo", "mi", "ren", "tor", "sha", "vel", "dun", "ari", "os", "pe", "qui", "zan", "bel"])
+    lengths = rng.integers(2, 5, size=size)
+    words = {"".join(rng.choice(syllables, n)) for n in lengths}
+    return np.array(sorted(words))
+
+
+def zipf_words(vocabulary, count, rng, a=1.3):
+    ranks = rng.zipf(a, size=count) - 1
+    return vocabulary[np.minimum(ranks, len(vocabulary) - 1)]
+
+
+def generate_catalog(n_movies, seed=0, vocabulary_size=20000):
+    """
+    Returns a DataFrame with `n_movies` rows in the raw CSV schema.
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = make_vocabulary(vocabulary_size, rng)
+    # Shuffle so frequent words are not alphabetically clustered
+    rng.shuffle(vocabulary)
+
+    overview_lengths = rng.integers(15, 60, size=n_movies)
+    overview_words = zipf_words(vocabulary, int(overview_lengths.sum()), rng)
+    overview_splits = np.split(overview_words, np.cumsum(overview_lengths)[:-1])
+    keyword_words = zipf_words(vocabulary, n_movies * 5, rng, a=1.1).reshape(n_movies, 5)
+    title_words = rng.choice(vocabulary[:5000], size=(n_movies, 2))
+
+    genre_ids = rng.integers(0, len(TMDB_GENRES), size=(n_movies, 3))
+    genre_counts = rng.integers(1, 4, size=n_movies)
+    genres = [
+        str([{"id": TMDB_GENRES[g][0], "name": TMDB_GENRES[g][1]} for g in dict.fromkeys(row[:k])])
+        for row, k in zip(genre_ids, genre_counts)
+    ]
+
+    start = datetime(1950, 1, 1)
+    release_days = rng.integers(0, 75 * 365, size=n_movies)
+    vote_count = rng.lognormal(5, 2, size=n_movies).astype(int)
+
+    overviews = np.array([" ".join(words) for words in overview_splits], dtype=object)
+    overviews[rng.random(n_movies) < 0.01] = None  # like the real data, a few rows have no overview
+
+    return pd.DataFrame({
+        "Unnamed: 0": np.arange(n_movies),
+        "Movie_id": np.arange(n_movies) + 100000,
+        "title": [f"{a.title()} {b.title()} {i}" for i, (a, b) in enumerate(title_words)],
+        "release_date": [(start + timedelta(days=int(d))).strftime("%Y-%m-%d") for d in release_days],
+        "Genres": genres,
+        "Keywords": [", ".join(row) for row in keyword_words],
+        "overview": overviews,
+        "poster_path": [f"/synthetic{i}.jpg" for i in range(n_movies)],
+        "Budget": rng.integers(0, 300_000_000, size=n_movies),
+        "Revenue": rng.integers(0, 2_000_000_000, size=n_movies),
+        "popularity": np.round(rng.lognormal(2, 1, size=n_movies), 3),
+        "vote_average": np.round(np.clip(rng.normal(6.3, 1.2, size=n_movies), 0, 10), 1),
+        "vote_count": vote_count,
+    })[CSV_COLUMNS]
+
+
+def generate_histories(catalog, n_users, seed=1, median_length=20, max_length=500):
+    """
+    Returns {user_index: [(Movie_id, title, watched_at), ...]} with lognormal
+    history lengths and a popularity-skewed choice of movies.
+    """
+    rng = np.random.default_rng(seed)
+    catalog = catalog[catalog["overview"].notnull()]
+    weights = catalog["popularity"].to_numpy()
+    weights = weights / weights.sum()
+    ids, titles = catalog["Movie_id"].to_numpy(), catalog["title"].to_numpy()
+
+    now = datetime.utcnow()
+    lengths = np.clip(rng.lognormal(np.log(median_length), 1.0, size=n_users).astype(int), 1, max_length)
+    histories = {}
+    for user, length in enumerate(lengths):
+        picks = rng.choice(len(ids), size=min(length, len(ids)), replace=False, p=weights)
+        ages = np.sort(rng.integers(0, 3 * 365 * 86400, size=len(picks)))[::-1]
+        histories[user] = [
+            (str(ids[p]), titles[p], now - timedelta(seconds=int(age))) for p, age in zip(picks, ages)
+        ]
+    return histories
+
+
+def write_catalog(catalog, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    catalog.to_csv(path, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--movies", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="./data/10000 Movies Data")
+    args = parser.parse_args()
+    write_catalog(generate_catalog(args.movies, seed=args.seed), args.out)
+    print(f"Wrote {args.movies} movies to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
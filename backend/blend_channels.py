@@ -0,0 +1,117 @@
+"""
+Per-blend subscription channels for pushed blend updates.
+
+Viewers of a blend subscribe to its channel (see the /blend/{code}/events
+route) instead of polling /blend/{code}. The blend is recomputed once per
+change (a member joins or adds history) and the result is pushed to every
+subscriber, so 20 viewers cost one computation per change rather than twenty
+per polling interval.
+
+Only blends with subscribers have a channel: changes to any other blend are
+ignored, and a channel is dropped with its last subscriber. Changes that
+arrive while a recomputation is running are folded into a single rerun. A
+failed recomputation pushes UPDATE_FAILED instead, so subscribers waiting
+for their first snapshot are not left with keepalives only; the next change
+or subscriber retries.
+"""
+
+import asyncio
+
+import metrics
+
+BLEND_SUBSCRIBERS = metrics.gauge(
+    "blend_subscribers",
+    "Open blend update subscriptions.",
+)
+BLEND_RECOMPUTES = metrics.counter(
+    "blend_recomputes_total",
+    "Blend recomputations triggered for subscribed blends.",
+)
+
+# Pushed in place of a snapshot when recomputing the blend fails
+UPDATE_FAILED = {"error": "Could not compute the blend"}
+
+
+class BlendChannel:
+    def __init__(self):
+        self.subscribers = set()
+        self.snapshot = None
+        self.dirty = False
+        self.task = None
+
+
+class BlendHub:
+    """
+    Channels by blend code. `compute(code)` is a coroutine function returning
+    the snapshot pushed to subscribers. Must only be used from the event loop
+    thread.
+    """
+
+    def __init__(self, compute):
+        self.compute = compute
+        self.channels = {}
+
+    def subscribe(self, code):
+        """
+        Returns a queue that receives the latest snapshot of the blend: right
+        away if one is known, and after every change. A subscriber that falls
+        behind only gets the newest snapshot.
+        """
+        channel = self.channels.get(code)
+        if channel is None:
+            channel = self.channels[code] = BlendChannel()
+        queue = asyncio.Queue(maxsize=1)
+        channel.subscribers.add(queue)
+        BLEND_SUBSCRIBERS.inc()
+        if channel.snapshot is not None:
+            queue.put_nowait(channel.snapshot)
+        elif channel.task is None:
+            self.notify(code)
+        return queue
+
+    def unsubscribe(self, code, queue):
+        channel = self.channels.get(code)
+        if channel is None or queue not in channel.subscribers:
+            return
+        channel.subscribers.discard(queue)
+        BLEND_SUBSCRIBERS.dec()
+        if not channel.subscribers:
+            if channel.task is not None:
+                channel.task.cancel()
+            del self.channels[code]
+
+    def notify(self, code):
+        """
+        Marks a blend as changed. A no-op for blends without subscribers.
+        """
+        channel = self.channels.get(code)
+        if channel is None:
+            return
+        channel.dirty = True
+        if channel.task is None:
+            channel.task = asyncio.ensure_future(self._recompute(code, channel))
+
+    def notify_all(self):
+        for code in list(self.channels):
+            self.notify(code)
+
+    def active_codes(self):
+        return set(self.channels)
+
+    async def _recompute(self, code, channel):
+        try:
+            while channel.dirty:
+                channel.dirty = False
+                BLEND_RECOMPUTES.inc()
+                try:
+                    snapshot = await self.compute(code)
+                    channel.snapshot = snapshot
+                except Exception as e:
+                    print(f"Blend update error ({code}): {e}")
+                    snapshot = UPDATE_FAILED
+                for queue in channel.subscribers:
+                    if queue.full():
+                        queue.get_nowait()
+                    queue.put_nowait(snapshot)
+        finally:
+            channel.task = None
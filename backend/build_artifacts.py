@@ -0,0 +1,191 @@
+"""
+Parallel, chunked build of the catalog artifacts.
+
+Movies are read from the typed columnar store (see columnar.py; converted
+from the CSV first if needed), and the text is split into chunks whose
+document frequencies are counted in a process pool. The vectorizer is then
+assembled from the merged document frequencies, and a second pass transforms
+the chunks in parallel. The result matches what
+`TfidfVectorizer.fit_transform` produces over the whole catalog: the same
+sorted vocabulary, smoothed IDF and L2-normalized rows.
+
+With `--features hashing` the catalog uses fixed-width hashed features
+instead (see hashing_features.py): chunk document frequencies are
+fixed-size arrays that are summed, and no vocabulary is built or shipped.
+`--precision float32|int8` stores the weights with less precision (see
+quantized_features.py).
+
+At most `2 * workers` chunks are in flight at a time, so apart from the
+catalog itself (text columns and the sparse matrix) memory use doesn't grow
+with the number of rows. The catalog is published as a new artifact version.
+
+Run from backend/:
+    python build_artifacts.py --workers 8 --chunk-rows 50000
+    python build_artifacts.py --features hashing --hash-features 262144
+    python build_artifacts.py --precision int8
+"""
+
+import argparse
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+
+import artifact_registry
+import columnar
+import quantized_features
+from ann_index import build_ann_index
+from catalog import (
+    CATALOG_SOURCE_PATH,
+    FEATURE_PRECISION,
+    HASHING_FEATURES,
+    TEXT_FEATURES,
+    Catalog,
+    add_ratings,
+    ann_options_from_env,
+    combined_text
+)
+from hashing_features import HashingTfidfVectorizer
+
+_vectorizer = None
+
+
+def count_chunk(texts):
+    """
+    Returns {term: document frequency} for one chunk of combined texts.
+    """
+    counter = CountVectorizer(stop_words='english', binary=True)
+    try:
+        counts = counter.fit_transform(texts)
+    except ValueError:
+        return {}  # only stop words in this chunk
+    return dict(zip(counter.get_feature_names_out().tolist(), np.asarray(counts.sum(axis=0)).ravel().tolist()))
+
+
+def init_transform_worker(vectorizer):
+    # Ship the vectorizer once per worker instead of once per chunk
+    global _vectorizer
+    _vectorizer = vectorizer
+
+
+def transform_chunk(texts):
+    return _vectorizer.transform(texts)
+
+
+def count_hashed_chunk(texts):
+    return _vectorizer.document_frequencies(texts)
+
+
+def bounded_map(pool, fn, items, max_pending):
+    """
+    `pool.map` that keeps at most `max_pending` tasks (and their inputs) in
+    memory, yielding results in order.
+    """
+    pending = []
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= max_pending:
+            yield pending.pop(0).result()
+    for future in pending:
+        yield future.result()
+
+
+def assemble_vectorizer(document_frequencies, n_documents):
+    """
+    Builds a fitted TfidfVectorizer(stop_words='english') from merged document
+    frequencies, without another pass over the text.
+    """
+    terms = sorted(document_frequencies)
+    df = np.array([document_frequencies[t] for t in terms], dtype=np.float64)
+    vectorizer = TfidfVectorizer(stop_words='english')
+    vectorizer.vocabulary_ = {term: i for i, term in enumerate(terms)}
+    vectorizer.fixed_vocabulary_ = False
+    # smooth_idf=True, as in TfidfTransformer.fit
+    vectorizer.idf_ = np.log((1 + n_documents) / (1 + df)) + 1
+    return vectorizer
+
+
+def build_catalog(source_path=CATALOG_SOURCE_PATH, chunk_rows=50000, workers=None, ann_options=None,
+                  text_features=TEXT_FEATURES, hash_features=HASHING_FEATURES, precision=FEATURE_PRECISION):
+    """
+    Builds a Catalog from the source CSV's columnar store.
+
+    Parameters:
+        source_path (str): CSV in the raw schema.
+        chunk_rows (int): Rows processed per task.
+        workers (int): Worker processes, defaults to the number of CPUs.
+        ann_options (dict): `build_ann_index` keyword arguments, or None.
+        text_features (str): "tfidf" or "hashing".
+        hash_features (int): Number of hashed columns in "hashing" mode.
+        precision (str): Stored precision of the weights: "float64", "float32" or "int8".
+    """
+    if text_features not in ("tfidf", "hashing"):
+        raise ValueError(f"Unknown text features mode: {text_features}")
+    workers = workers or os.cpu_count() or 1
+    max_pending = 2 * workers
+
+    columns, schema = columnar.load_columns(columnar.ensure_columns(source_path))
+    movies = columnar.catalog_frame(columns, schema)
+    movies['combined'] = combined_text(movies)
+    title_to_genres = columnar.title_genre_map(columns, schema)
+
+    def text_chunks():
+        for start in range(0, len(movies), chunk_rows):
+            yield movies['combined'].iloc[start:start + chunk_rows]
+
+    if text_features == "hashing":
+        vectorizer = HashingTfidfVectorizer(hash_features)
+        document_frequencies = np.zeros(hash_features, dtype=np.int64)
+        with ProcessPoolExecutor(workers, initializer=init_transform_worker, initargs=(vectorizer,)) as pool:
+            for chunk_frequencies in bounded_map(pool, count_hashed_chunk, text_chunks(), max_pending):
+                document_frequencies += chunk_frequencies
+        vectorizer.set_document_frequencies(document_frequencies, len(movies))
+    else:
+        document_frequencies = Counter()
+        with ProcessPoolExecutor(workers) as pool:
+            for chunk_frequencies in bounded_map(pool, count_chunk, text_chunks(), max_pending):
+                document_frequencies.update(chunk_frequencies)
+        vectorizer = assemble_vectorizer(document_frequencies, len(movies))
+
+    with ProcessPoolExecutor(workers, initializer=init_transform_worker, initargs=(vectorizer,)) as pool:
+        tfidf_matrix = sp.vstack(list(bounded_map(pool, transform_chunk, text_chunks(), max_pending)), format='csr')
+
+    add_ratings(movies)
+    ann_index = build_ann_index(tfidf_matrix, **ann_options) if ann_options is not None else None
+    tfidf_matrix = quantized_features.quantize(tfidf_matrix, precision)
+    return Catalog(movies, vectorizer, tfidf_matrix, ann_index, title_to_genres=title_to_genres)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default=CATALOG_SOURCE_PATH)
+    parser.add_argument("--chunk-rows", type=int, default=50000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--features", choices=("tfidf", "hashing"), default=TEXT_FEATURES,
+                        help="text features: fitted vocabulary or fixed-width hashing")
+    parser.add_argument("--hash-features", type=int, default=HASHING_FEATURES, help="columns in hashing mode")
+    parser.add_argument("--precision", choices=quantized_features.PRECISIONS, default=FEATURE_PRECISION,
+                        help="stored precision of the TF-IDF weights")
+    parser.add_argument("--no-publish", action="store_true", help="build and validate only")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    catalog = build_catalog(
+        args.csv, args.chunk_rows, args.workers, ann_options_from_env(), args.features, args.hash_features,
+        args.precision
+    )
+    built = time.perf_counter() - start
+    if args.no_publish:
+        print(f"✅ Built {len(catalog)} movies, {catalog.tfidf_matrix.shape[1]} terms in {built:.2f}s")
+        return
+    label = artifact_registry.publish(catalog)
+    print(f"✅ Published {label}: {len(catalog)} movies, {catalog.tfidf_matrix.shape[1]} terms "
+          f"(built in {built:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
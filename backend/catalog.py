@@ -0,0 +1,450 @@
+"""
+Versioned movie catalog with incremental ingestion.
+
+A `Catalog` bundles everything the recommenders read about the movies (the
+processed DataFrame, the fitted vectorizer, the TF-IDF matrix, the ANN
+index and the lookup tables derived from them). New or changed movies are
+transformed with the existing vocabulary and appended to (or replaced in) a
+copy of the previous version; the vectorizer is only refit on demand or when
+the incoming text drifts too far from the vocabulary.
+
+Catalog rows are only ever appended or replaced in place, and a refit keeps
+the row order, so a catalog index stays valid across newer versions. Rankings
+cached under an older version (cursor pages, precomputed rankings) can still
+be formatted against the current one.
+
+New versions are published through artifact_registry.
+
+Run from backend/:
+    python catalog.py ingest new_movies.csv
+    python catalog.py refit
+"""
+
+import argparse
+import ast
+import hashlib
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+import artifact_registry
+import columnar
+import genre_counts
+import quantized_features
+from ann_index import add_items as ann_add_items, build_ann_index
+from hashing_features import HashingTfidfVectorizer, text_features_mode
+
+CATALOG_SOURCE_PATH = os.getenv("CATALOG_SOURCE_PATH", "./data/10000 Movies Data")
+# Share of tokens in an ingested batch that are missing from the vocabulary
+# above which the batch triggers a full refit instead of an incremental update
+CATALOG_DRIFT_THRESHOLD = float(os.getenv("CATALOG_DRIFT_THRESHOLD", "0.2"))
+# A full refit is also due once the vectorizer is older than this (0 = never)
+CATALOG_REFIT_INTERVAL_DAYS = float(os.getenv("CATALOG_REFIT_INTERVAL_DAYS", "7"))
+# Text features of new builds: "tfidf" (fitted vocabulary) or "hashing"
+# (fixed-width hashed columns, see hashing_features.py)
+TEXT_FEATURES = os.getenv("TEXT_FEATURES", "tfidf")
+HASHING_FEATURES = int(os.getenv("HASHING_FEATURES", str(2 ** 18)))
+# Stored precision of the TF-IDF weights of new builds: "float64", "float32"
+# or "int8" (per-row scales, see quantized_features.py)
+FEATURE_PRECISION = os.getenv("FEATURE_PRECISION", "float64")
+
+
+# Extract genres
+def extract_genres(x):
+    try:
+        return [d['name'].lower().replace(" ", "") for d in ast.literal_eval(x)]
+    except:
+        return []
+
+
+# Combine fields for content-based filtering
+def make_combined(row):
+    genres = " ".join(row['Genres']) if isinstance(row['Genres'], list) else ""
+    keywords = row['Keywords'] if isinstance(row['Keywords'], str) else ""
+    overview = row['overview'] if isinstance(row['overview'], str) else ""
+    return f"{overview} {genres} {keywords}"
+
+
+def extract_genres_from_string(genres_str):
+    if isinstance(genres_str, str):
+        try:
+            return [d['name'] for d in ast.literal_eval(genres_str)]
+        except (ValueError, SyntaxError):
+            return []
+    return []
+
+
+def add_title_genres(title_to_genres, raw, overwrite=()):
+    """
+    Maps each title in `raw` to its display genre names. The first title wins,
+    except for titles in `overwrite`, where the last one in `raw` replaces any
+    existing entry (an ingested batch updates the genres of the movies it
+    replaces, but a new movie never takes over an existing title).
+    """
+    for title, genres in zip(raw['title'], raw['Genres']):
+        if title in overwrite or title not in title_to_genres:
+            title_to_genres[title] = extract_genres_from_string(genres)
+    return title_to_genres
+
+
+def parse_genres(genres):
+    """
+    `extract_genres` over a column, parsing each distinct genre string once.
+    The raw column only holds a few hundred genre combinations, so this skips
+    almost all of the per-row `ast.literal_eval` calls.
+    """
+    parsed = {value: extract_genres(value) for value in pd.unique(genres.dropna())}
+    # Fresh list per row, so rows never share (and mutate) the same list;
+    # missing values come back as NaN and parse to [] like extract_genres
+    return genres.map(parsed).map(lambda g: list(g) if isinstance(g, list) else []).astype(object)
+
+
+def text_or_empty(series):
+    return series.where(series.map(lambda x: isinstance(x, str)), '')
+
+
+def combined_text(movies):
+    """
+    Vectorized `make_combined`: overview, genres and keywords joined by spaces.
+    """
+    genres = movies['Genres'].map(lambda g: " ".join(g) if isinstance(g, list) else "")
+    return text_or_empty(movies['overview']) + " " + genres + " " + text_or_empty(movies['Keywords'])
+
+
+def prepare_movies(raw):
+    """
+    Turns rows in the raw CSV schema into catalog rows: drops movies without an
+    overview, parses genres and builds the `combined` text column.
+    """
+    movies = raw[raw['overview'].notnull()].copy()
+    movies.reset_index(drop=True, inplace=True)
+    movies['Genres'] = parse_genres(movies['Genres'])
+    movies['combined'] = combined_text(movies).astype(object)
+    return apply_dtypes(movies)
+
+
+def apply_dtypes(movies):
+    """
+    Casts the numeric columns to the typed catalog schema (see columnar.py).
+    """
+    for name, dtype in columnar.NUMERIC_COLUMNS.items():
+        if name in movies.columns and movies[name].dtype != dtype:
+            movies[name] = movies[name].astype(dtype)
+    return movies
+
+
+def add_ratings(movies):
+    """
+    (Re)computes the IMDb weighted rating and its 0-1 normalization over the
+    whole catalog in place. Vectorized, so it is cheap to redo on every update.
+    """
+    C = movies['vote_average'].mean()
+    m = movies['vote_count'].quantile(0.60)
+    v, R = movies['vote_count'], movies['vote_average']
+    weighted = (v / (v + m)) * R + (m / (m + v)) * C
+    spread = weighted.max() - weighted.min()
+    movies['weighted_rating'] = weighted.astype(np.float32)
+    movies['weighted_rating_norm'] = ((weighted - weighted.min()) / spread).astype(np.float32)
+    return movies
+
+
+# Response fields as plain Python lists, so result rows are built by position
+# without going through pandas for every recommendation
+def build_response_columns(movies):
+    return {
+        "title": movies['title'].tolist(),
+        "genres": movies['Genres'].tolist(),
+        "poster_path": movies['poster_path'].fillna('').astype(str).tolist(),
+        "release_date": movies['release_date'].fillna('').astype(str).tolist()
+    }
+
+
+def make_vectorizer(mode=TEXT_FEATURES, n_features=HASHING_FEATURES):
+    """
+    An unfitted vectorizer for the given text features mode.
+    """
+    if mode == "hashing":
+        return HashingTfidfVectorizer(n_features)
+    if mode == "tfidf":
+        return TfidfVectorizer(stop_words='english')
+    raise ValueError(f"Unknown text features mode: {mode}")
+
+
+def unfitted_like(tfidf):
+    """
+    A fresh vectorizer of the same mode (and width), for refits.
+    """
+    return make_vectorizer(text_features_mode(tfidf), getattr(tfidf, "n_features", HASHING_FEATURES))
+
+
+def vocabulary_id(tfidf):
+    """
+    Short fingerprint of a fitted vocabulary. Anything stored in TF-IDF space
+    (e.g. user profiles) is only valid for the vocabulary it was built with.
+    Hashed features keep their columns across refits.
+    """
+    if isinstance(tfidf, HashingTfidfVectorizer):
+        return tfidf.feature_space_id()
+    terms = sorted(tfidf.vocabulary_, key=tfidf.vocabulary_.get)
+    return hashlib.sha1("\n".join(terms).encode()).hexdigest()[:12]
+
+
+class Catalog:
+    """
+    One immutable version of the catalog. Recommenders take a reference to the
+    current Catalog once per call, so a hot swap never mixes two versions
+    within a request.
+    """
+
+    def __init__(self, movies, tfidf, tfidf_matrix, ann_index=None, version=0, fitted_at=None,
+                 title_to_genres=None, ingested_rows=None):
+        self.movies = movies
+        self.tfidf = tfidf
+        self.tfidf_matrix = tfidf_matrix
+        self.ann_index = ann_index
+        self.version = version
+        self.fitted_at = fitted_at or datetime.utcnow()
+        self.vocabulary_id = vocabulary_id(tfidf)
+        self.title_to_genres = title_to_genres if title_to_genres is not None else {}
+        # Raw CSV rows ingested since the build from the source CSV (last one
+        # per Movie_id), searched next to the source rows by /search
+        self.ingested_rows = ingested_rows
+        self.rebuild_lookups()
+
+    def rebuild_lookups(self):
+        # Catalog position of each Movie_id (first occurrence wins)
+        self.movie_id_to_index = {}
+        for idx, movie_id in self.movies['Movie_id'].items():
+            self.movie_id_to_index.setdefault(str(movie_id).strip(), idx)
+        self.response_columns = build_response_columns(self.movies)
+        # Per-mood genre scores are filled lazily by model.mood_scores
+        self.mood_score_cache = {}
+        # Genre vocabulary of the per-user genre counts behind user tags
+        self.genre_names = genre_counts.genre_vocabulary(self.title_to_genres)
+        self.genre_index = {name: i for i, name in enumerate(self.genre_names)}
+        self.genre_vocabulary_id = genre_counts.vocabulary_id(self.genre_names)
+        # Filter bitmasks and sorted columns, built lazily by model.filter_candidates
+        self.filter_index = None
+        # Inverted index for descriptive queries, built lazily by model.text_index
+        self.text_index = None
+        # Catalog positions by lowercased title, built lazily by model.title_positions
+        self.title_positions = None
+        # Raw rows and lowercased titles for /search, built lazily by model.search_columns
+        self.search_columns = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ("movie_id_to_index", "response_columns", "mood_score_cache",
+                     "genre_names", "genre_index", "genre_vocabulary_id", "filter_index",
+                     "text_index", "title_positions", "search_columns"):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        state.setdefault("ingested_rows", None)
+        self.__dict__.update(state)
+        self.rebuild_lookups()
+
+    def __len__(self):
+        return len(self.movies)
+
+
+def fit_catalog(movies, version=0, title_to_genres=None, ann_options=None, vectorizer=None,
+                precision=FEATURE_PRECISION, ingested_rows=None):
+    """
+    Fits a new vectorizer over `movies` (already prepared, row order kept) and
+    returns the resulting Catalog.
+
+    Parameters:
+        movies (pd.DataFrame): Output of `prepare_movies`.
+        version (int): Version number of the new catalog.
+        title_to_genres (dict): Title to display genre names, used for tags.
+        ann_options (dict): `build_ann_index` keyword arguments, or None to
+            build no ANN index.
+        vectorizer: Unfitted vectorizer, defaults to `make_vectorizer()`.
+        precision (str): Stored precision of the weights, see quantized_features.py.
+        ingested_rows (pd.DataFrame): Raw rows ingested so far, see `Catalog`.
+    """
+    movies = add_ratings(movies)
+    tfidf = vectorizer if vectorizer is not None else make_vectorizer()
+    tfidf_matrix = tfidf.fit_transform(movies['combined'])
+    ann_index = build_ann_index(tfidf_matrix, **ann_options) if ann_options is not None else None
+    tfidf_matrix = quantized_features.quantize(tfidf_matrix, precision)
+    return Catalog(movies, tfidf, tfidf_matrix, ann_index, version, title_to_genres=title_to_genres,
+                   ingested_rows=ingested_rows)
+
+
+def vocabulary_drift(tfidf, texts):
+    """
+    Returns the share of analyzed tokens in `texts` that the fitted vocabulary
+    does not know (0.0 for no tokens).
+    """
+    if isinstance(tfidf, HashingTfidfVectorizer):
+        return tfidf.unknown_share(texts)
+    analyzer = tfidf.build_analyzer()
+    total = unknown = 0
+    for text in texts:
+        tokens = analyzer(text)
+        total += len(tokens)
+        unknown += sum(token not in tfidf.vocabulary_ for token in tokens)
+    return unknown / total if total else 0.0
+
+
+def refit_due(catalog, now=None):
+    if CATALOG_REFIT_INTERVAL_DAYS <= 0:
+        return False
+    now = now or datetime.utcnow()
+    return (now - catalog.fitted_at).total_seconds() > CATALOG_REFIT_INTERVAL_DAYS * 86400
+
+
+def ann_options_from_env():
+    """
+    ANN index settings for a first build, from the same variables model.py reads.
+    """
+    if os.getenv("ANN_INDEX", "false").lower() != "true":
+        return None
+    return {
+        "n_components": int(os.getenv("ANN_COMPONENTS", "128")),
+        "n_lists": int(os.getenv("ANN_LISTS", "0")) or None
+    }
+
+
+def ann_options_of(catalog):
+    if catalog.ann_index is None:
+        return None
+    components = catalog.ann_index["components"]
+    return {"n_components": components.shape[0], "n_lists": len(catalog.ann_index["centroids"])}
+
+
+def refit(catalog):
+    """
+    Returns the next version of `catalog` with a freshly fitted vectorizer,
+    matrix and ANN index. Rows keep their positions and their precision.
+    """
+    return fit_catalog(
+        catalog.movies.copy(), catalog.version + 1, dict(catalog.title_to_genres), ann_options_of(catalog),
+        unfitted_like(catalog.tfidf), quantized_features.precision_of(catalog.tfidf_matrix), catalog.ingested_rows
+    )
+
+
+def merge_ingested_rows(previous, raw):
+    """
+    `previous` ingested rows (or None) updated with the raw batch `raw`, one
+    row per Movie_id, the latest winning.
+    """
+    rows = raw[columnar.RAW_COLUMNS]
+    if previous is not None:
+        rows = pd.concat([previous, rows], ignore_index=True)
+    keys = rows['Movie_id'].astype(str).str.strip()
+    return rows[~keys.duplicated(keep='last')].reset_index(drop=True)
+
+
+def ingest(catalog, raw, drift_threshold=CATALOG_DRIFT_THRESHOLD, force_refit=False):
+    """
+    Adds or updates movies and returns (new catalog, refitted).
+
+    Movies whose Movie_id is already in the catalog replace their row in place;
+    the rest are appended. The new rows are transformed with the existing
+    vectorizer, so IDF weights and the vocabulary stay fixed, unless the
+    batch's vocabulary drift exceeds `drift_threshold`, a scheduled refit is
+    due or `force_refit` is set.
+
+    Parameters:
+        catalog (Catalog): Current version, left untouched.
+        raw (pd.DataFrame): Movies in the raw CSV schema.
+    """
+    rows = prepare_movies(raw)
+    rows['Movie_id_key'] = rows['Movie_id'].astype(str).str.strip()
+    rows = rows.drop_duplicates('Movie_id_key', keep='last')
+    positions = rows['Movie_id_key'].map(catalog.movie_id_to_index)
+    rows = rows.drop(columns='Movie_id_key')
+    changed = positions.notnull().to_numpy()
+    changed_positions = positions[changed].astype(np.int64).to_numpy()
+    appended_positions = len(catalog) + np.arange(int((~changed).sum()))
+
+    movies = apply_dtypes(pd.concat([catalog.movies, rows[~changed]], ignore_index=True))
+    if changed.any():
+        updates = rows[changed].copy()
+        updates.index = changed_positions
+        movies.loc[changed_positions, updates.columns] = updates
+    title_to_genres = dict(catalog.title_to_genres)
+    # Replaced movies that were renamed leave their old title behind, unless
+    # another movie still has it
+    old_titles = set(catalog.movies['title'].to_numpy()[changed_positions])
+    for title in old_titles - set(rows.loc[changed, 'title']):
+        if not (movies['title'] == title).any():
+            title_to_genres.pop(title, None)
+    title_to_genres = add_title_genres(title_to_genres, raw, overwrite=set(rows.loc[changed, 'title']))
+    ingested_rows = merge_ingested_rows(catalog.ingested_rows, raw)
+
+    drift = vocabulary_drift(catalog.tfidf, rows['combined'])
+    if force_refit or drift > drift_threshold or refit_due(catalog):
+        refitted = fit_catalog(
+            movies, catalog.version + 1, title_to_genres, ann_options_of(catalog), unfitted_like(catalog.tfidf),
+            quantized_features.precision_of(catalog.tfidf_matrix), ingested_rows
+        )
+        return refitted, True
+
+    movies = add_ratings(movies)
+    new_rows = catalog.tfidf.transform(rows['combined'])
+    # Stack the new rows (at the catalog's precision) under the old matrix,
+    # then pick rows so that changed movies read their new row; an O(nnz)
+    # copy instead of a refit
+    stacked = quantized_features.stack_rows(catalog.tfidf_matrix, new_rows)
+    order = np.arange(len(movies))
+    new_row_positions = np.concatenate([changed_positions, appended_positions]).astype(np.int64)
+    row_of_update = len(catalog) + np.concatenate([np.flatnonzero(changed), np.flatnonzero(~changed)])
+    order[new_row_positions] = row_of_update
+    tfidf_matrix = stacked[order]
+
+    ann_index = catalog.ann_index
+    if ann_index is not None:
+        ann_index = ann_add_items(ann_index, new_rows[row_of_update - len(catalog)], new_row_positions)
+
+    updated = Catalog(
+        movies, catalog.tfidf, tfidf_matrix, ann_index, catalog.version + 1,
+        fitted_at=catalog.fitted_at, title_to_genres=title_to_genres, ingested_rows=ingested_rows
+    )
+    return updated, False
+
+
+def load_or_build(source_path=CATALOG_SOURCE_PATH):
+    """
+    Returns the current published catalog, or fits a first one from the
+    columnar store of the source CSV.
+    """
+    _, current = artifact_registry.load_current()
+    if current is not None:
+        return current
+    columns, schema = columnar.load_columns(columnar.ensure_columns(source_path))
+    movies = columnar.catalog_frame(columns, schema)
+    movies['combined'] = combined_text(movies)
+    return fit_catalog(movies, 0, columnar.title_genre_map(columns, schema), ann_options_from_env())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest_parser = commands.add_parser("ingest", help="add or update movies from a CSV in the raw schema")
+    ingest_parser.add_argument("csv")
+    ingest_parser.add_argument("--refit", action="store_true", help="refit the vectorizer regardless of drift")
+    commands.add_parser("refit", help="refit the vectorizer over the current catalog")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    current = load_or_build()
+    if args.command == "ingest":
+        updated, refitted = ingest(current, pd.read_csv(args.csv), force_refit=args.refit)
+    else:
+        updated, refitted = refit(current), True
+    label = artifact_registry.publish(updated)
+    print(f"✅ Catalog {label}: {len(updated)} movies "
+          f"({'refit' if refitted else 'incremental'}, {time.perf_counter() - start:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+"""
+Typed, columnar on-disk catalog.
+
+The raw CSV is converted once, streaming chunk by chunk, into a directory of
+raw NumPy column files described by a `schema.json`:
+
+    numeric columns    <name>.bin                  fixed dtype (int32 ids, float32 scores);
+                                                   integer columns also get a .null mask
+    string columns     <name>.data + .offsets      UTF-8 bytes, int64 offsets, .null mask
+    genres             genre_codes.data + .offsets int8 codes into schema["genres"], in row order
+
+Startup and rebuilds read these arrays (memory-mapped) instead of parsing the
+CSV and literal-eval'ing the genre JSON of every row. The store is rebuilt
+automatically when the source CSV changes.
+
+Run from backend/:
+    python columnar.py convert [--csv "./data/10000 Movies Data"]
+"""
+
+import argparse
+import ast
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+COLUMNS_PATH = os.getenv("CATALOG_COLUMNS_PATH", "./data/catalog_columns")
+SCHEMA_VERSION = 2
+
+NUMERIC_COLUMNS = {
+    "Unnamed: 0": np.int32,
+    "Movie_id": np.int32,
+    "Budget": np.int64,
+    "Revenue": np.int64,
+    "popularity": np.float32,
+    "vote_average": np.float32,
+    "vote_count": np.int32,
+}
+# Genres is also kept as raw text, for responses that return rows as in the CSV
+STRING_COLUMNS = ["title", "release_date", "Genres", "Keywords", "overview", "poster_path"]
+# Column order of the raw CSV, kept for the processed DataFrame
+RAW_COLUMNS = [
+    "Unnamed: 0", "Movie_id", "title", "release_date", "Genres", "Keywords", "overview",
+    "poster_path", "Budget", "Revenue", "popularity", "vote_average", "vote_count",
+]
+
+
+def display_genres(value):
+    """
+    Display genre names of one raw `Genres` value, [] if it can't be parsed.
+    """
+    try:
+        return [d['name'] for d in ast.literal_eval(value)]
+    except Exception:
+        return []
+
+
+def source_fingerprint(csv_path):
+    stat = os.stat(csv_path)
+    return {"path": os.path.abspath(csv_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+class _ColumnWriter:
+    """
+    Appends chunks of each column to its files, so converting never holds more
+    than one chunk of the CSV in memory.
+    """
+
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        self.files = {}
+        self.offsets = {}
+
+    def _file(self, name):
+        if name not in self.files:
+            self.files[name] = open(os.path.join(self.out_dir, name), "wb")
+        return self.files[name]
+
+    def numeric(self, name, values, dtype):
+        if np.issubdtype(dtype, np.integer):
+            # Integers have no NaN: missing values are stored as 0 and masked
+            nulls = pd.isnull(values)
+            values = np.nan_to_num(np.asarray(values, dtype=np.float64)) if nulls.any() else values
+            self._file(f"{name}.null").write(np.asarray(nulls, dtype=np.bool_).tobytes())
+        self._file(f"{name}.bin").write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+
+    def strings(self, name, values):
+        nulls = pd.isnull(values)
+        encoded = [b"" if null else str(v).encode("utf-8") for v, null in zip(values, nulls)]
+        self._ragged(name, np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)), b"".join(encoded))
+        self._file(f"{name}.null").write(np.asarray(nulls, dtype=np.bool_).tobytes())
+
+    def ragged_codes(self, name, rows):
+        self._ragged(name, np.fromiter(map(len, rows), dtype=np.int64, count=len(rows)),
+                     np.fromiter((c for row in rows for c in row), dtype=np.int8).tobytes())
+
+    def _ragged(self, name, lengths, data):
+        end = self.offsets.get(name, 0)
+        if name not in self.offsets:
+            self._file(f"{name}.offsets").write(np.zeros(1, dtype=np.int64).tobytes())
+        ends = end + np.cumsum(lengths)
+        self._file(f"{name}.offsets").write(ends.astype(np.int64).tobytes())
+        self._file(f"{name}.data").write(data)
+        self.offsets[name] = int(ends[-1]) if len(ends) else end
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+
+def convert_csv(csv_path, out_dir=COLUMNS_PATH, chunk_rows=50000):
+    """
+    Streams `csv_path` into a columnar store at `out_dir`, replacing any
+    existing one only once the new store is complete.
+    """
+    staging = f"{out_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    writer = _ColumnWriter(staging)
+    genre_codes = {}
+    rows = 0
+    try:
+        for chunk in pd.read_csv(csv_path, chunksize=chunk_rows):
+            for name, dtype in NUMERIC_COLUMNS.items():
+                writer.numeric(name, chunk[name].to_numpy(), dtype)
+            for name in STRING_COLUMNS:
+                writer.strings(name, chunk[name].to_numpy())
+            # Parse each distinct genre string of the chunk once
+            parsed = {value: display_genres(value) for value in pd.unique(chunk['Genres'].dropna())}
+            codes = []
+            for value in chunk['Genres']:
+                names = parsed.get(value, []) if isinstance(value, str) else []
+                codes.append([genre_codes.setdefault(name, len(genre_codes)) for name in names])
+            if len(genre_codes) > np.iinfo(np.int8).max + 1:
+                raise ValueError(f"{len(genre_codes)} distinct genres do not fit int8 codes")
+            writer.ragged_codes("genre_codes", codes)
+            rows += len(chunk)
+    finally:
+        writer.close()
+
+    genres = sorted(genre_codes, key=genre_codes.get)
+    schema = {
+        "schema_version": SCHEMA_VERSION,
+        "rows": rows,
+        "numeric": {name: np.dtype(dtype).name for name, dtype in NUMERIC_COLUMNS.items()},
+        "strings": STRING_COLUMNS,
+        "genres": genres,
+        "source": source_fingerprint(csv_path),
+    }
+    with open(os.path.join(staging, "schema.json"), "w") as f:
+        json.dump(schema, f, indent=2)
+
+    if os.path.exists(out_dir):
+        shutil.rmtree(out_dir)
+    os.replace(staging, out_dir)
+    return schema
+
+
+def read_schema(out_dir=COLUMNS_PATH):
+    try:
+        with open(os.path.join(out_dir, "schema.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def ensure_columns(csv_path, out_dir=COLUMNS_PATH):
+    """
+    Converts the CSV unless an up-to-date store for it already exists. Without
+    the CSV, an existing store is used as is.
+    """
+    schema = read_schema(out_dir)
+    outdated = schema is not None and schema.get("schema_version") != SCHEMA_VERSION
+    if not os.path.exists(csv_path):
+        if schema is None:
+            raise FileNotFoundError(csv_path)
+        if outdated:
+            raise RuntimeError(
+                f"Columnar store {out_dir} has schema version {schema.get('schema_version')}, expected "
+                f"{SCHEMA_VERSION}, and {csv_path} is missing: re-run `python columnar.py convert`"
+            )
+        return out_dir
+    fingerprint = source_fingerprint(csv_path)
+    if (schema is None or outdated
+            or {k: schema["source"].get(k) for k in ("size", "mtime_ns")} != {k: fingerprint[k] for k in ("size", "mtime_ns")}):
+        convert_csv(csv_path, out_dir)
+    return out_dir
+
+
+def _map(out_dir, name, dtype):
+    path = os.path.join(out_dir, name)
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
+
+
+def read_strings(out_dir, name):
+    """
+    Decodes a string column into an object array of interned strings (None for
+    missing values), so repeated values share one object.
+    """
+    offsets = _map(out_dir, f"{name}.offsets", np.int64)
+    data = bytes(_map(out_dir, f"{name}.data", np.uint8))
+    nulls = _map(out_dir, f"{name}.null", np.bool_)
+    values = np.empty(len(offsets) - 1, dtype=object)
+    starts, ends = offsets[:-1].tolist(), offsets[1:].tolist()
+    for i, (start, end, null) in enumerate(zip(starts, ends, nulls.tolist())):
+        values[i] = None if null else sys.intern(data[start:end].decode("utf-8"))
+    return values
+
+
+def read_genre_codes(out_dir):
+    """
+    Returns (codes, offsets): the genre codes of row i are codes[offsets[i]:offsets[i + 1]].
+    """
+    return _map(out_dir, "genre_codes.data", np.int8), _map(out_dir, "genre_codes.offsets", np.int64)
+
+
+def load_columns(out_dir=COLUMNS_PATH):
+    """
+    Returns ({column: array}, schema). Numeric columns are memory-mapped.
+    """
+    schema = read_schema(out_dir)
+    columns = {name: _map(out_dir, f"{name}.bin", dtype) for name, dtype in schema["numeric"].items()}
+    columns["nulls"] = {
+        name: _map(out_dir, f"{name}.null", np.bool_)
+        for name, dtype in schema["numeric"].items() if np.issubdtype(np.dtype(dtype), np.integer)
+    }
+    for name in schema["strings"]:
+        columns[name] = read_strings(out_dir, name)
+    columns["genre_codes"], columns["genre_offsets"] = read_genre_codes(out_dir)
+    return columns, schema
+
+
+def numeric_values(columns, name, rows=None):
+    """
+    A numeric column (or its `rows`) as an array; integer columns with missing
+    values come back as float64 with NaN, as pandas reads them from the CSV.
+    """
+    values = np.asarray(columns[name] if rows is None else columns[name][rows])
+    nulls = columns["nulls"].get(name)
+    if nulls is not None:
+        nulls = np.asarray(nulls if rows is None else nulls[rows])
+        if nulls.any():
+            values = np.where(nulls, np.nan, values)
+    return values
+
+
+def genre_lists(columns, genre_names, rows=None):
+    """
+    Per-row genre lists, built from the codes. Every row's list holds the
+    same interned name objects.
+    """
+    codes, offsets = columns["genre_codes"], columns["genre_offsets"]
+    names = [sys.intern(name) for name in genre_names]
+    rows = range(len(offsets) - 1) if rows is None else rows
+    codes, offsets = codes.tolist(), offsets.tolist()
+    return [[names[c] for c in codes[offsets[i]:offsets[i + 1]]] for i in rows]
+
+
+def title_genre_map(columns, schema):
+    """
+    {title: display genre names} over every row (first title wins), as used
+    for user tags.
+    """
+    title_to_genres = {}
+    for title, genres in zip(columns["title"], genre_lists(columns, schema["genres"])):
+        if title not in title_to_genres:
+            title_to_genres[title] = genres
+    return title_to_genres
+
+
+def raw_frame(columns, schema):
+    """
+    All rows with the raw CSV's columns (raw `Genres` text), for responses.
+    float32 columns are widened via their shortest repr, so they serialize as
+    7.2 rather than 7.199999809265137.
+    """
+    frame = {}
+    for name in RAW_COLUMNS:
+        values = columns[name]
+        if name in schema["numeric"]:
+            values = numeric_values(columns, name)
+            if values.dtype == np.float32:
+                values = values.astype(str).astype(np.float64)
+        frame[name] = values
+    return pd.DataFrame(frame)
+
+
+def catalog_frame(columns, schema):
+    """
+    Builds the processed catalog DataFrame (rows with an overview, genre lists
+    normalized like `catalog.extract_genres`) with typed columns.
+    """
+    keep = np.flatnonzero(np.array([v is not None for v in columns["overview"]], dtype=bool))
+    normalized = [name.lower().replace(" ", "") for name in schema["genres"]]
+    frame = {}
+    for name in RAW_COLUMNS:
+        if name == "Genres":
+            frame[name] = pd.Series(genre_lists(columns, normalized, keep.tolist()), dtype=object)
+        elif name in schema["numeric"]:
+            frame[name] = numeric_values(columns, name, keep)
+        else:
+            values = columns[name][keep]
+            frame[name] = pd.Series(values, dtype=object).where(pd.notnull(values), np.nan)
+    return pd.DataFrame(frame)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    convert_parser = commands.add_parser("convert", help="convert the raw CSV into the columnar store")
+    convert_parser.add_argument("--csv", default=os.getenv("CATALOG_SOURCE_PATH", "./data/10000 Movies Data"))
+    convert_parser.add_argument("--out", default=COLUMNS_PATH)
+    convert_parser.add_argument("--chunk-rows", type=int, default=50000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    schema = convert_csv(args.csv, args.out, args.chunk_rows)
+    print(f"✅ Converted {schema['rows']} rows, {len(schema['genres'])} genres in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
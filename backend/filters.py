@@ -0,0 +1,133 @@
+"""
+Structured catalog filters, applied before scoring.
+
+Requests like "comedies from 2011 on rated at least 7" are compiled into a
+bitmask over the catalog, and only the surviving movies are scored, so a
+selective filter makes a request cheaper instead of adding a pass over the
+output.
+
+    genres / exclude_genres     precomputed per-genre bitmasks (one packed bit per movie)
+    min_/max_year               range lookups on pre-sorted columns: two binary
+    min_/max_vote_average       searches give the matching run of movie
+    min_vote_count              positions, which is set in the mask
+    min_/max_popularity
+
+The index is built once per catalog version, on first use.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Filter key -> (sorted column, bound)
+RANGE_FILTERS = {
+    "min_year": ("year", "min"),
+    "max_year": ("year", "max"),
+    "min_vote_average": ("vote_average", "min"),
+    "max_vote_average": ("vote_average", "max"),
+    "min_vote_count": ("vote_count", "min"),
+    "min_popularity": ("popularity", "min"),
+    "max_popularity": ("popularity", "max"),
+}
+GENRE_FILTERS = ("genres", "exclude_genres")
+
+
+def normalize_genre(name):
+    # Same normalization as catalog.extract_genres
+    return name.lower().replace(" ", "")
+
+
+def normalize_filters(filters):
+    """
+    Canonical form of a filter dict: unset entries dropped, genre names
+    normalized and sorted. Returns None when nothing is filtered.
+    """
+    if not filters:
+        return None
+    normalized = {}
+    for key, value in filters.items():
+        if value is None or (key in GENRE_FILTERS and not value):
+            continue
+        if key in GENRE_FILTERS:
+            normalized[key] = sorted({normalize_genre(name) for name in value})
+        elif key in RANGE_FILTERS:
+            normalized[key] = value
+        else:
+            raise ValueError(f"Unknown filter: {key}")
+    return normalized or None
+
+
+class FilterIndex:
+    """
+    Genre bitmasks and sorted numeric columns of one catalog version.
+    """
+
+    def __init__(self, movies):
+        self.n_movies = len(movies)
+        positions = {}
+        for i, genres in enumerate(movies['Genres']):
+            for genre in genres if isinstance(genres, list) else []:
+                positions.setdefault(genre, []).append(i)
+        self.genre_masks = {genre: self._mask_of(np.array(rows)) for genre, rows in positions.items()}
+
+        years = pd.to_datetime(movies['release_date'], errors='coerce').dt.year
+        self.columns = {"year": self._sorted_column(years.to_numpy(dtype=float))}
+        for name in ("vote_average", "vote_count", "popularity"):
+            values = movies[name].to_numpy()
+            # Widen float32 through its shortest repr, so a stored 7.1 matches
+            # min_vote_average=7.1 (see columnar.raw_frame)
+            if values.dtype == np.float32:
+                values = values.astype(str)
+            self.columns[name] = self._sorted_column(values.astype(np.float64))
+
+    @staticmethod
+    def _sorted_column(values):
+        # Rows without a value never match a range
+        known = np.flatnonzero(~np.isnan(values))
+        order = known[np.argsort(values[known], kind='stable')]
+        return values[order], order
+
+    def _mask_of(self, rows):
+        mask = np.zeros(self.n_movies, dtype=bool)
+        mask[rows] = True
+        return np.packbits(mask)
+
+    def _full_mask(self):
+        return self._mask_of(np.arange(self.n_movies))
+
+    def range_mask(self, column, low=None, high=None):
+        values, order = self.columns[column]
+        start = np.searchsorted(values, low, side='left') if low is not None else 0
+        end = np.searchsorted(values, high, side='right') if high is not None else len(values)
+        return self._mask_of(order[start:end])
+
+    def genre_mask(self, names):
+        mask = np.zeros((self.n_movies + 7) // 8, dtype=np.uint8)
+        for name in names:
+            if name in self.genre_masks:
+                mask |= self.genre_masks[name]
+        return mask
+
+    def compile(self, filters):
+        """
+        Returns the packed bitmask of movies passing `filters` (normalized, see
+        `normalize_filters`).
+        """
+        mask = self._full_mask()
+        bounds = {}
+        for key, value in filters.items():
+            if key in RANGE_FILTERS:
+                column, bound = RANGE_FILTERS[key]
+                bounds.setdefault(column, {})[bound] = value
+        for column, limits in bounds.items():
+            mask &= self.range_mask(column, limits.get("min"), limits.get("max"))
+        if "genres" in filters:
+            mask &= self.genre_mask(filters["genres"])
+        if "exclude_genres" in filters:
+            mask &= ~self.genre_mask(filters["exclude_genres"])
+        return mask
+
+    def candidates(self, filters):
+        """
+        Sorted catalog indices of the movies passing `filters`.
+        """
+        return np.flatnonzero(np.unpackbits(self.compile(filters), count=self.n_movies))
@@ -0,0 +1,100 @@
+"""
+Per-user genre histograms for user tags.
+
+A user's tag comes from the genre they watch most. Instead of collecting the
+genres of every history title on each request, every user keeps a small
+array of genre counts over the catalog's genre vocabulary, updated in
+O(genres of the movie) on every watch. The tag is then an argmax.
+
+Ties go to the genre seen most recently (and, within one movie, listed
+first), which is what `Counter.most_common` over the most-recent-first
+history picks: each genre also stores a recency stamp of its latest watch.
+"""
+
+import hashlib
+import io
+
+import numpy as np
+
+# Genres per movie are far fewer than this, so stamps of one event never collide
+_POSITIONS_PER_EVENT = 64
+
+
+def genre_vocabulary(title_to_genres):
+    """
+    Sorted display genre names occurring in a title -> genres map.
+    """
+    return sorted({genre for genres in title_to_genres.values() for genre in genres})
+
+
+def vocabulary_id(genre_names):
+    return hashlib.sha1("\n".join(genre_names).encode("utf-8")).hexdigest()[:16]
+
+
+def empty_counts(n_genres):
+    return {
+        "counts": np.zeros(n_genres, dtype=np.int32),
+        "last_seen": np.zeros(n_genres, dtype=np.int64),
+        "events": 0,
+    }
+
+
+def add_movie(histogram, genres, genre_index, count=True):
+    """
+    Records a watch of a movie with display genres `genres`. With
+    count=False (a re-watch already counted) only the recency is updated.
+    """
+    histogram["events"] += 1
+    stamp = histogram["events"] * _POSITIONS_PER_EVENT
+    for position, genre in enumerate(genres):
+        i = genre_index.get(genre)
+        if i is None:
+            continue
+        if count:
+            histogram["counts"][i] += 1
+        histogram["last_seen"][i] = stamp - position
+    return histogram
+
+
+def build_counts(titles_oldest_first, title_to_genres, genre_index):
+    histogram = empty_counts(len(genre_index))
+    for title in titles_oldest_first:
+        add_movie(histogram, title_to_genres.get(title) or [], genre_index)
+    return histogram
+
+
+def top_genre(histogram, genre_names):
+    """
+    The most watched genre (most recent among ties), or None without any.
+    """
+    counts = histogram["counts"]
+    if len(counts) == 0 or counts.max() <= 0:
+        return None
+    tied = np.flatnonzero(counts == counts.max())
+    return genre_names[tied[np.argmax(histogram["last_seen"][tied])]]
+
+
+def serialize_counts(histogram, vocabulary=""):
+    """
+    `vocabulary` identifies the genre list the counts refer to (see
+    `vocabulary_id`), so the counts can be rebuilt when it changes.
+    """
+    buffer = io.BytesIO()
+    np.savez(
+        buffer,
+        counts=histogram["counts"],
+        last_seen=histogram["last_seen"],
+        events=np.int64(histogram["events"]),
+        vocabulary=np.str_(vocabulary),
+    )
+    return buffer.getvalue()
+
+
+def deserialize_counts(blob):
+    arrays = np.load(io.BytesIO(blob))
+    return {
+        "counts": arrays["counts"].astype(np.int32),
+        "last_seen": arrays["last_seen"].astype(np.int64),
+        "events": int(arrays["events"]),
+        "vocabulary": str(arrays["vocabulary"]),
+    }
@@ -0,0 +1,99 @@
+"""
+Fixed-width hashed TF-IDF features, an alternative to the fitted TfidfVectorizer.
+
+A fitted TfidfVectorizer keeps a Python dict with every term of the corpus,
+which grows with the catalog and is unpickled by every worker.
+`HashingTfidfVectorizer` instead hashes each term to one of `n_features`
+columns (sklearn's HashingVectorizer, with the same tokenizer and English
+stop words) and only stores one IDF weight per column:
+
+    memory     n_features float32 weights (1 MB at 2**18), whatever the corpus
+    sharding   chunk document frequencies are fixed-width arrays that just sum
+    queries    transform without any vocabulary lookup
+
+Rows are raw term counts times smoothed IDF, L2-normalized, exactly as with
+TfidfVectorizer(stop_words='english'), except that terms sharing a column are
+merged. Select it with TEXT_FEATURES=hashing (see catalog.make_vectorizer) or
+`build_artifacts.py --features hashing`; benchmarks/bench_features.py compares
+its rankings with the fitted vocabulary.
+"""
+
+import hashlib
+
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+DEFAULT_FEATURES = 2 ** 18
+
+
+def text_features_mode(vectorizer):
+    return "hashing" if isinstance(vectorizer, HashingTfidfVectorizer) else "tfidf"
+
+
+def feature_count(vectorizer):
+    """
+    Number of matrix columns a fitted vectorizer of either mode produces.
+    """
+    if isinstance(vectorizer, HashingTfidfVectorizer):
+        return vectorizer.n_features
+    return len(vectorizer.vocabulary_)
+
+
+class HashingTfidfVectorizer:
+    def __init__(self, n_features=DEFAULT_FEATURES):
+        self.n_features = n_features
+        self.hasher = HashingVectorizer(
+            n_features=n_features, stop_words='english', alternate_sign=False, norm=None
+        )
+        self.idf_ = None
+        self.n_documents_ = 0
+
+    def build_analyzer(self):
+        return self.hasher.build_analyzer()
+
+    def document_frequencies(self, texts):
+        """
+        Number of `texts` containing each column, as an int64 array of n_features.
+        """
+        counts = self.hasher.transform(texts)
+        return np.bincount(counts.indices, minlength=self.n_features)
+
+    def set_document_frequencies(self, document_frequencies, n_documents):
+        # smooth_idf=True, as in TfidfTransformer.fit
+        df = np.asarray(document_frequencies, dtype=np.float64)
+        self.idf_ = (np.log((1 + n_documents) / (1 + df)) + 1).astype(np.float32)
+        self.n_documents_ = n_documents
+        return self
+
+    def fit(self, texts):
+        texts = list(texts)
+        return self.set_document_frequencies(self.document_frequencies(texts), len(texts))
+
+    def transform(self, texts):
+        counts = self.hasher.transform(texts)
+        counts.data *= self.idf_[counts.indices]
+        return normalize(counts, copy=False)
+
+    def fit_transform(self, texts):
+        texts = list(texts)
+        return self.fit(texts).transform(texts)
+
+    def unknown_share(self, texts):
+        """
+        Share of analyzed tokens in `texts` whose column no fitted document
+        had (0.0 for no tokens), the counterpart of an out-of-vocabulary rate.
+        """
+        counts = self.hasher.transform(texts)
+        total = counts.data.sum()
+        if not total:
+            return 0.0
+        unseen_idf = np.float32(np.log(1 + self.n_documents_) + 1)
+        return float(counts.data[self.idf_[counts.indices] >= unseen_idf].sum() / total)
+
+    def feature_space_id(self):
+        """
+        Fingerprint of the column mapping, which unlike a fitted vocabulary
+        doesn't change with a refit.
+        """
+        return hashlib.sha1(f"hashing:{self.n_features}:english".encode()).hexdigest()[:12]
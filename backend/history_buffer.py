@@ -0,0 +1,167 @@
+"""
+Write-behind buffer for watch-history events.
+
+Recording a watch used to cost several synchronous database writes before
+/history/add could answer. In write-behind mode (HISTORY_WRITE_BEHIND) the
+route only appends the event to this buffer and returns:
+
+    log        every event is first appended as one JSON line to a local
+               log file (flushed to the OS, fsynced with HISTORY_LOG_FSYNC),
+               so a crashed process loses nothing: `recover` reads the
+               unflushed events back on the next start
+    pending    events waiting to be written, oldest first, by user, so the
+               readers of the watch history (titles, /history, profiles,
+               seen bitsets, tags) can overlay them on what the database has
+    flusher    a background task writes pending events in one transaction
+               per batch, every `flush_interval` seconds or as soon as
+               `max_events` are waiting, then drops them from the log
+
+Replaying an event that was written just before a crash (and not yet
+dropped from the log) is a no-op: main.py's `write_history_event` skips
+events no newer than the stored row for the movie. Must only be used from
+the event loop thread.
+"""
+
+import asyncio
+import json
+import os
+from datetime import datetime
+
+import metrics
+
+HISTORY_BUFFER_PENDING = metrics.gauge(
+    "history_buffer_pending",
+    "Watch-history events acknowledged but not yet written to the database.",
+)
+HISTORY_BUFFER_FLUSHES = metrics.counter(
+    "history_buffer_flushes_total",
+    "Batches of buffered watch-history events by outcome.",
+    ("result",),
+)
+
+
+def encode_event(event):
+    return json.dumps({**event, "watched_at": event["watched_at"].isoformat()})
+
+
+def decode_event(line):
+    event = json.loads(line)
+    event["watched_at"] = datetime.fromisoformat(event["watched_at"])
+    return event
+
+
+class HistoryBuffer:
+    """
+    Pending watch events ({"id", "user_id", "movie_id", "movie_name",
+    "watched_at"}) and their append-only log.
+    """
+
+    def __init__(self, log_path, flush_interval=0.2, max_events=500, fsync=False):
+        self.log_path = log_path
+        self.flush_interval = flush_interval
+        self.max_events = max_events
+        self.fsync = fsync
+        self.events = []
+        self.by_user = {}
+        self.log = None
+        self.wakeup = asyncio.Event()
+
+    def recover(self):
+        """
+        Loads the events a previous process logged but did not flush and
+        opens the log for appending. Returns the number of recovered events.
+        """
+        events = []
+        if os.path.exists(self.log_path):
+            with open(self.log_path) as f:
+                for line in f:
+                    try:
+                        events.append(decode_event(line))
+                    except ValueError:
+                        break  # torn last line of a crashed write, never acknowledged
+        self.events = events
+        self.reindex()
+        self.rewrite_log()
+        return len(events)
+
+    def reindex(self):
+        self.by_user = {}
+        for event in self.events:
+            self.by_user.setdefault(event["user_id"], []).append(event)
+        HISTORY_BUFFER_PENDING.set(len(self.events))
+
+    def rewrite_log(self):
+        # Pending events only, swapped in atomically
+        if self.log is not None:
+            self.log.close()
+        temp_path = f"{self.log_path}.tmp"
+        with open(temp_path, "w") as f:
+            f.writelines(encode_event(event) + "\n" for event in self.events)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.log_path)
+        self.log = open(self.log_path, "a")
+
+    def append(self, event):
+        """
+        Logs an event and adds it to the pending events. Once this returns,
+        the event survives a crash of this process.
+        """
+        self.log.write(encode_event(event) + "\n")
+        self.log.flush()
+        if self.fsync:
+            os.fsync(self.log.fileno())
+        self.events.append(event)
+        self.by_user.setdefault(event["user_id"], []).append(event)
+        HISTORY_BUFFER_PENDING.set(len(self.events))
+        if len(self.events) >= self.max_events:
+            self.wakeup.set()
+
+    def pending(self, user_id):
+        """
+        The user's pending events, oldest first.
+        """
+        return list(self.by_user.get(user_id, ()))
+
+    def latest_watched_at(self, user_id):
+        events = self.by_user.get(user_id)
+        return max(e["watched_at"] for e in events) if events else None
+
+    async def flush(self, apply_batch):
+        """
+        Writes all pending events with `apply_batch` (a coroutine function
+        taking a list of events, one transaction per call), `max_events` at a
+        time. Events stay pending (and logged) if a batch fails.
+        """
+        while self.events:
+            batch = self.events[:self.max_events]
+            try:
+                await apply_batch(batch)
+            except Exception:
+                HISTORY_BUFFER_FLUSHES.inc(result="error")
+                raise
+            HISTORY_BUFFER_FLUSHES.inc(result="ok")
+            del self.events[:len(batch)]
+            self.reindex()
+            self.rewrite_log()
+
+    async def run(self, apply_batch):
+        """
+        Flushes every `flush_interval` seconds, or early once `max_events`
+        are pending.
+        """
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            try:
+                await self.flush(apply_batch)
+            except Exception as e:
+                print(f"⚠️ History flush failed, retrying: {e}")
+
+    def close(self):
+        if self.log is not None:
+            self.log.close()
+            self.log = None
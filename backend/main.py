@@ -1,27 +1,47 @@
-from fastapi import FastAPI, HTTPException, Depends, Response, status, Query, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, Depends, Header, Request, Response, status, Query, UploadFile, File, Form
+from fastapi import WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, ORJSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from starlette.routing import Match
 from passlib.context import CryptContext
 from jose import jwt, JWTError
 from pydantic import BaseModel
 from typing import Optional, List, Dict
 from dotenv import load_dotenv
-import databases, sqlalchemy, joblib, asyncio, os, uuid
+import databases, sqlalchemy, joblib, asyncio, hmac, multiprocessing, orjson, os, sqlite3, tempfile, time, uuid
 import sqlalchemy
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 import pandas as pd
+import numpy as np
 import base64
-from sqlalchemy import select
-
+from sqlalchemy import select, func
+
+import artifact_registry
+import blend_channels
+import genre_counts
+import history_buffer
+import metrics
+import pagination
+import precompute
+import profiler
+import profiles
+import seen_movies
+import singleflight
+import voice
+import voice_cache
+import voice_stream
+
+import model
 from model import (
     recommend_movies_by_mood,
+    rank_by_mood,
     recommend_blend,
-    assign_tag_from_movie_history,
-    handle_voice_search,
-    extract_genres,
     create_blend_code,
     join_blend_code,
-    movie_title_to_genres
+    movie_title_to_genres,
+    movie_vector
 )
 
 # Load environment variables
@@ -32,6 +52,62 @@ DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./users.db")
 SECRET_KEY = os.getenv("SECRET_KEY", "secret")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 
+# Cursor pagination for history and blend recommendations
+PAGINATION_MAX_RESULTS = int(os.getenv("PAGINATION_MAX_RESULTS", "500"))
+CURSOR_TTL_SECONDS = float(os.getenv("CURSOR_TTL_SECONDS", "300"))
+
+# Precompute-and-serve mode for /recommend/history; rankings are stored at
+# least PAGINATION_MAX_RESULTS deep so every cursor page can be served from them
+PRECOMPUTE_RECS = os.getenv("PRECOMPUTE_RECS", "false").lower() == "true"
+PRECOMPUTE_DB_PATH = os.getenv("PRECOMPUTE_DB_PATH", "./precomputed_recs.db")
+PRECOMPUTE_TOP_N = int(os.getenv("PRECOMPUTE_TOP_N", str(PAGINATION_MAX_RESULTS)))
+PRECOMPUTE_INTERVAL_SECONDS = float(os.getenv("PRECOMPUTE_INTERVAL_SECONDS", "30"))
+PRECOMPUTE_MAX_STALENESS_SECONDS = float(os.getenv("PRECOMPUTE_MAX_STALENESS_SECONDS", "300"))
+
+# Recency-weighted user profiles, updated incrementally on /history/add
+DECAYED_PROFILES = os.getenv("DECAYED_PROFILES", "false").lower() == "true"
+PROFILE_HALF_LIFE_DAYS = float(os.getenv("PROFILE_HALF_LIFE_DAYS", "90"))
+PROFILE_MAX_EVENTS = int(os.getenv("PROFILE_MAX_EVENTS", "200"))
+
+# Hot swap of the artifact version named in artifacts/CURRENT (see artifact_registry.py)
+ARTIFACT_POLL_SECONDS = float(os.getenv("ARTIFACT_POLL_SECONDS", "10"))
+
+# On-demand request profiling and /admin routes, both disabled unless ADMIN_TOKEN is set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+PROFILE_HEADER = "X-Profile"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./request_profiles")
+PROFILE_INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_SECONDS", "0.005"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+
+# Streaming voice search over /ws/recommend/voice (see voice_stream.py)
+VOICE_STREAM_INTERVAL_SECONDS = float(os.getenv("VOICE_STREAM_INTERVAL_SECONDS", "1.0"))
+VOICE_STREAM_MAX_SECONDS = float(os.getenv("VOICE_STREAM_MAX_SECONDS", "60"))
+
+# Whisper transcription in a pool of this many worker processes, so API
+# processes never import whisper/torch (0 = in a thread of this process, see voice.py)
+VOICE_WORKERS = int(os.getenv("VOICE_WORKERS", "0"))
+
+# Voice caches: audio hash -> transcript, transcript + profile -> recommendations (0 disables)
+VOICE_TRANSCRIPT_CACHE_SIZE = int(os.getenv("VOICE_TRANSCRIPT_CACHE_SIZE", "1024"))
+VOICE_RESULT_CACHE_SIZE = int(os.getenv("VOICE_RESULT_CACHE_SIZE", "4096"))
+
+# How blends aggregate per-member scores: average, least_misery, fairness or union (see model.rank_blend)
+BLEND_STRATEGY = os.getenv("BLEND_STRATEGY", "average")
+
+# Pushed blend updates over /blend/{code}/events (Server-Sent Events)
+BLEND_EVENTS_KEEPALIVE_SECONDS = float(os.getenv("BLEND_EVENTS_KEEPALIVE_SECONDS", "15"))
+
+# Also leave movies on the user's watchlists out of recommendations (see seen_movies.py)
+EXCLUDE_WATCHLIST = os.getenv("EXCLUDE_WATCHLIST", "false").lower() == "true"
+
+# Write-behind mode for /history/add: events are logged locally, acknowledged and
+# written in batches every HISTORY_FLUSH_INTERVAL_MS or HISTORY_FLUSH_MAX_EVENTS (see history_buffer.py)
+HISTORY_WRITE_BEHIND = os.getenv("HISTORY_WRITE_BEHIND", "false").lower() == "true"
+HISTORY_LOG_PATH = os.getenv("HISTORY_LOG_PATH", "./history_events.log")
+HISTORY_LOG_FSYNC = os.getenv("HISTORY_LOG_FSYNC", "false").lower() == "true"
+HISTORY_FLUSH_INTERVAL_MS = float(os.getenv("HISTORY_FLUSH_INTERVAL_MS", "200"))
+HISTORY_FLUSH_MAX_EVENTS = int(os.getenv("HISTORY_FLUSH_MAX_EVENTS", "500"))
+
 # === App & Middleware ===
 app = FastAPI(title="Movie Recommendation API")
 
@@ -42,6 +118,78 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    "http_request_duration_seconds",
+    "Request latency by method, route template and status code.",
+    ("method", "route", "status"),
+)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    if not metrics.ENABLED:
+        return await call_next(request)
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Use the route template so /blend/{code} is one series, not one per code
+    route = request.scope.get("route")
+    HTTP_REQUEST_SECONDS.observe(
+        time.perf_counter() - start,
+        method=request.method,
+        route=route.path if route is not None else "unmatched",
+        status=str(response.status_code),
+    )
+    return response
+
+@app.middleware("http")
+async def report_artifact_version(request: Request, call_next):
+    """
+    Sets X-Artifact-Version to the catalog version(s) that served the request.
+    """
+    served = set()
+    model.served_versions.set(served)
+    response = await call_next(request)
+    response.headers["X-Artifact-Version"] = ",".join(map(str, sorted(served))) or str(model.catalog.version)
+    return response
+
+def is_admin_token(token: Optional[str]) -> bool:
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(token, ADMIN_TOKEN)
+
+def route_endpoint(scope):
+    # Endpoint the router will dispatch `scope` to, if any
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "endpoint", None)
+    return None
+
+async def profile_requests(request: Request, call_next):
+    """
+    Runs a request under the sampling profiler when it carries
+    `X-Profile: <ADMIN_TOKEN>`, and returns the stored profile's id in the
+    `X-Profile-Id` response header.
+    """
+    if PROFILE_HEADER not in request.headers or not is_admin_token(request.headers[PROFILE_HEADER]):
+        return await call_next(request)
+    sampler = profiler.try_start(PROFILE_INTERVAL_SECONDS, route_endpoint(request.scope))
+    if sampler is None:
+        # Another request is being profiled, serve this one normally
+        return await call_next(request)
+    try:
+        response = await call_next(request)
+    finally:
+        profiler.finish(sampler)
+    route = request.scope.get("route")
+    profile_id = await asyncio.to_thread(
+        profiler.save_profile, sampler, PROFILE_DIR,
+        f"{request.method} {route.path if route is not None else request.url.path}", PROFILE_MAX_FILES
+    )
+    response.headers["X-Profile-Id"] = profile_id
+    return response
+
+# Only installed when profiling is possible, so it costs nothing otherwise
+if ADMIN_TOKEN:
+    app.middleware("http")(profile_requests)
+
 # === Models ===
 class UserCreate(BaseModel):
     username: str
@@ -86,9 +234,22 @@ class WatchHistoryItem(BaseModel):
     poster_path: str
     release_date: str
 
+class MovieFilters(BaseModel):
+    # Applied before scoring (see filters.py); bounds are inclusive
+    genres: Optional[List[str]] = None  # any of these
+    exclude_genres: Optional[List[str]] = None
+    min_year: Optional[int] = None  # release year
+    max_year: Optional[int] = None
+    min_vote_average: Optional[float] = None
+    max_vote_average: Optional[float] = None
+    min_vote_count: Optional[int] = None
+    min_popularity: Optional[float] = None
+    max_popularity: Optional[float] = None
+
 class RecommendationRequest(BaseModel):
     mood: str
     top_n: int = 10
+    filters: Optional[MovieFilters] = None
 
 class MovieRecommendation(BaseModel):
     title: str
@@ -102,10 +263,13 @@ class RecommendationResponse(BaseModel):
 
 class HistoryRecommendationRequest(BaseModel):
     top_n: int = 10
+    cursor: Optional[str] = None  # next_cursor from the previous page
+    filters: Optional[MovieFilters] = None
 
 class HistoryRecommendationResponse(BaseModel):
     recommendations: List[MovieRecommendation]
     overall_match_score: str
+    next_cursor: Optional[str] = None
 
 class VoiceRecommendationRequest(BaseModel):
     top_n: int = 10
@@ -133,6 +297,7 @@ class BlendInvitationOut(BaseModel):
 
 class BlendJoinRequest(BaseModel):
     code: str
+    top_n: int = 50
 
 class BlendRecommendation(BaseModel):
     title: str
@@ -148,15 +313,54 @@ class BlendResponse(BaseModel):
     user_tags: Dict[str, str]
     recommendations: List[BlendRecommendation]
     overall_match_score: str
+    next_cursor: Optional[str] = None
 
 class BlendSummary(BaseModel):
     code: str
     name: str
 
 # === Database Setup ===
-database = databases.Database(DATABASE_URL)
+DB_QUERY_SECONDS = metrics.histogram(
+    "db_query_seconds",
+    "Database round-trip time by operation.",
+    ("op",),
+)
+
+class InstrumentedDatabase(databases.Database):
+    """
+    databases.Database that records the round-trip time of every query.
+    """
+    async def fetch_all(self, *args, **kwargs):
+        with DB_QUERY_SECONDS.time(op="fetch_all"):
+            return await super().fetch_all(*args, **kwargs)
+
+    async def fetch_one(self, *args, **kwargs):
+        with DB_QUERY_SECONDS.time(op="fetch_one"):
+            return await super().fetch_one(*args, **kwargs)
+
+    async def fetch_val(self, *args, **kwargs):
+        with DB_QUERY_SECONDS.time(op="fetch_val"):
+            return await super().fetch_val(*args, **kwargs)
+
+    async def execute(self, *args, **kwargs):
+        with DB_QUERY_SECONDS.time(op="execute"):
+            return await super().execute(*args, **kwargs)
+
+    async def execute_many(self, *args, **kwargs):
+        with DB_QUERY_SECONDS.time(op="execute_many"):
+            return await super().execute_many(*args, **kwargs)
+
+database = InstrumentedDatabase(DATABASE_URL)
 metadata = sqlalchemy.MetaData()
 
+# Constraint violations as raised by each database driver
+INTEGRITY_ERRORS = (sqlite3.IntegrityError, sqlalchemy.exc.IntegrityError)
+try:
+    import asyncpg
+    INTEGRITY_ERRORS += (asyncpg.exceptions.IntegrityConstraintViolationError,)
+except ImportError:
+    pass
+
 users = sqlalchemy.Table(
     "users", metadata,
     sqlalchemy.Column("id", sqlalchemy.String, primary_key=True),
@@ -191,6 +395,29 @@ watch_history = sqlalchemy.Table(
     sqlalchemy.Column("watched_at", sqlalchemy.DateTime),
 )
 
+# --- Decayed user profiles (one row per user, see profiles.py) ---
+user_profiles = sqlalchemy.Table(
+    "user_profiles", metadata,
+    sqlalchemy.Column("user_id", sqlalchemy.String, sqlalchemy.ForeignKey("users.id"), primary_key=True),
+    sqlalchemy.Column("profile", sqlalchemy.LargeBinary),
+    sqlalchemy.Column("updated_at", sqlalchemy.DateTime),
+)
+
+# --- Per-user genre counts behind user tags (one row per user, see genre_counts.py) ---
+user_genre_counts = sqlalchemy.Table(
+    "user_genre_counts", metadata,
+    sqlalchemy.Column("user_id", sqlalchemy.String, sqlalchemy.ForeignKey("users.id"), primary_key=True),
+    sqlalchemy.Column("counts", sqlalchemy.LargeBinary),
+)
+
+# --- Per-user seen-movie bitsets over catalog positions (one row per user, see seen_movies.py) ---
+user_seen_movies = sqlalchemy.Table(
+    "user_seen_movies", metadata,
+    sqlalchemy.Column("user_id", sqlalchemy.String, sqlalchemy.ForeignKey("users.id"), primary_key=True),
+    sqlalchemy.Column("history", sqlalchemy.LargeBinary),
+    sqlalchemy.Column("watchlist", sqlalchemy.LargeBinary),
+)
+
 # --- Blend tables ---
 blends = sqlalchemy.Table(
     "blends", metadata,
@@ -252,6 +479,15 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
 
 
 # === Startup/Shutdown ===
+precompute_task = None
+artifact_task = None
+artifact_label = None
+precomputed_catalog_version = None
+history_flush_task = None
+history_events = history_buffer.HistoryBuffer(
+    HISTORY_LOG_PATH, HISTORY_FLUSH_INTERVAL_MS / 1000, HISTORY_FLUSH_MAX_EVENTS, HISTORY_LOG_FSYNC
+) if HISTORY_WRITE_BEHIND else None
+
 @app.on_event("startup")
 async def startup():
     await database.connect()
@@ -260,7 +496,10 @@ async def startup():
         tfidf = joblib.load("./artifacts/tfidf_vectorizer.joblib")
         tfidf_matrix = joblib.load("./artifacts/tfidf_matrix.joblib")
         movies = joblib.load("./artifacts/movies_dataframe.joblib")
-        content_sim = joblib.load("./artifacts/content_sim.joblib")
+        content_sim = (
+            joblib.load("./artifacts/content_sim.joblib")
+            if os.path.exists("./artifacts/content_sim.joblib") else None
+        )
         mood_genre_mapping = joblib.load("./artifacts/mood_genre_mapping.joblib")
         print("✅ All ML artifacts loaded successfully")
     except Exception as e:
@@ -268,10 +507,82 @@ async def startup():
         # Initialize with empty/default values
         movies = pd.DataFrame()
 
+    global artifact_task
+    try:
+        await reload_catalog()
+    except Exception as e:
+        print(f"⚠️ Warning: Could not load artifact version, serving the built-in catalog: {e}")
+    if ARTIFACT_POLL_SECONDS > 0:
+        artifact_task = asyncio.create_task(artifact_watcher())
+
+    if PRECOMPUTE_RECS:
+        global precompute_task
+        precompute.init_store(PRECOMPUTE_DB_PATH)
+        precompute_task = asyncio.create_task(precompute_worker())
+
+    if history_events is not None:
+        global history_flush_task
+        recovered = history_events.recover()
+        if recovered:
+            print(f"🔄 Recovered {recovered} unflushed watch-history events")
+        history_flush_task = asyncio.create_task(history_events.run(apply_history_batch))
+
 @app.on_event("shutdown")
 async def shutdown():
+    if artifact_task is not None:
+        artifact_task.cancel()
+    if precompute_task is not None:
+        precompute_task.cancel()
+        precompute.close_store()
+    if voice_pool is not None:
+        voice_pool.shutdown(cancel_futures=True)
+    if history_flush_task is not None:
+        history_flush_task.cancel()
+        try:
+            await history_flush_task  # let a batch in progress roll back first
+        except asyncio.CancelledError:
+            pass
+        try:
+            await history_events.flush(apply_history_batch)
+        except Exception as e:
+            print(f"⚠️ Warning: Watch-history events left in {HISTORY_LOG_PATH}: {e}")
+        history_events.close()
     await database.disconnect()
 
+async def reload_catalog():
+    """
+    Loads and validates the artifact version named in CURRENT when it differs
+    from the one being served (a new publish or a rollback), then swaps it in.
+    Loading happens off the event loop and the swap is a single reference
+    assignment, so in-flight requests finish on the old version.
+    """
+    global artifact_label, movies
+    label = artifact_registry.current_label()
+    if label is None or label == artifact_label:
+        return
+    # Remember the label even if it fails validation, so a broken version is
+    # reported once instead of on every poll
+    artifact_label = label
+    new_catalog = await asyncio.to_thread(artifact_registry.load_version, label)
+    model.swap_catalog(new_catalog)
+    movies = new_catalog.movies
+    print(f"🔄 Artifact version {label} loaded ({len(new_catalog)} movies)")
+    blend_hub.notify_all()
+
+async def artifact_watcher():
+    while True:
+        await asyncio.sleep(ARTIFACT_POLL_SECONDS)
+        try:
+            await reload_catalog()
+        except Exception as e:
+            print(f"⚠️ Artifact reload error, still serving v{model.catalog.version}: {e}")
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
 # === Auth Routes ===
 @app.post("/signup")
 async def signup(user: UserCreate):
@@ -307,71 +618,539 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
 async def read_users_me(user=Depends(get_current_user)):
     return {"id": user["id"], "username": user["username"]}
 
+# === User Profile Helpers ===
+async def fetch_history_titles(user_id: str):
+    """
+    Returns the user's watched titles, most recent first.
+    """
+    with metrics.timer("history_fetch"):
+        movie_rows = await database.fetch_all(
+            watch_history.select()
+            .where(watch_history.c.user_id == user_id)
+            .order_by(watch_history.c.watched_at.desc())
+        )
+    return [m["movie_name"] for m in with_pending_history(user_id, movie_rows)]
+
+def pending_history(user_id: str):
+    """
+    The user's watch events still in the write-behind buffer, oldest first.
+    """
+    return history_events.pending(user_id) if history_events is not None else []
+
+def with_pending_history(user_id: str, rows):
+    """
+    Watch history rows (most recent first) with the user's buffered events
+    on top, each replacing the row of the same movie.
+    """
+    pending = pending_history(user_id)
+    if not pending:
+        return rows
+    latest = {event["movie_id"]: event for event in pending}
+    buffered = sorted(latest.values(), key=lambda event: event["watched_at"], reverse=True)
+    return buffered + [row for row in rows if row["movie_id"] not in latest]
+
+async def load_user_profile(user_id: str):
+    row = await database.fetch_one(user_profiles.select().where(user_profiles.c.user_id == user_id))
+    if row is None:
+        return None
+    current = model.catalog
+    profile = profiles.deserialize_profile(row["profile"], current.tfidf_matrix.shape[1], row["updated_at"])
+    if profile["vocabulary"] != current.vocabulary_id:
+        # Built against another vocabulary (or before profiles recorded one):
+        # drop it so the caller rebuilds it from the watch history
+        await database.execute(user_profiles.delete().where(user_profiles.c.user_id == user_id))
+        return None
+    return profile
+
+async def save_user_row(table, user_id: str, values: dict, exists: bool):
+    """
+    Writes a user's row of a per-user table. `exists` comes from an earlier
+    read, so a concurrent first write (two requests backfilling the same
+    user) may have inserted the row since; the insert then becomes an update.
+    The insert runs in a nested transaction (a savepoint inside an enclosing
+    one, as in apply_history_batch) so a failed insert leaves the enclosing
+    transaction usable on Postgres.
+    """
+    if not exists:
+        try:
+            async with database.transaction():
+                await database.execute(table.insert().values(user_id=user_id, **values))
+            return
+        except INTEGRITY_ERRORS:
+            if await database.fetch_val(select(table.c.user_id).where(table.c.user_id == user_id)) is None:
+                raise
+    await database.execute(table.update().where(table.c.user_id == user_id).values(**values))
+
+async def save_user_profile(user_id: str, profile, exists: bool):
+    values = {
+        "profile": profiles.serialize_profile(profile, model.catalog.vocabulary_id),
+        "updated_at": profile["updated_at"]
+    }
+    await save_user_row(user_profiles, user_id, values, exists)
+
+async def backfill_user_profile(user_id: str):
+    """
+    Builds and stores a profile from the full watch history. Only runs once per
+    user, for histories recorded before profiles were stored.
+    """
+    rows = await database.fetch_all(
+        watch_history.select()
+        .where(watch_history.c.user_id == user_id)
+        .order_by(watch_history.c.watched_at.asc())
+    )
+    events = []
+    for r in rows:
+        vector = movie_vector(r["movie_id"], r["movie_name"])
+        if vector is not None:
+            events.append((vector, r["watched_at"]))
+    if not events:
+        return None
+    profile = profiles.build_profile(
+        events, model.catalog.tfidf_matrix.shape[1], PROFILE_HALF_LIFE_DAYS, PROFILE_MAX_EVENTS
+    )
+    await save_user_profile(user_id, profile, exists=False)
+    return profile
+
+async def get_profile_vector(user_id: str):
+    """
+    Returns the user's decayed profile vector, or None when decayed profiles are
+    disabled (recommenders then average the history as before).
+    """
+    if not DECAYED_PROFILES:
+        return None
+    profile = await load_user_profile(user_id)
+    if profile is None:
+        profile = await backfill_user_profile(user_id)
+    return profiles.profile_vector(with_pending_profile_events(user_id, profile))
+
+def with_pending_profile_events(user_id: str, profile):
+    """
+    A copy of the stored profile with the user's buffered watch events folded in.
+    """
+    pending = pending_history(user_id)
+    if not pending:
+        return profile
+    profile = dict(profile) if profile is not None else profiles.empty_profile(model.catalog.tfidf_matrix.shape[1])
+    for event in pending:
+        vector = movie_vector(event["movie_id"], event["movie_name"])
+        if vector is not None:
+            profiles.add_watch_event(
+                profile, vector, event["watched_at"], PROFILE_HALF_LIFE_DAYS, PROFILE_MAX_EVENTS
+            )
+    return profile
+
+async def get_blend_member_vectors(user_ids: List[str]):
+    """
+    Each member's decayed profile (None for members without one), or None when
+    decayed profiles are disabled. The blend ranking normalizes them, so every
+    member counts equally regardless of history length.
+    """
+    if not DECAYED_PROFILES:
+        return None
+    return [await get_profile_vector(uid) for uid in user_ids]
+
+async def record_profile_event(user_id: str, movie_id: str, movie_name: str, watched_at: datetime):
+    profile = await load_user_profile(user_id)
+    if profile is None:
+        # History already contains this event, so the backfill covers it
+        await backfill_user_profile(user_id)
+        return
+    vector = movie_vector(movie_id, movie_name)
+    if vector is None:
+        return
+    profiles.add_watch_event(profile, vector, watched_at, PROFILE_HALF_LIFE_DAYS, PROFILE_MAX_EVENTS)
+    await save_user_profile(user_id, profile, exists=True)
+
+async def save_genre_counts(user_id: str, histogram, exists: bool):
+    values = {"counts": genre_counts.serialize_counts(histogram, model.catalog.genre_vocabulary_id)}
+    await save_user_row(user_genre_counts, user_id, values, exists)
+
+async def backfill_genre_counts(user_id: str, exists: bool):
+    """
+    Builds and stores a user's genre counts from the full watch history: for
+    histories recorded before counts were stored, or after the catalog's genre
+    vocabulary changed.
+    """
+    rows = await database.fetch_all(
+        select(watch_history.c.movie_name)
+        .where(watch_history.c.user_id == user_id)
+        .order_by(watch_history.c.watched_at.asc())
+    )
+    current = model.catalog
+    histogram = genre_counts.build_counts(
+        [r["movie_name"] for r in rows], current.title_to_genres, current.genre_index
+    )
+    await save_genre_counts(user_id, histogram, exists)
+    return histogram
+
+async def load_genre_counts(user_ids: List[str]):
+    """
+    Returns {user_id: genre histogram} for the given users in one query,
+    backfilling the ones without usable counts.
+    """
+    rows = await database.fetch_all(user_genre_counts.select().where(user_genre_counts.c.user_id.in_(user_ids)))
+    stored = {r["user_id"]: genre_counts.deserialize_counts(r["counts"]) for r in rows}
+    vocabulary = model.catalog.genre_vocabulary_id
+    histograms = {}
+    for uid in user_ids:
+        histogram = stored.get(uid)
+        if histogram is None or histogram["vocabulary"] != vocabulary:
+            histogram = await backfill_genre_counts(uid, exists=histogram is not None)
+        histograms[uid] = histogram
+    return histograms
+
+async def get_member_tags(user_ids: List[str]):
+    """
+    Returns {user_id: tag} from the stored genre counts, without reading any
+    watch history rows (except to backfill).
+    """
+    histograms = await load_genre_counts(user_ids)
+    return {uid: model.tag_from_genre_counts(await with_pending_genre_events(uid, histograms[uid])) for uid in user_ids}
+
+async def with_pending_genre_events(user_id: str, histogram):
+    """
+    A copy of the stored genre counts with the user's buffered watch events
+    counted, except re-watches.
+    """
+    pending = pending_history(user_id)
+    if not pending:
+        return histogram
+    watched = {r["movie_id"] for r in await database.fetch_all(
+        select(watch_history.c.movie_id).where(
+            (watch_history.c.user_id == user_id) &
+            (watch_history.c.movie_id.in_([event["movie_id"] for event in pending]))
+        )
+    )}
+    histogram = {**histogram, "counts": histogram["counts"].copy(), "last_seen": histogram["last_seen"].copy()}
+    current = model.catalog
+    for event in pending:
+        genre_counts.add_movie(
+            histogram, current.title_to_genres.get(event["movie_name"]) or [], current.genre_index,
+            count=event["movie_id"] not in watched
+        )
+        watched.add(event["movie_id"])
+    return histogram
+
+async def record_genre_event(user_id: str, movie_name: str, already_watched: bool):
+    row = await database.fetch_one(user_genre_counts.select().where(user_genre_counts.c.user_id == user_id))
+    histogram = genre_counts.deserialize_counts(row["counts"]) if row is not None else None
+    current = model.catalog
+    if histogram is None or histogram["vocabulary"] != current.genre_vocabulary_id:
+        # History already contains this event, so the backfill covers it
+        await backfill_genre_counts(user_id, exists=row is not None)
+        return
+    # A re-watch replaces the earlier history row: only its recency changes
+    genre_counts.add_movie(
+        histogram, current.title_to_genres.get(movie_name) or [], current.genre_index, count=not already_watched
+    )
+    await save_genre_counts(user_id, histogram, exists=True)
+
+async def history_seen_bits(user_id: str):
+    rows = await database.fetch_all(
+        select(watch_history.c.movie_id, watch_history.c.movie_name).where(watch_history.c.user_id == user_id)
+    )
+    current = model.catalog
+    return seen_movies.build_bits(
+        model.seen_positions([(r["movie_id"], r["movie_name"]) for r in rows], current), len(current)
+    )
+
+async def watchlist_seen_bits(user_id: str):
+    rows = await database.fetch_all(
+        select(watchlists.c.movie_id, watchlists.c.movie_name)
+        .select_from(watchlists.join(watchlist_groups, watchlists.c.group_id == watchlist_groups.c.id))
+        .where(watchlist_groups.c.user_id == user_id)
+    )
+    current = model.catalog
+    return seen_movies.build_bits(
+        model.seen_positions([(r["movie_id"], r["movie_name"]) for r in rows], current), len(current)
+    )
+
+async def save_seen_bits(user_id: str, seen, exists: bool):
+    values = {"history": seen["history"].tobytes(), "watchlist": seen["watchlist"].tobytes()}
+    await save_user_row(user_seen_movies, user_id, values, exists)
+
+async def backfill_seen_bits(user_id: str, exists: bool):
+    """
+    Builds and stores a user's seen bitsets from their history and watchlist
+    rows: for users from before bitsets were stored, or after a catalog change
+    that invalidated them.
+    """
+    seen = {"history": await history_seen_bits(user_id), "watchlist": await watchlist_seen_bits(user_id)}
+    await save_seen_bits(user_id, seen, exists)
+    return seen
+
+def stored_seen_bits(row):
+    n_movies = len(model.catalog)
+    seen = {
+        "history": seen_movies.from_bytes(row["history"], n_movies),
+        "watchlist": seen_movies.from_bytes(row["watchlist"], n_movies)
+    }
+    return seen if seen["history"] is not None and seen["watchlist"] is not None else None
+
+async def load_seen_bits(user_ids: List[str]):
+    """
+    Returns {user_id: {"history", "watchlist"}} bitsets for the given users in
+    one query, backfilling the ones without usable bitsets.
+    """
+    rows = await database.fetch_all(user_seen_movies.select().where(user_seen_movies.c.user_id.in_(user_ids)))
+    stored = {r["user_id"]: stored_seen_bits(r) for r in rows}
+    result = {}
+    for uid in user_ids:
+        seen = stored.get(uid)
+        if seen is None:
+            seen = await backfill_seen_bits(uid, exists=uid in stored)
+        result[uid] = seen
+    return result
+
+async def get_seen_bits(user_ids: List[str]):
+    """
+    Bitset of the movies to leave out of recommendations for these users: all
+    they watched, and with EXCLUDE_WATCHLIST what is on their watchlists.
+    """
+    combined = seen_movies.empty_bits(len(model.catalog))
+    for seen in (await load_seen_bits(user_ids)).values():
+        combined |= seen["history"]
+        if EXCLUDE_WATCHLIST:
+            combined |= seen["watchlist"]
+    buffered = [(event["movie_id"], event["movie_name"]) for uid in user_ids for event in pending_history(uid)]
+    if buffered:
+        seen_movies.add_positions(combined, model.seen_positions(buffered))
+    return combined
+
+async def record_seen_event(user_id: str, movie_id: str, movie_name: str, kind: str):
+    """
+    Sets a movie in the user's "history" or "watchlist" bitset.
+    """
+    row = await database.fetch_one(user_seen_movies.select().where(user_seen_movies.c.user_id == user_id))
+    seen = stored_seen_bits(row) if row is not None else None
+    if seen is None:
+        # The row for this event is already written, so the backfill covers it
+        await backfill_seen_bits(user_id, exists=row is not None)
+    else:
+        idx = model.movie_index(movie_id, movie_name)
+        if idx is not None:
+            seen_movies.add_positions(seen[kind], [idx])
+            await save_seen_bits(user_id, seen, exists=True)
+    if kind == "watchlist" and EXCLUDE_WATCHLIST:
+        await notify_blends_of(user_id)
+
+async def refresh_watchlist_seen_bits(user_id: str):
+    """
+    Rebuilds the watchlist bitset after removals: a movie may still be on
+    another of the user's watchlists.
+    """
+    row = await database.fetch_one(user_seen_movies.select().where(user_seen_movies.c.user_id == user_id))
+    seen = stored_seen_bits(row) if row is not None else None
+    if seen is None:
+        await backfill_seen_bits(user_id, exists=row is not None)
+    else:
+        seen["watchlist"] = await watchlist_seen_bits(user_id)
+        await save_seen_bits(user_id, seen, exists=True)
+    if EXCLUDE_WATCHLIST:
+        await notify_blends_of(user_id)
+
 # === Recommendation Routes ===
 @app.post("/recommend", response_model=RecommendationResponse)
 async def recommend_by_mood(request: RecommendationRequest, user=Depends(get_current_user)):
     # Fetch the user's watch history from the DB
-    movie_rows = await database.fetch_all(
-        watch_history.select()
-        .where(watch_history.c.user_id == user["id"])
-        .order_by(watch_history.c.watched_at.desc())
-    )
-    user_history = [m["movie_name"] for m in movie_rows]
+    user_history = await fetch_history_titles(user["id"])
+    profile_vector = await get_profile_vector(user["id"])
+    seen = await get_seen_bits([user["id"]])
 
     try:
-        df = recommend_movies_by_mood(
+        indices, scores = await rank_once(
+            "mood", rank_by_mood,
             mood=request.mood,
             user_history_titles=user_history,
-            top_n=request.top_n
+            profile_vector=profile_vector,
+            filters=filter_values(request.filters),
+            seen=seen
         )
-        return {
-            "recommendations": [
-                {
-                    "title": row.title,
-                    "score": round(row.score, 4),
-                    "genres": row['Genres'],
-                    "poster_path": row['poster_path'],
-                    "release_date": row['release_date'],
-                    "id":row['Movie_id']
-                } for _, row in df.iterrows()
-            ]
-        }
+        top_n = request.top_n
+        # Trusted internal data: serialize directly instead of re-validating every row
+        return ORJSONResponse({
+            "recommendations": format_ranked_movies(indices[:top_n], np.round(scores[:top_n], 4), score_key="score")
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
-from model import recommend_for_user
+from model import rank_for_user, rank_blend, format_ranked_movies, overall_match_score
+
+def filter_values(filters: Optional[MovieFilters]):
+    """
+    The set filters of a request as a plain dict, or None without any.
+    """
+    values = filters.model_dump(exclude_none=True) if filters is not None else {}
+    return values or None
+
+EXECUTOR_IN_FLIGHT = metrics.gauge(
+    "executor_in_flight",
+    "Blocking calls currently queued or running in a worker thread.",
+    ("executor",),
+)
+
+async def run_in_thread(executor: str, func, *args, **kwargs):
+    """
+    asyncio.to_thread that tracks how many calls are waiting on the default
+    executor, and profiles the call as part of its request (see profiler.py).
+    """
+    EXECUTOR_IN_FLIGHT.inc(executor=executor)
+    try:
+        return await asyncio.to_thread(profiler.call_attached, func, *args, **kwargs)
+    finally:
+        EXECUTOR_IN_FLIGHT.dec(executor=executor)
+
+recommendation_flights = singleflight.SingleFlight("recommendations")
+
+async def rank_once(executor: str, func, *args, **kwargs):
+    """
+    Runs a ranking function in a worker thread. Identical concurrent calls
+    (same function, arguments and catalog version) share one run and its
+    result, which callers must treat as read-only.
+    """
+    key = singleflight.fingerprint(func.__name__, model.catalog.version, args, kwargs)
+    return await recommendation_flights.do(key, lambda: run_in_thread(executor, func, *args, **kwargs))
+
+def read_cursor_page(cursor: str, owner: str, page_size: int, shared_owner: str = None):
+    """
+    Resolves a cursor into (cached entry, page indices, page scores, next cursor).
+    Rankings stored for `shared_owner` are readable too; the caller checks access.
+    """
+    try:
+        key, offset = pagination.decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    entry = pagination.get_ranking(key, owner, shared_owner) if shared_owner else pagination.get_ranking(key, owner)
+    if entry is None:
+        raise HTTPException(status_code=410, detail="Cursor expired, request the first page again")
+    indices = entry["indices"][offset:offset + page_size]
+    match_scores = entry["match_scores"][offset:offset + page_size]
+    return entry, indices, match_scores, pagination.next_cursor(key, offset, page_size, len(entry["indices"]))
+
+def first_page_cursor(owner: str, indices, match_scores, page_size: int, meta: dict):
+    """
+    Caches a fresh ranking when it has more than one page and returns the cursor
+    for the second page.
+    """
+    if len(indices) <= page_size:
+        return None
+    key = pagination.store_ranking(owner, indices, match_scores, meta, ttl_seconds=CURSOR_TTL_SECONDS)
+    return pagination.encode_cursor(key, page_size)
+
+def history_response(recommendations, overall_match_score, next_cursor=None):
+    return ORJSONResponse({
+        "recommendations": recommendations,
+        "overall_match_score": overall_match_score,
+        "next_cursor": next_cursor
+    })
+
+def history_first_page(user_id: str, indices, match_scores, top_n: int):
+    overall = overall_match_score(match_scores[:top_n])
+    cursor = first_page_cursor(user_id, indices, match_scores, top_n, {"overall_match_score": overall})
+    return history_response(
+        format_ranked_movies(indices[:top_n], match_scores[:top_n], score_key="score"), overall, cursor
+    )
+
+async def fetch_latest_watched_at(user_id: str):
+    latest = await database.fetch_val(
+        select(func.max(watch_history.c.watched_at)).where(watch_history.c.user_id == user_id)
+    )
+    buffered = history_events.latest_watched_at(user_id) if history_events is not None else None
+    if buffered is None:
+        return latest
+    if isinstance(latest, str):
+        latest = datetime.fromisoformat(latest)
+    return max(latest, buffered) if latest is not None else buffered
+
+async def load_precomputed_ranking(user_id: str, top_n: int):
+    """
+    Returns the precomputed (indices, match_scores) for a user, or None when the
+    caller should fall back to online scoring (nothing stored, too stale, or
+    top_n larger than what was precomputed).
+    """
+    entry = precompute.load_user_ranking(user_id)
+    depth = max(PRECOMPUTE_TOP_N, PAGINATION_MAX_RESULTS)
+    if entry is not None and top_n > len(entry["indices"]) and len(entry["indices"]) >= depth:
+        entry = None
+    if entry is not None:
+        latest_watched_at = await fetch_latest_watched_at(user_id)
+        if not precompute.is_servable(entry, latest_watched_at, PRECOMPUTE_MAX_STALENESS_SECONDS):
+            entry = None
+    metrics.cache_lookup("precompute", entry is not None)
+    if entry is None:
+        return None
+    return entry["indices"], entry["match_scores"]
+
+async def refresh_precomputed_recs():
+    """
+    Rebuilds the stored ranking of every user whose watch history changed since
+    their last build, or of every user once a new catalog version is served.
+    """
+    global precomputed_catalog_version
+    rows = await database.fetch_all(
+        select(watch_history.c.user_id, func.max(watch_history.c.watched_at).label("latest"))
+        .group_by(watch_history.c.user_id)
+    )
+    built = precompute.load_watermarks()
+    catalog_version = model.catalog.version
+    if precomputed_catalog_version is not None and precomputed_catalog_version != catalog_version:
+        built = {}
+    for row in rows:
+        user_id, latest = row["user_id"], row["latest"]
+        if built.get(user_id) == precompute.as_watermark(latest):
+            continue
+        user_history = await fetch_history_titles(user_id)
+        profile_vector = await get_profile_vector(user_id)
+        ranking = await run_in_thread(
+            "precompute", rank_for_user, user_history, max_results=max(PRECOMPUTE_TOP_N, PAGINATION_MAX_RESULTS),
+            profile_vector=profile_vector,
+            seen=await get_seen_bits([user_id])
+        )
+        indices, match_scores = ranking if ranking is not None else ([], [])
+        precompute.save_user_ranking(user_id, indices, match_scores, latest)
+    precomputed_catalog_version = catalog_version
+
+async def precompute_worker():
+    while True:
+        try:
+            await refresh_precomputed_recs()
+        except Exception as e:
+            print(f"Precompute worker error: {e}")
+        await asyncio.sleep(PRECOMPUTE_INTERVAL_SECONDS)
 
 @app.post("/recommend/history", response_model=HistoryRecommendationResponse)
 async def recommend_by_history(request: HistoryRecommendationRequest, user=Depends(get_current_user)):
+    if request.cursor:
+        entry, indices, match_scores, next_cursor = read_cursor_page(request.cursor, user["id"], request.top_n)
+        return history_response(
+            format_ranked_movies(indices, match_scores, score_key="score"),
+            entry["meta"]["overall_match_score"],
+            next_cursor
+        )
+
+    filters = filter_values(request.filters)
+    if PRECOMPUTE_RECS and filters is None:
+        ranking = await load_precomputed_ranking(user["id"], request.top_n)
+        if ranking is not None:
+            return history_first_page(user["id"], *ranking, request.top_n)
+
     # Fetch user's watch history from DB
-    movie_rows = await database.fetch_all(
-        watch_history.select()
-        .where(watch_history.c.user_id == user["id"])
-        .order_by(watch_history.c.watched_at.desc())
-    )
-    user_history = [m["movie_name"] for m in movie_rows]
+    user_history = await fetch_history_titles(user["id"])
+    profile_vector = await get_profile_vector(user["id"])
 
     try:
-        recs = recommend_for_user(user_history, top_n=request.top_n)
-        if isinstance(recs, list):
+        ranking = await rank_once(
+            "history", rank_for_user,
+            user_history,
+            max_results=max(PAGINATION_MAX_RESULTS, request.top_n),
+            profile_vector=profile_vector,
+            filters=filters,
+            seen=await get_seen_bits([user["id"]])
+        )
+        if ranking is None:
             # No recommendations, return empty list and default score
-            recommendations = []
-            overall_match_score = "0%"
-        else:
-            recommendations = recs.get("user_recommendations", [])
-            overall_match_score = recs.get("overall_match_score", "0%")
-        return {
-            "recommendations": [
-                {
-                    "title": r["title"],
-                    "score": r["match_score"],
-                    "genres": r["genres"],
-                    "poster_path": r["poster_path"],
-                    "release_date": r["release_date"]
-                } for r in recommendations
-            ],
-            "overall_match_score": overall_match_score
-        }
+            return history_response([], "0%")
+        return history_first_page(user["id"], *ranking, request.top_n)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
@@ -382,40 +1161,183 @@ async def recommend_by_voice(
     user=Depends(get_current_user)
 ):
     # Fetch user's watch history from DB
-    movie_rows = await database.fetch_all(
-        watch_history.select()
-        .where(watch_history.c.user_id == user["id"])
-        .order_by(watch_history.c.watched_at.desc())
-    )
-    user_history = [m["movie_name"] for m in movie_rows]
+    user_history = await fetch_history_titles(user["id"])
+    profile_vector = await get_profile_vector(user["id"])
+    seen = await get_seen_bits([user["id"]])
     
-    # Save the uploaded audio to a temporary file
+    require_voice()
     audio_bytes = await audio.read()
-    temp_path = f"/tmp/{audio.filename}"
-    with open(temp_path, "wb") as f:
-        f.write(audio_bytes)
-    
     try:
-        df = handle_voice_search(temp_path, user_history_titles=user_history, top_n=top_n)
-        recommendations = [
-            {
-                "title": row["title"],
-                "score": float(row["score"]),
-                "genres": row["Genres"],
-                "poster_path": row["poster_path"],
-                "release_date": row["release_date"]
-            }
-            for _, row in df.iterrows()
-        ]
-        return {"recommendations": recommendations}
+        transcript = await voice_transcripts.get_or_compute(
+            voice_cache.audio_key(audio_bytes),
+            lambda: transcribe_upload(audio_bytes, os.path.splitext(audio.filename or "")[1])
+        )
+        recommendations = await recommend_for_transcript(transcript, user_history, profile_vector, seen, top_n)
+        return ORJSONResponse({"recommendations": recommendations})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+voice_pool = None
+
+def require_voice():
+    if not voice.available():
+        raise HTTPException(status_code=503, detail="Voice search is not available on this server")
+
+def get_voice_pool():
+    """
+    The voice worker processes, started on first use. Workers are spawned
+    rather than forked from the API process and load Whisper as they start.
+    """
+    global voice_pool
+    if voice_pool is None:
+        voice_pool = ProcessPoolExecutor(
+            VOICE_WORKERS, mp_context=multiprocessing.get_context("spawn"), initializer=voice.get_whisper_model
+        )
+    return voice_pool
+
+async def transcribe(audio):
+    """
+    Transcribes an audio file path or array of samples in the voice worker
+    pool, or in a worker thread without one.
+    """
+    if VOICE_WORKERS <= 0:
+        return await run_in_thread("voice", voice.transcribe_voice, audio)
+    EXECUTOR_IN_FLIGHT.inc(executor="voice_pool")
+    try:
+        return await asyncio.get_running_loop().run_in_executor(get_voice_pool(), voice.transcribe_voice, audio)
+    finally:
+        EXECUTOR_IN_FLIGHT.dec(executor="voice_pool")
+
+voice_transcripts = voice_cache.CoalescingLRUCache("voice_transcripts", VOICE_TRANSCRIPT_CACHE_SIZE)
+voice_results = voice_cache.CoalescingLRUCache("voice_results", VOICE_RESULT_CACHE_SIZE)
+
+async def transcribe_upload(audio_bytes: bytes, suffix: str):
+    # Save the uploaded audio to a temporary file of its own (keeping the
+    # extension for ffmpeg), so concurrent uploads with the same name don't collide
+    fd, temp_path = tempfile.mkstemp(prefix="voice-", suffix=suffix)
+    with os.fdopen(fd, "wb") as f:
+        f.write(audio_bytes)
+    try:
+        return await transcribe(temp_path)
     finally:
         # Clean up temp file
-        import os
         if os.path.exists(temp_path):
             os.remove(temp_path)
 
+async def recommend_for_transcript(transcript: str, user_history, profile_vector, seen, top_n: int):
+    """
+    Voice recommendations for a transcript, cached per normalized transcript,
+    user profile and catalog version.
+    """
+    query = voice_cache.normalize_transcript(transcript)
+    key = (query, voice_cache.profile_version(user_history, profile_vector, seen), top_n, model.catalog.version)
+
+    async def compute():
+        df = await run_in_thread(
+            "voice", model.recommend_for_query,
+            query, user_history_titles=user_history, top_n=top_n, profile_vector=profile_vector, seen=seen
+        )
+        return voice_recommendations(df)
+
+    return await voice_results.get_or_compute(key, compute)
+
+def voice_recommendations(df):
+    return [
+        {
+            "title": title,
+            "score": score,
+            "genres": genres,
+            "poster_path": poster_path,
+            "release_date": release_date
+        }
+        for title, score, genres, poster_path, release_date in zip(
+            df["title"].tolist(),
+            df["score"].astype(float).tolist(),
+            df["Genres"].tolist(),
+            df["poster_path"].fillna("").astype(str).tolist(),
+            df["release_date"].fillna("").astype(str).tolist()
+        )
+    ]
+
+@app.websocket("/ws/recommend/voice")
+async def stream_voice_recommendations(websocket: WebSocket, token: str = Query(...), top_n: int = 10):
+    """
+    Streaming voice search. The client sends 16 kHz mono PCM16 audio as binary
+    messages and the text message "end" when done (the token is a query
+    parameter, as browsers can't set headers on WebSockets). The server sends
+    JSON messages:
+
+        {"type": "partial", "transcript", "mood", "reference", "recommendations"}
+            whenever a new mood or reference movie is heard
+        {"type": "final", "transcript", "recommendations"}
+            for the whole query, after "end"
+        {"type": "error", "detail"}
+    """
+    try:
+        user = await get_current_user(token)
+    except HTTPException as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=e.detail)
+        return
+    if not voice.available():
+        await websocket.close(code=status.WS_1011_INTERNAL_ERROR, reason="Voice search is not available")
+        return
+    await websocket.accept()
+
+    user_history = await fetch_history_titles(user["id"])
+    profile_vector = await get_profile_vector(user["id"])
+    seen = await get_seen_bits([user["id"]])
+    stream = voice_stream.VoiceStream(VOICE_STREAM_INTERVAL_SECONDS, VOICE_STREAM_MAX_SECONDS)
+
+    async def recommend(transcript):
+        return await recommend_for_transcript(transcript, user_history, profile_vector, seen, top_n)
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("text") == "end":
+                break
+            if not message.get("bytes"):
+                continue
+            stream.add_chunk(message["bytes"])
+            if not stream.transcription_due():
+                continue
+            transcript = await transcribe(stream.audio())
+            mood, reference = await run_in_thread("voice", model.detect_query_cues, transcript)
+            if stream.update(transcript, (mood, reference)):
+                await websocket.send_json({
+                    "type": "partial",
+                    "transcript": transcript,
+                    "mood": mood,
+                    "reference": reference,
+                    "recommendations": await recommend(transcript)
+                })
+
+        if stream.untranscribed_bytes() >= voice_stream.BYTES_PER_SAMPLE:
+            samples = stream.audio()
+            stream.transcript = await voice_transcripts.get_or_compute(
+                voice_cache.audio_key(samples.tobytes()),
+                lambda: transcribe(samples)
+            )
+        if not stream.transcript.strip():
+            await websocket.send_json({"type": "error", "detail": "No speech received"})
+        else:
+            await websocket.send_json({
+                "type": "final",
+                "transcript": stream.transcript,
+                "recommendations": await recommend(stream.transcript)
+            })
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    except ValueError as e:
+        await websocket.send_json({"type": "error", "detail": str(e)})
+        await websocket.close(code=status.WS_1009_MESSAGE_TOO_BIG)
+    except Exception as e:
+        await websocket.send_json({"type": "error", "detail": f"Internal server error: {str(e)}"})
+        await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+
 # === Watchlist Routes ===
 @app.post("/watchlists", response_model=WatchlistGroupOut)
 async def create_watchlist(
@@ -424,8 +1346,6 @@ async def create_watchlist(
     user=Depends(get_current_user)
 ):
     try:
-        print(f"📝 Creating watchlist with name: '{name}'")
-        
         if not name or not name.strip():
             raise HTTPException(status_code=400, detail="Watchlist name cannot be empty")
         
@@ -442,7 +1362,6 @@ async def create_watchlist(
         image_bytes = None
         if cover_image and cover_image.filename:
             try:
-                print(f"📷 Processing cover image: {cover_image.filename}")
                 image_data = await cover_image.read()
                 
                 # Validate file size (5MB limit)
@@ -455,7 +1374,6 @@ async def create_watchlist(
                     raise HTTPException(status_code=400, detail="Invalid image format. Allowed: JPEG, PNG, GIF, WebP")
                 
                 image_bytes = image_data
-                print(f"✅ Image processed successfully, size: {len(image_bytes)} bytes")
             except HTTPException:
                 raise
             except Exception as e:
@@ -471,8 +1389,6 @@ async def create_watchlist(
             cover_image=image_bytes
         )
         await database.execute(query)
-        
-        print(f"✅ Watchlist created successfully with ID: {group_id}")
 
         return {
             "id": group_id,
@@ -522,6 +1438,7 @@ async def add_movie_to_watchlist(group_id: str, item: WatchlistCreate, user=Depe
             movie_name=item.movie_name
         )
         await database.execute(query)
+        await record_seen_event(user["id"], item.movie_id, item.movie_name, "watchlist")
         return {"msg": "Movie added to watchlist"}
     except HTTPException:
         raise
@@ -590,6 +1507,7 @@ async def remove_movie_from_watchlist(group_id: str, movie_id: str, user=Depends
             (watchlists.c.group_id == group_id) & (watchlists.c.movie_id == movie_id)
         )
         await database.execute(query)
+        await refresh_watchlist_seen_bits(user["id"])
         return {"msg": "Movie removed from watchlist"}
     except HTTPException:
         raise
@@ -610,6 +1528,7 @@ async def delete_watchlist(group_id: str, user=Depends(get_current_user)):
         await database.execute(watchlists.delete().where(watchlists.c.group_id == group_id))
         # Delete the watchlist group
         await database.execute(watchlist_groups.delete().where(watchlist_groups.c.id == group_id))
+        await refresh_watchlist_seen_bits(user["id"])
         return Response(status_code=status.HTTP_204_NO_CONTENT)
     except HTTPException:
         raise
@@ -618,6 +1537,109 @@ async def delete_watchlist(group_id: str, user=Depends(get_current_user)):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 # === Blend Routes ===
+def blend_first_page(user_id: str, blend_code: str, name: str, usernames, user_tags, ranking, top_n: int):
+    """
+    Builds the first page of a blend response from a fresh ranking; the header
+    fields are cached with the ranking so later pages skip every DB query.
+    """
+    return ORJSONResponse(blend_page(user_id, blend_code, name, usernames, user_tags, ranking, top_n))
+
+def blend_page(user_id: str, blend_code: str, name: str, usernames, user_tags, ranking, top_n: int,
+               cursors: dict = None):
+    """
+    With `cursors` (a pushed snapshot's), the ranking is cached once per page
+    size and shared by every subscriber instead of once per response.
+    """
+    indices, match_scores = ranking if ranking is not None else ([], [])
+    meta = {
+        "name": name,
+        "blend_code": blend_code,
+        "users": usernames,
+        "user_tags": user_tags,
+        "overall_match_score": overall_match_score(match_scores[:top_n]) if ranking is not None else "0%"
+    }
+    if cursors is None:
+        cursor = first_page_cursor(user_id, indices, match_scores, top_n, meta)
+    else:
+        if top_n not in cursors:
+            cursors[top_n] = first_page_cursor(blend_cursor_owner(blend_code), indices, match_scores, top_n, meta)
+        cursor = cursors[top_n]
+    return {
+        **meta,
+        "recommendations": format_ranked_movies(indices[:top_n], match_scores[:top_n]),
+        "next_cursor": cursor
+    }
+
+def blend_cursor_owner(blend_code: str):
+    # Owner of rankings shared by a blend's subscribers; any member may page through them
+    return f"blend:{blend_code}"
+
+async def compute_blend(code: str, max_results: int, strategy: str = None):
+    """
+    Ranks a blend for its current members' histories, aggregating members with
+    `strategy` (defaults to BLEND_STRATEGY).
+
+    Returns:
+        Tuple[List[str], Dict[str, str], Optional[tuple]]: Member usernames,
+        tags by user id, and the (indices, match_scores) ranking.
+    """
+    members = await database.fetch_all(
+        blend_members.select().where(blend_members.c.blend_code == code)
+    )
+    user_ids = [m["user_id"] for m in members]
+
+    # For each user, get their LATEST watch history from database
+    user_histories = []
+    usernames = []
+    for uid in user_ids:
+        # Fetch FRESH watch history from database every time
+        history = await fetch_history_titles(uid)
+        user_histories.append(history)
+
+        # Get username
+        u = await database.fetch_one(users.select().where(users.c.id == uid))
+        usernames.append(u["username"] if u else uid)
+
+    # Tags from the members' stored genre counts
+    user_tags = await get_member_tags(user_ids)
+
+    # ALWAYS generate fresh recommendations from current members' histories
+    ranking = await rank_once(
+        "blend", rank_blend,
+        user_histories,
+        max_results=max_results,
+        strategy=strategy or BLEND_STRATEGY,
+        member_vectors=await get_blend_member_vectors(user_ids),
+        seen=await get_seen_bits(user_ids) if user_ids else None
+    )
+    return usernames, user_tags, ranking
+
+async def blend_snapshot(code: str):
+    """
+    State pushed to blend subscribers, or None once the blend is gone.
+    """
+    blend = await database.fetch_one(blends.select().where(blends.c.code == code))
+    if not blend:
+        return None
+    usernames, user_tags, ranking = await compute_blend(code, PAGINATION_MAX_RESULTS)
+    return {"name": blend["name"], "users": usernames, "user_tags": user_tags, "ranking": ranking, "cursors": {}}
+
+blend_hub = blend_channels.BlendHub(blend_snapshot)
+
+async def notify_blends_of(user_id: str):
+    """
+    Tells the subscribed blends that `user_id` belongs to that their ranking changed.
+    """
+    active = blend_hub.active_codes()
+    if not active:
+        return
+    rows = await database.fetch_all(
+        select(blend_members.c.blend_code).where(blend_members.c.user_id == user_id)
+    )
+    for row in rows:
+        if row["blend_code"] in active:
+            blend_hub.notify(row["blend_code"])
+
 @app.post("/blend/create", response_model=BlendResponse)
 async def create_blend_session(request: BlendCreateRequest, user=Depends(get_current_user)):
     try:
@@ -670,39 +1692,15 @@ async def join_blend_session(request: BlendJoinRequest, user=Depends(get_current
                     user_id=user["id"]
                 )
             )
+            blend_hub.notify(request.code)
 
         # 3. Fetch all members and build blend response
-        members = await database.fetch_all(
-            blend_members.select().where(blend_members.c.blend_code == request.code)
+        usernames, user_tags, ranking = await compute_blend(
+            request.code, max(PAGINATION_MAX_RESULTS, request.top_n)
+        )
+        return blend_first_page(
+            user["id"], request.code, blend["name"], usernames, user_tags, ranking, request.top_n
         )
-        user_ids = [m["user_id"] for m in members]
-        user_histories = []
-        user_tags = {}
-        usernames = []
-        for uid in user_ids:
-            movie_rows = await database.fetch_all(
-                watch_history.select()
-                .where(watch_history.c.user_id == uid)
-                .order_by(watch_history.c.watched_at.desc())
-            )
-            history = [m["movie_name"] for m in movie_rows]
-            user_histories.append(history)
-            user_tags[uid] = assign_tag_from_movie_history(history)
-            u = await database.fetch_one(users.select().where(users.c.id == uid))
-            usernames.append(u["username"] if u else uid)
-        
-        recs = recommend_blend(user_histories)
-        recommendations = recs.get("blend_recommendations", []) if isinstance(recs, dict) else recs
-        overall_match_score = recs.get("overall_match_score", "0%") if isinstance(recs, dict) else "0%"
-        
-        return {
-            "name": blend["name"],
-            "blend_code": request.code,
-            "users": usernames,
-            "user_tags": user_tags,
-            "recommendations": recommendations,
-            "overall_match_score": overall_match_score
-        }
     except HTTPException:
         raise
     except Exception as e:
@@ -726,7 +1724,39 @@ async def list_all_blends(current_user: dict = Depends(get_current_user)):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.get("/blend/{code}", response_model=BlendResponse)
-async def get_blend_details(code: str, user=Depends(get_current_user)):
+async def get_blend_details(
+    code: str,
+    top_n: int = 50,
+    cursor: Optional[str] = None,
+    strategy: Optional[str] = None,
+    user=Depends(get_current_user)
+):
+    if cursor:
+        entry, indices, match_scores, next_cursor = read_cursor_page(
+            cursor, user["id"], top_n, shared_owner=blend_cursor_owner(code)
+        )
+        if entry["meta"].get("blend_code") != code:
+            raise HTTPException(status_code=400, detail="Cursor does not belong to this blend")
+        if entry["owner"] != user["id"]:
+            # Pushed to the blend's subscribers, so check the caller still belongs to it
+            member = await database.fetch_one(
+                blend_members.select().where(
+                    (blend_members.c.blend_code == code) &
+                    (blend_members.c.user_id == user["id"])
+                )
+            )
+            if not member:
+                raise HTTPException(status_code=403, detail="You are not a member of this blend.")
+        return ORJSONResponse({
+            **entry["meta"],
+            "recommendations": format_ranked_movies(indices, match_scores),
+            "next_cursor": next_cursor
+        })
+    if strategy is not None and strategy not in model.BLEND_STRATEGIES:
+        raise HTTPException(
+            status_code=400, detail=f"strategy must be one of: {', '.join(model.BLEND_STRATEGIES)}"
+        )
+
     try:
         # Check if user is a member of the blend
         member = await database.fetch_one(
@@ -743,76 +1773,128 @@ async def get_blend_details(code: str, user=Depends(get_current_user)):
         if not blend:
             raise HTTPException(status_code=404, detail="Blend not found")
 
-        # Get all user_ids in this blend
-        members = await database.fetch_all(
-            blend_members.select().where(blend_members.c.blend_code == code)
-        )
-        user_ids = [m["user_id"] for m in members]
-
-        # For each user, get their LATEST watch history from database
-        user_histories = []
-        user_tags = {}
-        usernames = []
-        for uid in user_ids:
-            # Fetch FRESH watch history from database every time
-            movie_rows = await database.fetch_all(
-                watch_history.select()
-                .where(watch_history.c.user_id == uid)
-                .order_by(watch_history.c.watched_at.desc())
-            )
-            history = [m["movie_name"] for m in movie_rows]
-            user_histories.append(history)
-            
-            # Generate user tag based on CURRENT history
-            user_tags[uid] = assign_tag_from_movie_history(history)
-            
-            # Get username
-            u = await database.fetch_one(users.select().where(users.c.id == uid))
-            usernames.append(u["username"] if u else uid)
-
-        # ALWAYS generate fresh recommendations from current members' histories
-        print(f"🔄 Generating fresh blend recommendations for {len(user_histories)} users")
-        recs = recommend_blend(user_histories)
-        recommendations = recs.get("blend_recommendations", []) if isinstance(recs, dict) else recs
-        overall_match_score = recs.get("overall_match_score", "0%") if isinstance(recs, dict) else "0%"
-
-        print(f"✅ Generated {len(recommendations)} recommendations with {overall_match_score} match score")
-
-        return {
-            "name": blend["name"],
-            "blend_code": code,
-            "users": usernames,
-            "user_tags": user_tags,
-            "recommendations": recommendations,
-            "overall_match_score": overall_match_score
-        }
+        usernames, user_tags, ranking = await compute_blend(code, max(PAGINATION_MAX_RESULTS, top_n), strategy)
+        return blend_first_page(user["id"], code, blend["name"], usernames, user_tags, ranking, top_n)
     except HTTPException:
         raise
     except Exception as e:
         print(f"Get blend details error: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@app.get("/blend/{code}/events")
+async def stream_blend_updates(code: str, token: str = Query(...), top_n: int = 50):
+    """
+    Server-Sent Events stream of a blend: a `ranking` event with the same body
+    as GET /blend/{code} right away and whenever a member joins or adds
+    history, or an `error` event when the blend could not be recomputed. The
+    `next_cursor` of pushed rankings is shared by all members viewing that
+    update. The token is a query parameter, as EventSource can't set headers.
+    """
+    user = await get_current_user(token)
+    member = await database.fetch_one(
+        blend_members.select().where(
+            (blend_members.c.blend_code == code) &
+            (blend_members.c.user_id == user["id"])
+        )
+    )
+    if not member:
+        raise HTTPException(status_code=403, detail="You are not a member of this blend.")
+    top_n = min(top_n, PAGINATION_MAX_RESULTS)
+
+    async def events():
+        queue = blend_hub.subscribe(code)
+        try:
+            while True:
+                try:
+                    snapshot = await asyncio.wait_for(queue.get(), BLEND_EVENTS_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if snapshot is None:
+                    yield "event: deleted\ndata: {}\n\n"
+                    return
+                if snapshot is blend_channels.UPDATE_FAILED:
+                    yield f"event: error\ndata: {orjson.dumps(snapshot).decode()}\n\n"
+                    continue
+                body = blend_page(
+                    user["id"], code, snapshot["name"], snapshot["users"], snapshot["user_tags"],
+                    snapshot["ranking"], top_n, cursors=snapshot["cursors"]
+                )
+                yield f"event: ranking\ndata: {orjson.dumps(body).decode()}\n\n"
+        finally:
+            blend_hub.unsubscribe(code, queue)
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # === Watch History Routes ===
+async def write_history_event(event):
+    """
+    Writes one watch event: replaces the user's earlier row for the movie and
+    updates their profile, genre counts and seen bitset. Skipped when the
+    movie already has a row this recent (an event replayed from the
+    write-behind log after it was written).
+    """
+    user_id, movie_id = event["user_id"], event["movie_id"]
+    last_watched_at = await database.fetch_val(
+        select(func.max(watch_history.c.watched_at)).where(
+            (watch_history.c.user_id == user_id) &
+            (watch_history.c.movie_id == movie_id)
+        )
+    )
+    if isinstance(last_watched_at, str):
+        last_watched_at = datetime.fromisoformat(last_watched_at)
+    if last_watched_at is not None and last_watched_at >= event["watched_at"]:
+        return
+    already_watched = last_watched_at is not None
+
+    # Remove any previous instance of this movie for this user
+    delete_query = watch_history.delete().where(
+        (watch_history.c.user_id == user_id) &
+        (watch_history.c.movie_id == movie_id)
+    )
+    await database.execute(delete_query)
+
+    # Add the new (most recent) watch history entry
+    insert_query = watch_history.insert().values(
+        id=event["id"],
+        user_id=user_id,
+        movie_id=movie_id,
+        movie_name=event["movie_name"],
+        watched_at=event["watched_at"]
+    )
+    await database.execute(insert_query)
+
+    if DECAYED_PROFILES:
+        await record_profile_event(user_id, movie_id, event["movie_name"], event["watched_at"])
+    await record_genre_event(user_id, event["movie_name"], already_watched)
+    await record_seen_event(user_id, movie_id, event["movie_name"], "history")
+
+async def apply_history_batch(events):
+    """
+    Writes a batch of buffered watch events (see history_buffer.py) in one transaction.
+    """
+    async with database.transaction():
+        for event in events:
+            await write_history_event(event)
+
 @app.post("/history/add")
 async def add_to_watch_history(request: WatchHistoryAddRequest, user=Depends(get_current_user)):
     try:
-        # Remove any previous instance of this movie for this user
-        delete_query = watch_history.delete().where(
-            (watch_history.c.user_id == user["id"]) &
-            (watch_history.c.movie_id == request.movie_id)
-        )
-        await database.execute(delete_query)
-
-        # Add the new (most recent) watch history entry
-        entry_id = str(uuid.uuid4())
-        insert_query = watch_history.insert().values(
-            id=entry_id,
-            user_id=user["id"],
-            movie_id=request.movie_id,
-            movie_name=request.movie_name,
-            watched_at=datetime.utcnow()
-        )
-        await database.execute(insert_query)
+        event = {
+            "id": str(uuid.uuid4()),
+            "user_id": user["id"],
+            "movie_id": request.movie_id,
+            "movie_name": request.movie_name,
+            "watched_at": datetime.utcnow()
+        }
+        if history_events is not None:
+            # Logged and acknowledged now, written by the flusher
+            history_events.append(event)
+        else:
+            await write_history_event(event)
+        await notify_blends_of(user["id"])
 
         return {"msg": "Added to watch history"}
     except Exception as e:
@@ -825,7 +1907,7 @@ async def get_watch_history(user=Depends(get_current_user)):
         query = watch_history.select().where(
             watch_history.c.user_id == user["id"]
         ).order_by(watch_history.c.watched_at.desc())
-        rows = await database.fetch_all(query)
+        rows = with_pending_history(user["id"], await database.fetch_all(query))
         history = []
         for row in rows:
             poster_path = ""
@@ -852,24 +1934,42 @@ async def get_watch_history(user=Depends(get_current_user)):
 def read_root():
     return {"message": "Movie Recommendation API is running."}
 
-# Load movie data for search
-try:
-    df = pd.read_csv('./data/10000 Movies Data')
-except:
-    df = pd.DataFrame()  # Fallback if file doesn't exist
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# === Admin Routes ===
+@app.get("/admin/profiles", dependencies=[Depends(require_admin)], include_in_schema=False)
+def list_request_profiles():
+    return profiler.list_profiles(PROFILE_DIR)
+
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)], include_in_schema=False)
+def get_request_profile(profile_id: str):
+    """
+    Returns the profile as folded stacks, e.g. for `flamegraph.pl` or speedscope.
+    """
+    path = profiler.profile_path(PROFILE_DIR, profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=f"{profile_id}.folded")
 
 @app.get("/search")
 def search_movies(title: str = Query(..., description="Movie title to search")):
+    # Rows of the served catalog version, so ingested movies can be found too
+    df, search_titles = model.search_columns(model.current_catalog())
     if df.empty:
         return {"message": "Movie database not available."}
     
     query = title.lower()
-    results = df[df['title'].str.lower().str.contains(query, na=False)]
+    matches = np.flatnonzero(search_titles.str.contains(query, na=False).to_numpy())
 
-    if results.empty:
+    if len(matches) == 0:
         return {"message": "No movies found with that name."}
 
-    return results.to_dict(orient="records")
+    # Column-wise tolist() instead of to_dict(orient="records"); orjson writes NaN as null
+    columns = list(df.columns)
+    values = [df[c].to_numpy()[matches].tolist() for c in columns]
+    return ORJSONResponse([dict(zip(columns, row)) for row in zip(*values)])
 
 if __name__ == "__main__":
     import uvicorn
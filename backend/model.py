@@ -9,53 +9,55 @@ Original file is located at
 
 import pandas as pd
 import numpy as np
-import ast
+import scipy.sparse as sp
 import joblib
-from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 import os
 import ssl
 import certifi
-import pyaudio
-import wave
-import threading
-import whisper
 import re
+import contextvars
+
+import columnar
+import metrics
+import quantized_features
+import seen_movies
+from genre_counts import top_genre as genre_counts_top
+from filters import FilterIndex, normalize_filters
+from text_index import TextIndex
+from ann_index import build_ann_index, search as ann_search
+from catalog import (
+    FEATURE_PRECISION,
+    Catalog,
+    add_ratings,
+    combined_text,
+    make_vectorizer
+)
 
 os.environ['SSL_CERT_FILE'] = certifi.where()
 ssl._create_default_https_context = ssl._create_unverified_context
 
-# Load dataset
-movies = pd.read_csv('./data/10000 Movies Data')
-
-# Remove rows with null overviews
-movies = movies[movies['overview'].notnull()].copy()
-movies.reset_index(drop=True, inplace=True)  # <- important!
-
-# Extract genres
-def extract_genres(x):
-    try:
-        return [d['name'].lower().replace(" ", "") for d in ast.literal_eval(x)]
-    except:
-        return []
+# Load dataset from the typed columnar store (converted from the CSV on first use)
+catalog_columns, catalog_schema = columnar.load_columns(columnar.ensure_columns('./data/10000 Movies Data'))
 
-movies['Genres'] = movies['Genres'].apply(extract_genres)
+# Rows with an overview, genres decoded from their int codes
+movies = columnar.catalog_frame(catalog_columns, catalog_schema)
 
 # Combine fields for content-based filtering
-def make_combined(row):
-    genres = " ".join(row['Genres']) if isinstance(row['Genres'], list) else ""
-    keywords = row['Keywords'] if isinstance(row['Keywords'], str) else ""
-    overview = row['overview'] if isinstance(row['overview'], str) else ""
-    return f"{overview} {genres} {keywords}"
-
-movies['combined'] = movies.apply(make_combined, axis=1)
+movies['combined'] = combined_text(movies)
 
-# TF-IDF on the cleaned and reindexed DataFrame
-tfidf = TfidfVectorizer(stop_words='english')
+# TF-IDF on the cleaned and reindexed DataFrame (TEXT_FEATURES selects fitted or hashed features)
+tfidf = make_vectorizer()
 tfidf_matrix = tfidf.fit_transform(movies['combined'])
 
-# Cosine similarity between aligned movie indices
-content_sim = cosine_similarity(tfidf_matrix, tfidf_matrix)
+# Cosine similarity between aligned movie indices. This is a dense N x N matrix
+# that no recommender reads at request time; large catalogs can skip it with
+# BUILD_CONTENT_SIM=false. Stored at FEATURE_PRECISION (see quantized_features.py).
+BUILD_CONTENT_SIM = os.getenv("BUILD_CONTENT_SIM", "true").lower() == "true"
+content_sim = (
+    quantized_features.quantize(cosine_similarity(tfidf_matrix, tfidf_matrix), FEATURE_PRECISION)
+    if BUILD_CONTENT_SIM else None
+)
 
 mood_genre_mapping = {
     'happy': {'comedy': 0.4, 'family': 0.3, 'romance': 0.2, 'music': 0.1},
@@ -68,19 +70,8 @@ mood_genre_mapping = {
     'bored':{'comedy': 0.4, 'animation': 0.3, 'adventure': 0.2, 'fantasy': 0.1}
 }
 
-# IMDb weighted rating formula
-C = movies['vote_average'].mean()
-m = movies['vote_count'].quantile(0.60)
-
-def weighted_rating(x, m=m, C=C):
-    v = x['vote_count']
-    R = x['vote_average']
-    return (v / (v + m)) * R + (m / (m + v)) * C
-
-movies['weighted_rating'] = movies.apply(weighted_rating, axis=1)
-# Normalize to 0–1
-movies['weighted_rating_norm'] = (movies['weighted_rating'] - movies['weighted_rating'].min()) / \
-                                  (movies['weighted_rating'].max() - movies['weighted_rating'].min())
+# IMDb weighted rating formula, normalized to 0–1
+add_ratings(movies)
 
 import joblib
 
@@ -93,47 +84,244 @@ joblib.dump(tfidf_matrix, './artifacts/tfidf_matrix.joblib')
 joblib.dump(movies, './artifacts/movies_dataframe.joblib')
 
 # Save the cosine similarity matrix if needed (optional)
-joblib.dump(content_sim, './artifacts/content_sim.joblib')
+if content_sim is not None:
+    joblib.dump(content_sim, './artifacts/content_sim.joblib')
 
 # Save the mood_genre_mapping dictionary (optional, or redefine in backend)
 joblib.dump(mood_genre_mapping, './artifacts/mood_genre_mapping.joblib')
 
-def recommend_movies_by_mood(mood, user_history_titles=None, top_n=10, alpha=0.4, beta=0.3, gamma=0.3):
-    genre_weights = mood_genre_mapping.get(mood, {})
-    scores = []
+# Optional ANN index over reduced embeddings, used to serve profile queries
+# without a full scan of tfidf_matrix (enable with ANN_INDEX=true)
+ANN_INDEX = os.getenv("ANN_INDEX", "false").lower() == "true"
+ANN_PROBES = int(os.getenv("ANN_PROBES", "8"))
+ANN_SHORTLIST = int(os.getenv("ANN_SHORTLIST", "10"))  # candidates reranked exactly, per requested item
+ann_index = None
+if ANN_INDEX:
+    ann_index = build_ann_index(
+        tfidf_matrix,
+        n_components=int(os.getenv("ANN_COMPONENTS", "128")),
+        n_lists=int(os.getenv("ANN_LISTS", "0")) or None
+    )
+    joblib.dump(ann_index, './artifacts/ann_index.joblib')
+
+# The ANN index is built from full-precision rows; the catalog keeps the
+# weights at FEATURE_PRECISION (float64, float32 or int8 with per-row scales)
+tfidf_matrix = quantized_features.quantize(tfidf_matrix, FEATURE_PRECISION)
+
+# Everything the recommenders read lives in one Catalog. A new version (from
+# the artifact registry) is hot-swapped in with `swap_catalog`, and every
+# recommender takes its own reference first so a request never mixes versions.
+catalog = Catalog(
+    movies, tfidf, tfidf_matrix, ann_index,
+    title_to_genres=columnar.title_genre_map(catalog_columns, catalog_schema)
+)
+movie_id_to_index = catalog.movie_id_to_index
+response_columns = catalog.response_columns
 
-    # Get user history indices
-    user_sim = np.zeros(len(movies))
-    user_history_titles_lower = [t.lower() for t in user_history_titles] if user_history_titles else []
+# Per-request holder for the catalog version that served it, set up by main's
+# middleware and reported in the X-Artifact-Version header
+served_versions = contextvars.ContextVar("served_versions", default=None)
 
-    if user_history_titles:
-        user_history_indices = movies[movies['title'].str.lower().isin(user_history_titles_lower)].index.tolist()
-        if user_history_indices:
-            user_profile_vector = np.mean(tfidf_matrix[user_history_indices], axis=0).A1
-            user_sim = cosine_similarity([user_profile_vector], tfidf_matrix).flatten()
+def current_catalog():
+    """
+    Returns the catalog to use for the rest of a call and records its version
+    for the current request.
+    """
+    cat = catalog
+    served = served_versions.get()
+    if served is not None:
+        served.add(cat.version)
+    return cat
 
-    for idx, row in movies.iterrows():
-        # Skip movies already watched
-        if row['title'].lower() in user_history_titles_lower:
-            continue
+def swap_catalog(new_catalog):
+    """
+    Makes `new_catalog` the version served to new requests. Requests already
+    running finish on the version they started with.
+    """
+    global catalog, movies, tfidf, tfidf_matrix, ann_index, movie_id_to_index, response_columns, movie_title_to_genres
+    catalog = new_catalog
+    movies, tfidf, tfidf_matrix, ann_index = catalog.movies, catalog.tfidf, catalog.tfidf_matrix, catalog.ann_index
+    movie_id_to_index, response_columns = catalog.movie_id_to_index, catalog.response_columns
+    movie_title_to_genres = catalog.title_to_genres
+
+def title_positions(cat):
+    """
+    The catalog's positions by lowercased title, built on first use, so
+    matching history titles doesn't lowercase the whole catalog per request.
+    """
+    if cat.title_positions is None:
+        lookup = {}
+        for idx, title in enumerate(cat.movies['title'].str.lower().tolist()):
+            lookup.setdefault(title, []).append(idx)
+        cat.title_positions = lookup
+    return cat.title_positions
+
+def search_columns(cat):
+    """
+    (raw rows, lowercased titles) searched by /search: the source CSV's rows
+    from the columnar store, with the catalog's ingested rows replacing or
+    extending them. Built on first use per catalog version.
+    """
+    if cat.search_columns is None:
+        frame = columnar.raw_frame(catalog_columns, catalog_schema)
+        if cat.ingested_rows is not None and len(cat.ingested_rows):
+            ingested = cat.ingested_rows
+            replaced = frame['Movie_id'].astype(str).str.strip().isin(ingested['Movie_id'].astype(str).str.strip())
+            frame = pd.concat([frame[~replaced], ingested], ignore_index=True)
+        cat.search_columns = (frame, frame['title'].str.lower())
+    return cat.search_columns
+
+def history_indices(titles_lower, cat):
+    """
+    Sorted catalog positions of every movie with one of the lowercased titles.
+    """
+    lookup = title_positions(cat)
+    return sorted({idx for title in titles_lower for idx in lookup.get(title, ())})
 
-        genres = row['Genres']
+def movie_index(movie_id=None, title=None, cat=None):
+    """
+    Returns the catalog position of a movie looked up by id (or by title as a
+    fallback), or None if the movie is not in the catalog.
+    """
+    cat = cat or current_catalog()
+    idx = cat.movie_id_to_index.get(str(movie_id).strip()) if movie_id is not None else None
+    if idx is None and title:
+        matches = title_positions(cat).get(title.lower().strip())
+        idx = matches[0] if matches else None
+    return idx
+
+def movie_vector(movie_id=None, title=None):
+    """
+    Returns the 1xV TF-IDF row of a movie looked up by id (or by title as a
+    fallback), or None if the movie is not in the catalog.
+    """
+    cat = current_catalog()
+    idx = movie_index(movie_id, title, cat)
+    return quantized_features.dequantize(cat.tfidf_matrix[idx]) if idx is not None else None
 
-        # 1. Mood Score
-        mood_score = sum([genre_weights.get(g, 0) for g in genres])
+def seen_positions(movie_rows, cat=None):
+    """
+    Catalog positions of (movie_id, title) rows, for `seen_movies` bitsets.
+    """
+    cat = cat or current_catalog()
+    positions = (movie_index(movie_id, title, cat) for movie_id, title in movie_rows)
+    return [idx for idx in positions if idx is not None]
 
-        # 2. Similarity Score
-        sim_score = user_sim[idx]
+def watched_mask(titles, candidate_indices, exclude_titles, seen):
+    """
+    Which candidates were already seen: by the `seen` bitset (see
+    seen_movies.py) when given, else by lowercased title.
+    """
+    if seen is not None:
+        return seen_movies.contains(seen, candidate_indices)
+    return titles.iloc[candidate_indices].str.lower().isin(exclude_titles).to_numpy()
 
-        # 3. Normalized IMDb Weighted Rating
-        rating_score = row['weighted_rating_norm']
+def excluded_count(n_titles, seen):
+    # Shortlists must hold the top results plus everything the ranking drops
+    return max(n_titles, seen_movies.count(seen)) if seen is not None else n_titles
 
-        # Final Weighted Score
-        final = alpha * mood_score + beta * sim_score + gamma * rating_score
-        scores.append((row['title'], final, genres,row['poster_path'],row['release_date'],row['Movie_id']))
+def filter_candidates(filters, cat):
+    """
+    Sorted catalog indices of the movies passing structured `filters` (see
+    filters.py), or None when nothing is filtered.
+    """
+    filters = normalize_filters(filters)
+    if filters is None:
+        return None
+    if cat.filter_index is None:
+        with metrics.timer("filter_index"):
+            cat.filter_index = FilterIndex(cat.movies)
+    with metrics.timer("filter"):
+        return cat.filter_index.candidates(filters)
+
+def profile_candidates(profile_vector, n_candidates, cat, candidates=None):
+    """
+    Returns (candidate indices, cosine similarity of each candidate to the profile).
+    With the ANN index enabled only the approximate nearest `n_candidates` are
+    scored exactly; otherwise the whole catalog is scanned. Filtered
+    `candidates` (see `filter_candidates`) are all scored exactly instead.
+    """
+    if candidates is not None:
+        return candidates, quantized_features.cosine_to(cat.tfidf_matrix[candidates], profile_vector)
+    if cat.ann_index is not None and n_candidates < len(cat.movies):
+        candidate_indices, _ = ann_search(cat.ann_index, profile_vector, n_candidates, n_probe=ANN_PROBES)
+        candidate_indices = np.sort(candidate_indices)
+        sims = quantized_features.cosine_to(cat.tfidf_matrix[candidate_indices], profile_vector)
+        return candidate_indices, sims
+    return np.arange(len(cat.movies)), quantized_features.cosine_to(cat.tfidf_matrix, profile_vector)
+
+def mood_scores(mood, cat):
+    """
+    Per-mood genre score of every movie, computed once per mood and catalog version.
+    """
+    metrics.cache_lookup("mood_scores", mood in cat.mood_score_cache)
+    if mood not in cat.mood_score_cache:
+        genre_weights = mood_genre_mapping.get(mood, {})
+        cat.mood_score_cache[mood] = np.array(
+            [sum([genre_weights.get(g, 0) for g in genres]) for genres in cat.movies['Genres']], dtype=float
+        )
+    return cat.mood_score_cache[mood]
 
-    scores.sort(key=lambda x: x[1], reverse=True)
-    return pd.DataFrame(scores[:top_n], columns=['title', 'score', 'Genres','poster_path','release_date','Movie_id'])
+def rank_by_mood(mood, user_history_titles=None, alpha=0.4, beta=0.3, gamma=0.3, profile_vector=None,
+                 filters=None, seen=None):
+    """
+    Ranks the catalog for a mood. See `recommend_movies_by_mood`. With
+    `filters` (see filters.py) only the movies passing them are scored. Movies
+    set in the `seen` bitset (see seen_movies.py) are left out, or the history
+    titles without one.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Catalog indices and final scores, best first.
+    """
+    cat = current_catalog()
+    movies, tfidf_matrix = cat.movies, cat.tfidf_matrix
+    candidates = filter_candidates(filters, cat)
+    candidate_matrix = tfidf_matrix if candidates is None else tfidf_matrix[candidates]
+
+    # Get user history indices
+    user_sim = np.zeros(candidate_matrix.shape[0])
+    user_history_titles_lower = [t.lower() for t in user_history_titles] if user_history_titles else []
+
+    if profile_vector is None and user_history_titles:
+        with metrics.timer("profile_build"):
+            user_history_indices = history_indices(user_history_titles_lower, cat)
+            if user_history_indices:
+                profile_vector = quantized_features.mean_rows(tfidf_matrix, user_history_indices)
+    if profile_vector is not None:
+        with metrics.timer("similarity"):
+            user_sim = quantized_features.cosine_to(candidate_matrix, profile_vector)
+
+    with metrics.timer("scoring"):
+        mood_score, rating = mood_scores(mood, cat), movies['weighted_rating_norm'].to_numpy()
+        if candidates is None:
+            candidates = np.arange(len(movies))
+        else:
+            mood_score, rating = mood_score[candidates], rating[candidates]
+
+        # Mood score, similarity score and normalized IMDb weighted rating
+        final = alpha * mood_score + beta * user_sim + gamma * rating
+
+        # Skip movies already watched
+        unwatched = ~watched_mask(movies['title'], candidates, user_history_titles_lower, seen)
+        candidates, final = candidates[unwatched], final[unwatched]
+
+    with metrics.timer("top_k"):
+        order = np.argsort(-final, kind='stable')
+    return candidates[order], final[order]
+
+def recommend_movies_by_mood(mood, user_history_titles=None, top_n=10, alpha=0.4, beta=0.3, gamma=0.3,
+                             profile_vector=None, seen=None):
+    ranked, scores = rank_by_mood(mood, user_history_titles, alpha, beta, gamma, profile_vector, seen=seen)
+    ranked, scores = ranked[:top_n], scores[:top_n]
+    top = current_catalog().movies.iloc[ranked]
+    return pd.DataFrame({
+        'title': top['title'].to_numpy(),
+        'score': scores,
+        'Genres': top['Genres'].to_numpy(),
+        'poster_path': top['poster_path'].to_numpy(),
+        'release_date': top['release_date'].to_numpy(),
+        'Movie_id': top['Movie_id'].to_numpy()
+    })
 
 recommend_movies_by_mood(
     mood='happy',
@@ -204,41 +392,40 @@ def join_blend_code(code, user_history, user_id="User2"):
 import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
 
-def recommend_blend(user_histories, top_n=50, alpha=0.9, beta=0.1):
+def rank_movies(profile_vector, exclude_titles, n_candidates=None, alpha=0.9, beta=0.1, cat=None, candidates=None,
+                seen=None):
     """
-    Recommends movies for a group blend session using a combination of cosine similarity
-    (from TF-IDF vectors of watched movies) and normalized rating scores.
+    Scores the catalog against a profile vector and ranks it.
 
     Parameters:
-        user_histories (List[List[str]]): List of lists, each with movie titles watched by a user.
-        top_n (int): Number of top recommendations to return.
+        profile_vector (np.ndarray): Profile in TF-IDF space.
+        exclude_titles (Set[str]): Lowercased titles to leave out (already watched).
+        n_candidates (int): Shortlist size when the ANN index is enabled;
+            None scores the whole catalog.
         alpha (float): Weight for similarity score.
         beta (float): Weight for rating score.
+        cat (Catalog): Catalog version to rank, defaults to the current one.
+        candidates (np.ndarray): Filtered catalog indices to rank (see
+            `filter_candidates`); None ranks the whole catalog.
+        seen (np.ndarray): Bitset of movies to leave out (see seen_movies.py),
+            used instead of `exclude_titles` when given.
 
     Returns:
-        dict: {
-            "blend_recommendations": List of recommended movies,
-            "overall_match_score": Percentage match score across top_n movies
-        }
+        Tuple[np.ndarray, np.ndarray]: Catalog indices and match scores, best first.
     """
-    if not user_histories or not all(user_histories):
-        return []
-
-    # Normalize user history (lowercase & deduplicate)
-    cleaned_histories = [set(title.lower().strip() for title in history if title.strip()) for history in user_histories]
-    all_titles = set.union(*cleaned_histories)
-
-    if not all_titles:
-        return []
-
-    # Get indices of the watched movies
-    indices = movies[movies['title'].str.lower().isin(all_titles)].index.tolist()
-    if not indices:
-        return []
+    cat = cat or current_catalog()
+    with metrics.timer("similarity"):
+        candidate_indices, candidate_sims = profile_candidates(
+            profile_vector, n_candidates or len(cat.movies), cat, candidates
+        )
+    return rank_candidates(candidate_indices, candidate_sims, exclude_titles, alpha, beta, cat, seen)
 
-    # Build blend profile vector from TF-IDF matrix
-    profile_vector = np.mean(tfidf_matrix[indices], axis=0).A1
-    user_sim = cosine_similarity([profile_vector], tfidf_matrix).flatten()
+def rank_candidates(candidate_indices, candidate_sims, exclude_titles, alpha, beta, cat, seen=None):
+    """
+    Blends candidate similarities with the rating score, drops watched titles
+    and sorts. See `rank_movies`.
+    """
+    movies = cat.movies
 
     # Normalize rating (if not already)
     if 'weighted_rating_norm' not in movies.columns:
@@ -249,34 +436,224 @@ def recommend_blend(user_histories, top_n=50, alpha=0.9, beta=0.1):
         else:
             movies['weighted_rating_norm'] = 0.5  # fallback default
 
-    scores = []
+    with metrics.timer("scoring"):
+        rating_scores = movies['weighted_rating_norm'].to_numpy()[candidate_indices]
+        match_scores = np.round(alpha * candidate_sims + beta * rating_scores, 4)
+
+        # Skip movies already watched
+        watched = watched_mask(movies['title'], candidate_indices, exclude_titles, seen)
+        candidate_indices, match_scores = candidate_indices[~watched], match_scores[~watched]
+
+    with metrics.timer("top_k"):
+        # Stable sort keeps catalog order between equal scores
+        order = np.argsort(-match_scores, kind='stable')
+    return candidate_indices[order], match_scores[order]
+
+def format_ranked_movies(indices, match_scores, score_key="match_score"):
+    """
+    Builds the recommendation dicts for a slice of a ranking straight from the
+    response columns. `score_key` is "match_score" for blends and "score" for
+    the per-user endpoints.
+    """
+    columns = current_catalog().response_columns
+    titles, genres = columns["title"], columns["genres"]
+    poster_paths, release_dates = columns["poster_path"], columns["release_date"]
+    indices, match_scores = np.asarray(indices), np.asarray(match_scores)
+    if len(indices) and indices.max() >= len(titles):
+        # Ranked under a newer catalog than the one now served (after a rollback)
+        keep = indices < len(titles)
+        indices, match_scores = indices[keep], match_scores[keep]
+    with metrics.timer("serialization"):
+        return [
+            {
+                "title": titles[i],
+                "genres": genres[i],
+                score_key: score,
+                "poster_path": poster_paths[i],
+                "release_date": release_dates[i]
+            }
+            for i, score in zip(indices.tolist(), match_scores.tolist())
+        ]
+
+def overall_match_score(match_scores):
+    overall_match_raw = np.mean(match_scores) if len(match_scores) else 0.0
+    return f"{round(overall_match_raw * 100, 2)}%"
+
+BLEND_STRATEGIES = ("average", "least_misery", "fairness", "union")
+BLEND_FAIRNESS_TOP_K = 20  # best matches per member that measure how well the catalog serves them
+
+def rank_blend(user_histories, max_results=None, alpha=0.9, beta=0.1, profile_vector=None,
+               strategy="average", member_vectors=None, filters=None, seen=None):
+    """
+    Ranks the catalog for a group blend session. See `recommend_blend`.
+
+    Every member gets their own normalized profile, all members are scored in
+    one sparse product with the catalog and the per-member similarities are
+    aggregated per movie (see `aggregate_member_scores`), so a member with 500
+    watches counts as much as one with 5. The "union" strategy instead ranks
+    one profile averaged over all members' watched movies.
+
+    Parameters:
+        strategy (str): One of BLEND_STRATEGIES.
+        member_vectors (List[np.ndarray]): Precomputed profile per member (e.g.
+            decayed profiles), None entries fall back to the member's history.
+        filters (dict): Structured filters (see filters.py); only the movies
+            passing them are scored.
+        seen (np.ndarray): Bitset of the movies any member has seen (see
+            seen_movies.py); defaults to matching the history titles.
 
-    for idx, row in movies.iterrows():
-        title_lc = row['title'].lower()
-        if title_lc in all_titles:
+    Returns:
+        Tuple[np.ndarray, np.ndarray] or None: Catalog indices and match scores,
+        best first, or None when no blend profile can be built.
+    """
+    if strategy not in BLEND_STRATEGIES:
+        raise ValueError(f"Unknown blend strategy: {strategy}")
+    if not user_histories or not all(user_histories):
+        return None
+
+    # Normalize user history (lowercase & deduplicate)
+    cleaned_histories = [set(title.lower().strip() for title in history if title.strip()) for history in user_histories]
+    all_titles = set.union(*cleaned_histories)
+
+    if not all_titles:
+        return None
+
+    cat = current_catalog()
+    candidates = filter_candidates(filters, cat)
+    if strategy != "union":
+        return rank_blend_members(cleaned_histories, all_titles, max_results, alpha, beta, strategy,
+                                  member_vectors, cat, candidates, seen)
+
+    if profile_vector is None and member_vectors is not None:
+        normalized = [v / (np.linalg.norm(v) or 1.0) for v in member_vectors if v is not None]
+        profile_vector = np.mean(normalized, axis=0) if normalized else None
+
+    with metrics.timer("profile_build"):
+        # Watched movies: to build the blend profile, and to size shortlists
+        # without a seen bitset
+        indices = history_indices(all_titles, cat) if profile_vector is None or seen is None else []
+        if not indices and profile_vector is None:
+            return None
+
+        # Build blend profile vector from TF-IDF matrix
+        if profile_vector is None:
+            profile_vector = quantized_features.mean_rows(cat.tfidf_matrix, indices)
+
+    n_candidates = ANN_SHORTLIST * max_results + excluded_count(len(indices), seen) if max_results else None
+    ranked, match_scores = rank_movies(profile_vector, all_titles, n_candidates, alpha, beta, cat, candidates, seen)
+    return ranked[:max_results], match_scores[:max_results]
+
+def member_profiles(cleaned_histories, all_titles, member_vectors, cat):
+    """
+    Stacks each member's L2-normalized profile (the mean of their watched
+    movies' TF-IDF rows, or their precomputed vector) into a sparse
+    (members x terms) matrix. Members without a profile are left out.
+
+    Returns:
+        Tuple[sp.csr_matrix, int]: Profiles and the number of watched catalog movies.
+    """
+    by_title = title_positions(cat)
+
+    # Averaging matrix: row j holds 1/len over member j's watched movies
+    rows, cols, weights, dense = [], [], [], {}
+    for j, history in enumerate(cleaned_histories):
+        vector = member_vectors[j] if member_vectors is not None else None
+        if vector is not None:
+            dense[j] = vector
             continue
+        indices = sorted({i for title in history for i in by_title.get(title, [])})
+        if not indices:
+            continue
+        rows.extend([j] * len(indices))
+        cols.extend(indices)
+        weights.extend([1.0 / len(indices)] * len(indices))
+    averaging = sp.csr_matrix((weights, (rows, cols)), shape=(len(cleaned_histories), len(cat.movies)))
+    profiles = quantized_features.weighted_rows(averaging, cat.tfidf_matrix).tolil()
+    for j, vector in dense.items():
+        profiles[j] = vector
+    profiles = profiles.tocsr()
+
+    norms = np.sqrt(np.asarray(profiles.multiply(profiles).sum(axis=1)).ravel())
+    keep = norms > 0
+    profiles = sp.diags(1.0 / norms[keep]) @ profiles[keep]
+    return profiles.tocsr(), len(history_indices(all_titles, cat))
+
+def aggregate_member_scores(member_scores, strategy):
+    """
+    Combines a (movies x members) similarity matrix into one score per movie.
 
-        sim_score = user_sim[idx]
-        rating_score = row.get('weighted_rating_norm', 0.5)  # fallback if missing
-        match_score = alpha * sim_score + beta * rating_score
+        average        mean over members
+        least_misery   the least satisfied member's similarity
+        fairness       weighted mean, each member weighted inversely to how well
+                       the catalog serves them (their mean top-k similarity), so
+                       niche tastes aren't outvoted by easily served ones
+    """
+    if strategy == "least_misery":
+        return member_scores.min(axis=1)
+    if strategy == "fairness":
+        k = min(BLEND_FAIRNESS_TOP_K, len(member_scores))
+        best = np.partition(member_scores, len(member_scores) - k, axis=0)[-k:].mean(axis=0)
+        weights = 1.0 / np.maximum(best, 1e-6)
+        return member_scores @ (weights / weights.sum())
+    return member_scores.mean(axis=1)
+
+def rank_blend_members(cleaned_histories, all_titles, max_results, alpha, beta, strategy, member_vectors, cat,
+                       candidates=None, seen=None):
+    with metrics.timer("profile_build"):
+        profiles, n_watched = member_profiles(cleaned_histories, all_titles, member_vectors, cat)
+        if profiles.shape[0] == 0:
+            return None
+
+    with metrics.timer("similarity"):
+        n_movies = len(cat.movies)
+        n_candidates = ANN_SHORTLIST * max_results + excluded_count(n_watched, seen) if max_results else n_movies
+        if candidates is not None:
+            candidate_indices, candidate_matrix = candidates, cat.tfidf_matrix[candidates]
+        elif cat.ann_index is not None and n_candidates < n_movies:
+            # Union of every member's approximate shortlist, scored exactly below
+            candidate_indices = np.unique(np.concatenate([
+                ann_search(cat.ann_index, profiles[j].toarray().ravel(), n_candidates, n_probe=ANN_PROBES)[0]
+                for j in range(profiles.shape[0])
+            ]))
+            candidate_matrix = cat.tfidf_matrix[candidate_indices]
+        else:
+            candidate_indices, candidate_matrix = np.arange(n_movies), cat.tfidf_matrix
+        # One sparse product scores every member; rows of both sides are unit
+        # length, so these are cosine similarities
+        member_scores = quantized_features.product(candidate_matrix, profiles.T)
+        candidate_sims = aggregate_member_scores(member_scores, strategy)
 
-        scores.append({
-            "title": row['title'],
-            "genres": row['Genres'],
-            "match_score": round(match_score, 4),
-            "poster_path": row.get('poster_path', ''),
-            "release_date": row.get('release_date', '')
-        })
+    ranked, match_scores = rank_candidates(candidate_indices, candidate_sims, all_titles, alpha, beta, cat, seen)
+    return ranked[:max_results], match_scores[:max_results]
 
-    # Sort and return top recommendations
-    scores.sort(key=lambda x: x['match_score'], reverse=True)
+def recommend_blend(user_histories, top_n=50, alpha=0.9, beta=0.1, profile_vector=None, strategy="average"):
+    """
+    Recommends movies for a group blend session using a combination of cosine similarity
+    (from TF-IDF vectors of watched movies) and normalized rating scores.
 
-    overall_match_raw = np.mean([x['match_score'] for x in scores[:top_n]]) if scores else 0.0
-    overall_match_percent = round(overall_match_raw * 100, 2)
+    Parameters:
+        user_histories (List[List[str]]): List of lists, each with movie titles watched by a user.
+        top_n (int): Number of top recommendations to return.
+        alpha (float): Weight for similarity score.
+        beta (float): Weight for rating score.
+        profile_vector (np.ndarray): Precomputed blend profile for the "union"
+            strategy; defaults to the mean of all watched movies.
+        strategy (str): How member scores are aggregated, see `rank_blend`.
 
+    Returns:
+        dict: {
+            "blend_recommendations": List of recommended movies,
+            "overall_match_score": Percentage match score across top_n movies
+        }
+    """
+    ranking = rank_blend(user_histories, top_n, alpha, beta, profile_vector, strategy)
+    if ranking is None:
+        return []
+
+    ranked, match_scores = ranking
     return {
-        "blend_recommendations": scores[:top_n],
-        "overall_match_score": f"{overall_match_percent}%"
+        "blend_recommendations": format_ranked_movies(ranked, match_scores),
+        "overall_match_score": overall_match_score(match_scores)
     }
 
 from collections import Counter
@@ -315,36 +692,27 @@ def get_genre_tag(user_watched_genres):
 
     genre_counts = Counter(user_watched_genres)
     most_common_genre = genre_counts.most_common(1)[0][0]
+    return genre_tag(most_common_genre)
 
-    if most_common_genre == 'Sci-Fi':
-        most_common_genre = 'Science Fiction'
+def genre_tag(genre):
+    if genre == 'Sci-Fi':
+        genre = 'Science Fiction'
 
-    return GENRE_TAGS.get(most_common_genre, "No Tag")
+    return GENRE_TAGS.get(genre, "No Tag")
+
+def tag_from_genre_counts(histogram, cat=None):
+    """
+    Tag for a per-user genre histogram (see genre_counts.py), the same one
+    `assign_tag_from_movie_history` gives for the history it counts.
+    """
+    cat = cat or current_catalog()
+    genre = genre_counts_top(histogram, cat.genre_names)
+    return genre_tag(genre) if genre is not None else "No Tag"
 
 # --- Part 2: Load Movie Data and Create Title-to-Genre Mapping ---
 
-try:
-    movies_df = pd.read_csv('./data/10000 Movies Data')
-except FileNotFoundError:
-    print("Error: '10000 Movies Data' not found. Please ensure the file is in the correct directory.")
-    exit()
-
-def extract_genres_from_string(genres_str):
-    if isinstance(genres_str, str):
-        try:
-            return [d['name'] for d in ast.literal_eval(genres_str)]
-        except (ValueError, SyntaxError):
-            return []
-    return []
-
-movies_df['parsed_genres'] = movies_df['Genres'].apply(extract_genres_from_string)
-
-movie_title_to_genres = {}
-for index, row in movies_df.iterrows():
-    title = row['title']
-    genres = row['parsed_genres']
-    if title not in movie_title_to_genres:
-        movie_title_to_genres[title] = genres
+# Built from the columnar store together with the catalog above
+movie_title_to_genres = catalog.title_to_genres
 
 # --- Part 3: Function to Process User History (Movie Titles) and Assign Tags ---
 
@@ -364,8 +732,9 @@ def assign_tag_from_movie_history(user_movie_history):
             flat_movie_list.append(item)
 
     # Collect genres for each movie title
+    title_to_genres = current_catalog().title_to_genres
     for movie_title in flat_movie_list:
-        genres = movie_title_to_genres.get(movie_title)
+        genres = title_to_genres.get(movie_title)
         if genres:
             all_genres_from_history.extend(genres)
 
@@ -379,7 +748,46 @@ join_blend_code(code, ['Frozen', 'Moana'], user_id="Bob")
 
 join_blend_code(code, ['Se7en', 'The Godfather'], user_id="Charlie")
 
-def recommend_for_user(user_history, top_n=25, alpha=0.9, beta=0.1):
+def rank_for_user(user_history, max_results=None, alpha=0.9, beta=0.1, profile_vector=None, filters=None,
+                  seen=None):
+    """
+    Ranks the catalog for an individual user. See `recommend_for_user`. With
+    `filters` (see filters.py) only the movies passing them are scored. Movies
+    set in the `seen` bitset (see seen_movies.py) are left out, or the history
+    titles without one.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray] or None: Catalog indices and match scores,
+        best first, or None when no user profile can be built.
+    """
+    if not user_history:
+        return None
+
+    # Normalize user history (lowercase & deduplicate)
+    cleaned_history = set(title.lower().strip() for title in user_history if title.strip())
+    if not cleaned_history:
+        return None
+
+    cat = current_catalog()
+    with metrics.timer("profile_build"):
+        # Watched movies: to build the user profile, and to size shortlists
+        # without a seen bitset
+        indices = history_indices(cleaned_history, cat) if profile_vector is None or seen is None else []
+        if not indices and profile_vector is None:
+            return None
+
+        # Build user profile vector from TF-IDF matrix
+        if profile_vector is None:
+            profile_vector = quantized_features.mean_rows(cat.tfidf_matrix, indices)
+
+    n_candidates = ANN_SHORTLIST * max_results + excluded_count(len(indices), seen) if max_results else None
+    candidates = filter_candidates(filters, cat)
+    ranked, match_scores = rank_movies(
+        profile_vector, cleaned_history, n_candidates, alpha, beta, cat, candidates, seen
+    )
+    return ranked[:max_results], match_scores[:max_results]
+
+def recommend_for_user(user_history, top_n=25, alpha=0.9, beta=0.1, profile_vector=None):
     """
     Recommends movies for an individual user based on their watch history using
     a combination of cosine similarity and normalized rating scores.
@@ -389,6 +797,8 @@ def recommend_for_user(user_history, top_n=25, alpha=0.9, beta=0.1):
         top_n (int): Number of top recommendations to return.
         alpha (float): Weight for similarity score.
         beta (float): Weight for rating score.
+        profile_vector (np.ndarray): Precomputed (e.g. time-decayed) profile;
+            defaults to the mean of the watched movies' TF-IDF rows.
 
     Returns:
         dict: {
@@ -396,60 +806,14 @@ def recommend_for_user(user_history, top_n=25, alpha=0.9, beta=0.1):
             "overall_match_score": Percentage match score across top_n movies
         }
     """
-    if not user_history:
-        return []
-
-    # Normalize user history (lowercase & deduplicate)
-    cleaned_history = set(title.lower().strip() for title in user_history if title.strip())
-    if not cleaned_history:
-        return []
-
-    # Get indices of the watched movies
-    indices = movies[movies['title'].str.lower().isin(cleaned_history)].index.tolist()
-    if not indices:
+    ranking = rank_for_user(user_history, top_n, alpha, beta, profile_vector)
+    if ranking is None:
         return []
 
-    # Build user profile vector from TF-IDF matrix
-    profile_vector = np.mean(tfidf_matrix[indices], axis=0).A1
-    user_sim = cosine_similarity([profile_vector], tfidf_matrix).flatten()
-
-    # Normalize rating (if not already)
-    if 'weighted_rating_norm' not in movies.columns:
-        min_rating = movies['weighted_rating'].min()
-        max_rating = movies['weighted_rating'].max()
-        if max_rating != min_rating:
-            movies['weighted_rating_norm'] = (movies['weighted_rating'] - min_rating) / (max_rating - min_rating)
-        else:
-            movies['weighted_rating_norm'] = 0.5  # fallback default
-
-    scores = []
-
-    for idx, row in movies.iterrows():
-        title_lc = row['title'].lower()
-        if title_lc in cleaned_history:
-            continue
-
-        sim_score = user_sim[idx]
-        rating_score = row.get('weighted_rating_norm', 0.5)
-        match_score = alpha * sim_score + beta * rating_score
-
-        scores.append({
-            "title": row['title'],
-            "genres": row['Genres'],
-            "match_score": round(match_score, 4),
-            "poster_path": row.get('poster_path', ''),
-            "release_date": row.get('release_date', '')
-        })
-
-    # Sort and return top recommendations
-    scores.sort(key=lambda x: x['match_score'], reverse=True)
-
-    overall_match_raw = np.mean([x['match_score'] for x in scores[:top_n]]) if scores else 0.0
-    overall_match_percent = round(overall_match_raw * 100, 2)
-
+    ranked, match_scores = ranking
     return {
-        "user_recommendations": scores[:top_n],
-        "overall_match_score": f"{overall_match_percent}%"
+        "user_recommendations": format_ranked_movies(ranked, match_scores),
+        "overall_match_score": overall_match_score(match_scores)
     }
 
 user_history = [
@@ -458,47 +822,6 @@ user_history = [
     "Interstellar"
 ]
 
-def record_until_enter(output_filename="output.wav", sample_rate=44100, channels=1):
-    chunk_size = 1024
-    audio_format = pyaudio.paInt16
-    frames = []
-    recording = True
-
-    def record_thread():
-        nonlocal recording
-        p = pyaudio.PyAudio()
-        stream = p.open(format=audio_format,
-                        channels=channels,
-                        rate=sample_rate,
-                        input=True,
-                        frames_per_buffer=chunk_size)
-        print("Recording... Press Enter to stop.")
-        while recording:
-            data = stream.read(chunk_size)
-            frames.append(data)
-        stream.stop_stream()
-        stream.close()
-        p.terminate()
-
-    t = threading.Thread(target=record_thread)
-    t.start()
-    input()  # Wait for Enter key
-    recording = False
-    t.join()
-
-    wf = wave.open(output_filename, 'wb')
-    wf.setnchannels(channels)
-    wf.setsampwidth(pyaudio.PyAudio().get_sample_size(audio_format))
-    wf.setframerate(sample_rate)
-    wf.writeframes(b''.join(frames))
-    wf.close()
-    print("Recording stopped and saved to", output_filename)
-
-def transcribe_voice(audio_path):
-    model = whisper.load_model("medium")
-    result = model.transcribe(audio_path)
-    return result['text']
-
 def extract_query_keywords(query):
     stopwords = set([
         'the', 'a', 'an', 'and', 'or', 'to', 'in', 'of', 'with', 'for', 'on', 'at', 'by', 'so', 'i', 'was', 'it', 'like',
@@ -518,7 +841,8 @@ def extract_reference_movie(user_query, movie_titles):
 
 def clean_query(user_query, ref_movie):
     if ref_movie:
-        return user_query.replace(ref_movie, '').strip()
+        # Case-insensitive, like extract_reference_movie's match
+        return re.sub(re.escape(ref_movie), '', user_query, flags=re.IGNORECASE).strip()
     return user_query
 
 def keyword_genre_boost(row, query_keywords):
@@ -533,6 +857,15 @@ def keyword_genre_boost(row, query_keywords):
             boost += 0.2
     return boost
 
+def text_index(cat):
+    """
+    The catalog's inverted index for descriptive queries, built on first use.
+    """
+    if cat.text_index is None:
+        with metrics.timer("text_index"):
+            cat.text_index = TextIndex(cat.movies, cat.tfidf_matrix, cat.movies['weighted_rating_norm'].to_numpy())
+    return cat.text_index
+
 def enhanced_descriptive_recommendation(
     user_query,
     movies,
@@ -542,8 +875,28 @@ def enhanced_descriptive_recommendation(
     top_n=10,
     alpha=0.5,
     beta=0.3,
-    gamma=0.2
+    gamma=0.2,
+    profile_vector=None,
+    seen=None,
+    index=None
 ):
+    """
+    Ranks movies for a free text query: similarity to the query, to the
+    user's profile and the rating, plus keyword and genre boosts.
+
+    Only movies containing a query term or boosted keyword / genre, and the
+    few others whose profile and rating could still reach the top_n, are
+    scored (see text_index.py).
+
+    Parameters:
+        seen (np.ndarray): Bitset of movies to leave out (see seen_movies.py);
+            defaults to the history titles.
+        index (TextIndex): Inverted index of this catalog (see `text_index`);
+            built on the fly when not given.
+
+    Returns:
+        pd.DataFrame: The top_n movies with their score, best first.
+    """
     query_keywords = extract_query_keywords(user_query)
     movie_titles = movies['title'].tolist()
     ref_movie = extract_reference_movie(user_query, movie_titles)
@@ -554,19 +907,6 @@ def enhanced_descriptive_recommendation(
         user_history_titles = user_history_titles + [ref_movie]
     user_history_titles_lower = [t.lower() for t in user_history_titles]
 
-    if user_history_titles:
-        user_history_indices = movies[movies['title'].str.lower().isin(user_history_titles_lower)].index.tolist()
-        if user_history_indices:
-            user_profile_vector = np.mean(tfidf_matrix[user_history_indices], axis=0).A1
-            user_sim = cosine_similarity([user_profile_vector], tfidf_matrix).flatten()
-        else:
-            user_sim = np.zeros(len(movies))
-    else:
-        user_sim = np.zeros(len(movies))
-
-    desc_vec = tfidf.transform([desc_query])
-    desc_sim = cosine_similarity(desc_vec, tfidf_matrix).flatten()
-
     if 'weighted_rating_norm' not in movies.columns:
         min_rating = movies['weighted_rating'].min()
         max_rating = movies['weighted_rating'].max()
@@ -574,29 +914,102 @@ def enhanced_descriptive_recommendation(
             movies['weighted_rating_norm'] = (movies['weighted_rating'] - min_rating) / (max_rating - min_rating)
         else:
             movies['weighted_rating_norm'] = 0.5
-
-    scores = []
-    for idx, row in movies.iterrows():
-        title_lc = row['title'].lower()
-        if title_lc in user_history_titles_lower:
-            continue
-        sim_score = desc_sim[idx]
-        profile_score = user_sim[idx]
-        rating_score = row['weighted_rating_norm']
-        boost = keyword_genre_boost(row, query_keywords)
-        final_score = alpha * sim_score + beta * profile_score + gamma * rating_score + boost
-        scores.append((row['Movie_id'], row['title'], row['Genres'], row['release_date'], row['Keywords'],
-                       row['overview'], row['poster_path'], row['Budget'], row['Revenue'],
-                       row['popularity'], row['vote_average'], row['vote_count'], final_score))
-    scores.sort(key=lambda x: x[-1], reverse=True)
+    ratings = movies['weighted_rating_norm'].to_numpy()
+    if index is None:
+        index = TextIndex(movies, tfidf_matrix, ratings)
+
+    cat = current_catalog()
+
+    def title_indices(titles_lower):
+        if movies is cat.movies:
+            return history_indices(titles_lower, cat)
+        return movies.index[movies['title'].str.lower().isin(titles_lower)].tolist()
+
+    # Unit-length user profile (None without one)
+    user_profile_vector = None
+    if profile_vector is not None:
+        # Stored profile plus the reference movie from the query, if any
+        user_profile_vector = profile_vector / (np.linalg.norm(profile_vector) or 1.0)
+        if ref_movie:
+            ref_indices = title_indices([ref_movie.lower()])
+            if ref_indices:
+                user_profile_vector = user_profile_vector + quantized_features.mean_rows(tfidf_matrix, ref_indices)
+    elif user_history_titles:
+        user_history_indices = title_indices(user_history_titles_lower)
+        if user_history_indices:
+            user_profile_vector = quantized_features.mean_rows(tfidf_matrix, user_history_indices)
+    if user_profile_vector is not None:
+        norm = np.linalg.norm(user_profile_vector)
+        user_profile_vector = user_profile_vector / norm if norm else None
+
+    def unwatched(indices):
+        # Skip movies already watched (and the reference movie)
+        watched = watched_mask(movies['title'], indices, user_history_titles_lower, seen)
+        if seen is not None and ref_movie:
+            watched |= (movies['title'].iloc[indices].str.lower() == ref_movie.lower()).to_numpy()
+        return indices[~watched]
+
+    with metrics.timer("similarity"):
+        desc_vec = tfidf.transform([desc_query])
+        text_indices, text_sims = index.text_scores(desc_vec)
+        keyword_indices = index.keyword_matches(query_keywords)
+        genre_indices = index.genre_matches(query_keywords)
+
+    def final_scores(indices):
+        desc_sim = np.zeros(len(indices))
+        slots = np.minimum(np.searchsorted(text_indices, indices), max(len(text_indices) - 1, 0))
+        found = text_indices[slots] == indices if len(text_indices) else np.zeros(len(indices), dtype=bool)
+        desc_sim[found] = text_sims[slots[found]]
+        profile_sim = (
+            quantized_features.dot(tfidf_matrix[indices], user_profile_vector)
+            if user_profile_vector is not None else 0.0
+        )
+        boost = 0.3 * np.isin(indices, keyword_indices) + 0.2 * np.isin(indices, genre_indices)
+        return alpha * desc_sim + beta * profile_sim + gamma * ratings[indices] + boost
+
+    with metrics.timer("scoring"):
+        # Movies in any query posting list are scored exactly...
+        essential = np.union1d(text_indices, np.union1d(keyword_indices, genre_indices))
+        candidates = unwatched(essential)
+        scores = final_scores(candidates)
+
+        # ...and every other movie scores beta * profile similarity + gamma *
+        # rating at most, so only those whose bound reaches the top_n threshold
+        # need scoring
+        threshold = -np.inf
+        if 0 < top_n <= len(scores):
+            threshold = np.partition(scores, len(scores) - top_n)[len(scores) - top_n]
+        profile_bound = beta * index.profile_bound(user_profile_vector)
+        if gamma > 0:
+            others = index.rated_at_least((threshold - profile_bound) / gamma - 1e-9)
+        else:
+            others = np.arange(len(movies)) if profile_bound >= threshold else np.array([], dtype=np.int64)
+        others = unwatched(np.setdiff1d(others, essential))
+        candidates = np.concatenate([candidates, others])
+        scores = np.concatenate([scores, final_scores(others)])
+
+    with metrics.timer("top_k"):
+        # Best first, catalog order among equal scores
+        order = np.lexsort((candidates, -scores))[:top_n]
     columns = ['Movie_id', 'title', 'Genres', 'release_date', 'Keywords', 'overview', 'poster_path',
-               'Budget', 'Revenue', 'popularity', 'vote_average', 'vote_count', 'score']
-    return pd.DataFrame(scores[:top_n], columns=columns)
+               'Budget', 'Revenue', 'popularity', 'vote_average', 'vote_count']
+    result = movies.iloc[candidates[order]][columns].reset_index(drop=True)
+    result['score'] = scores[order]
+    return result
 
-def handle_voice_search(audio_path, user_history_titles=None, top_n=5):
-    user_query = transcribe_voice(audio_path)
-    print("\nTranscribed text:", user_query)
-    
+def detect_query_cues(user_query):
+    """
+    Returns (mood, reference movie title) found in a (partial) voice query,
+    either may be None.
+    """
+    return detect_mood(user_query), extract_reference_movie(user_query, current_catalog().movies['title'].tolist())
+
+def recommend_for_query(user_query, user_history_titles=None, top_n=5, profile_vector=None, seen=None):
+    """
+    Recommendations for a transcribed voice query: by mood if the query names
+    one, by description (and reference movie) otherwise. `seen` is the bitset
+    of movies to leave out (see seen_movies.py), defaulting to the history titles.
+    """
     # Detect mood from the query
     mood = detect_mood(user_query)
     
@@ -605,12 +1018,16 @@ def handle_voice_search(audio_path, user_history_titles=None, top_n=5):
         recommendations = recommend_movies_by_mood(
             mood,
             user_history_titles=user_history_titles,
-            top_n=top_n
+            top_n=top_n,
+            profile_vector=profile_vector,
+            seen=seen
         )
     else:
         # Fallback to descriptive recommendation
+        cat = current_catalog()
         recommendations = enhanced_descriptive_recommendation(
-            user_query, movies, tfidf, tfidf_matrix,
-            user_history_titles=user_history_titles, top_n=top_n
+            user_query, cat.movies, cat.tfidf, cat.tfidf_matrix,
+            user_history_titles=user_history_titles, top_n=top_n,
+            profile_vector=profile_vector, seen=seen, index=text_index(cat)
         )
     return recommendations
\ No newline at end of file
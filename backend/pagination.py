@@ -0,0 +1,80 @@
+"""
+Cursor-based pagination over cached rankings.
+
+The first page of a paginated endpoint ranks the catalog once and stores the
+ranked catalog indices here under a random key. Follow-up pages pass back an
+opaque cursor and are served as O(page size) slices of that same ranking, so
+pages stay consistent and never repeat an item.
+"""
+
+import base64
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import metrics
+
+_rankings = OrderedDict()
+_lock = threading.Lock()
+
+
+def store_ranking(owner, indices, match_scores, meta=None, ttl_seconds=300, max_entries=10000):
+    """
+    Caches a ranking for `ttl_seconds` and returns its key. The oldest rankings
+    are evicted once `max_entries` is reached.
+
+    Parameters:
+        owner (str): Only this caller may page through the ranking.
+        indices (np.ndarray): Ranked catalog indices, best first.
+        match_scores (np.ndarray): Score of each ranked index.
+        meta (dict): Anything the endpoint needs to rebuild later pages.
+    """
+    key = uuid.uuid4().hex
+    entry = {
+        "owner": owner,
+        "indices": indices,
+        "match_scores": match_scores,
+        "meta": meta or {},
+        "expires_at": time.monotonic() + ttl_seconds,
+    }
+    with _lock:
+        _rankings[key] = entry
+        while len(_rankings) > max_entries:
+            _rankings.popitem(last=False)
+    return key
+
+
+def get_ranking(key, *owners):
+    """
+    Returns the cached ranking, or None if it expired or belongs to none of `owners`.
+    """
+    with _lock:
+        entry = _rankings.get(key)
+        if entry is not None and entry["expires_at"] < time.monotonic():
+            del _rankings[key]
+            entry = None
+    metrics.cache_lookup("cursor", entry is not None)
+    if entry is None:
+        return None
+    return entry if entry["owner"] in owners else None
+
+
+def encode_cursor(key, offset):
+    return base64.urlsafe_b64encode(f"{key}:{offset}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Returns (key, offset), or raises ValueError for a malformed cursor.
+    """
+    padded = cursor + "=" * (-len(cursor) % 4)
+    key, offset = base64.urlsafe_b64decode(padded.encode()).decode().split(":")
+    offset = int(offset)
+    if offset < 0:
+        raise ValueError("negative offset")
+    return key, offset
+
+
+def next_cursor(key, offset, page_size, total):
+    return encode_cursor(key, offset + page_size) if offset + page_size < total else None
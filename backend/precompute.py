@@ -0,0 +1,126 @@
+"""
+Precompute-and-serve store for history-based recommendations.
+
+A background worker writes each user's top-N ranking into a local SQLite file,
+so /recommend/history can answer most requests with a single key lookup and
+only falls back to online scoring when a ranking is missing or too stale.
+"""
+
+import sqlite3
+import threading
+from datetime import datetime
+
+import numpy as np
+
+_conn = None
+_lock = threading.Lock()
+
+
+def init_store(path):
+    """
+    Opens (or creates) the SQLite file that holds the precomputed rankings.
+    """
+    global _conn
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS precomputed_rankings (
+            user_id TEXT PRIMARY KEY,
+            history_watermark TEXT,
+            built_at TEXT NOT NULL,
+            indices BLOB NOT NULL,
+            match_scores BLOB NOT NULL
+        )
+        """
+    )
+    conn.commit()
+    _conn = conn
+
+
+def close_store():
+    global _conn
+    if _conn is not None:
+        _conn.close()
+        _conn = None
+
+
+def as_watermark(watched_at):
+    """
+    Normalizes a `watched_at` value (datetime, string or None) to the ISO string
+    stored alongside each ranking, so DB values and stored values compare equal.
+    """
+    if watched_at is None:
+        return None
+    if isinstance(watched_at, str):
+        watched_at = datetime.fromisoformat(watched_at)
+    return watched_at.isoformat()
+
+
+def save_user_ranking(user_id, indices, match_scores, history_watermark, built_at=None):
+    """
+    Stores a freshly computed ranking for a user.
+
+    Parameters:
+        user_id (str): Owner of the ranking.
+        indices (np.ndarray): Ranked catalog indices, as returned by `rank_for_user`.
+        match_scores (np.ndarray): Score of each ranked index.
+        history_watermark: Latest `watched_at` the ranking was built from.
+        built_at (datetime): Build time, defaults to now (UTC).
+    """
+    built_at = built_at or datetime.utcnow()
+    with _lock:
+        _conn.execute(
+            "INSERT OR REPLACE INTO precomputed_rankings VALUES (?, ?, ?, ?, ?)",
+            (
+                user_id,
+                as_watermark(history_watermark),
+                built_at.isoformat(),
+                np.asarray(indices, dtype=np.int32).tobytes(),
+                np.asarray(match_scores, dtype=np.float64).tobytes(),
+            ),
+        )
+        _conn.commit()
+
+
+def load_user_ranking(user_id):
+    """
+    Returns the stored entry for a user, or None if nothing was precomputed yet.
+    """
+    with _lock:
+        row = _conn.execute(
+            "SELECT history_watermark, built_at, indices, match_scores "
+            "FROM precomputed_rankings WHERE user_id = ?",
+            (user_id,),
+        ).fetchone()
+    if row is None:
+        return None
+    return {
+        "history_watermark": row[0],
+        "built_at": datetime.fromisoformat(row[1]),
+        "indices": np.frombuffer(row[2], dtype=np.int32),
+        "match_scores": np.frombuffer(row[3], dtype=np.float64),
+    }
+
+
+def load_watermarks():
+    """
+    Returns {user_id: history_watermark} for every stored ranking.
+    """
+    with _lock:
+        rows = _conn.execute("SELECT user_id, history_watermark FROM precomputed_rankings").fetchall()
+    return dict(rows)
+
+
+def is_servable(entry, latest_watched_at, max_staleness_seconds, now=None):
+    """
+    A ranking built from the user's current history is always servable. Once the
+    history has moved on, the old ranking is still served until it is older than
+    `max_staleness_seconds`, after which the caller should score online.
+    """
+    if entry is None:
+        return False
+    if entry["history_watermark"] == as_watermark(latest_watched_at):
+        return True
+    now = now or datetime.utcnow()
+    return (now - entry["built_at"]).total_seconds() <= max_staleness_seconds
@@ -0,0 +1,265 @@
+"""
+On-demand sampling profiler for individual requests.
+
+While a profiled request runs, a background thread snapshots Python stacks
+with sys._current_frames() at a fixed interval. Samples are written in the
+folded-stack format ("outer;inner;leaf count" per line), which flamegraph.pl,
+speedscope and inferno all read directly.
+
+Other requests keep running meanwhile, on the event loop and in the thread
+pools, so only the threads working for the profiled request are sampled:
+
+    event loop     while it runs one of the request's tasks (any task created
+                   in the request's context, tracked by a task factory that
+                   is only installed while profiling)
+    worker         while it runs a call submitted through `call_attached` from
+                   the request's context (main.run_in_thread), or the
+                   request's endpoint if it is a sync function (concurrent
+                   requests to that same sync endpoint are included too)
+
+Ticks where no thread works for the request (awaiting I/O, a lock or other
+requests' turn on the event loop) are counted as WAITING_STACK, so sample
+counts still add up to the request's wall time.
+
+Nothing runs unless a request asks for it, and only one request is profiled
+at a time so concurrent profiles don't pollute each other.
+"""
+
+import asyncio
+import contextvars
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+# Threads parked in one of these frames are idle executor workers, not work
+IDLE_LEAVES = {
+    ("threading.py", "wait"), ("queue.py", "get"), ("selectors.py", "select"),
+    ("thread.py", "_worker"),  # concurrent.futures worker blocked on its work queue
+}
+
+# Ticks where nothing was working for the profiled request
+WAITING_STACK = "(waiting)"
+
+_active_lock = threading.Lock()
+
+# Profiler of the request this context belongs to, if it is being profiled
+_current = contextvars.ContextVar("profiler", default=None)
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def fold_stack(frame):
+    """
+    Returns the stack ending at `frame` as a root-first, ';'-joined string.
+    """
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+def is_idle(frame):
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_LEAVES
+
+
+def runs_code(frame, code):
+    while frame is not None:
+        if frame.f_code is code:
+            return True
+        frame = frame.f_back
+    return False
+
+
+def call_attached(func, *args, **kwargs):
+    """
+    Calls `func` in a worker thread on behalf of the request whose context it
+    was submitted from: while that request is profiled, this thread's stacks
+    are part of its profile.
+    """
+    active = _current.get()
+    if active is None:
+        return func(*args, **kwargs)
+    ident = threading.get_ident()
+    active._workers.add(ident)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        active._workers.discard(ident)
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of the threads working for the request that started
+    it (see the module docstring) every `interval` seconds until stopped.
+    Started outside an event loop, the starting thread is always sampled.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._owner = None
+        self._loop = None
+        self._tasks = set()
+        self._workers = set()
+        self._entry_code = None
+        self._previous_factory = None
+        self._context_token = None
+        self._started = None
+        self.duration = 0.0
+
+    def start(self, entry=None):
+        """
+        Must be called from the request's context. `entry` is the request's
+        endpoint; a sync one runs in a worker thread, found by its code.
+        """
+        self._owner = threading.get_ident()
+        if entry is not None and not asyncio.iscoroutinefunction(entry):
+            self._entry_code = getattr(entry, "__code__", None)
+        try:
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._loop = None
+        if self._loop is not None:
+            self._tasks.add(asyncio.current_task())
+            self._previous_factory = self._loop.get_task_factory()
+            self._loop.set_task_factory(self._task_factory)
+        self._context_token = _current.set(self)
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self._started
+        if self._loop is not None:
+            self._loop.set_task_factory(self._previous_factory)
+        _current.reset(self._context_token)
+        self._tasks.clear()
+        return self.stacks
+
+    def _task_factory(self, loop, coro, **kwargs):
+        if self._previous_factory is not None:
+            task = self._previous_factory(loop, coro, **kwargs)
+        else:
+            task = asyncio.Task(coro, loop=loop, **kwargs)
+        context = kwargs.get("context")
+        if (context.get(_current) if context is not None else _current.get()) is self:
+            self._tasks.add(task)
+        return task
+
+    def _works_for_request(self, thread_id, frame):
+        if thread_id == self._owner:
+            return self._loop is None or asyncio.current_task(self._loop) in self._tasks
+        if thread_id in self._workers:
+            return True
+        return self._entry_code is not None and not is_idle(frame) and runs_code(frame, self._entry_code)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            working = False
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own and self._works_for_request(thread_id, frame):
+                    self.stacks[fold_stack(frame)] += 1
+                    working = True
+            if not working:
+                self.stacks[WAITING_STACK] += 1
+
+
+def try_start(interval=0.005, entry=None):
+    """
+    Starts a profiler for the request of the calling context (with endpoint
+    `entry`), or returns None if another request is being profiled.
+    """
+    if not _active_lock.acquire(blocking=False):
+        return None
+    profiler = SamplingProfiler(interval)
+    try:
+        profiler.start(entry)
+    except Exception:
+        _active_lock.release()
+        raise
+    return profiler
+
+
+def finish(profiler):
+    try:
+        return profiler.stop()
+    finally:
+        _active_lock.release()
+
+
+# --- Storage ---
+
+PROFILE_ID_PATTERN = re.compile(r"^[0-9]{8}T[0-9]{6}-[0-9a-f]{8}$")
+
+
+def save_profile(profiler, directory, route, max_files=50):
+    """
+    Writes the folded stacks of a finished profiler and its metadata file,
+    prunes the oldest profiles beyond `max_files` and returns the new
+    profile's id.
+    """
+    os.makedirs(directory, exist_ok=True)
+    profile_id = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+    with open(os.path.join(directory, f"{profile_id}.folded"), "w") as f:
+        for stack, count in profiler.stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    with open(os.path.join(directory, f"{profile_id}.meta"), "w") as f:
+        f.write(f"route={route}\nduration_seconds={profiler.duration:.6f}\n"
+                f"samples={profiler.samples}\ninterval_seconds={profiler.interval}\n")
+
+    existing = sorted(name[:-len(".folded")] for name in os.listdir(directory) if name.endswith(".folded"))
+    for old_id in existing[:-max_files] if max_files > 0 else []:
+        for suffix in (".folded", ".meta"):
+            path = os.path.join(directory, old_id + suffix)
+            if os.path.exists(path):
+                os.remove(path)
+    return profile_id
+
+
+def read_meta(directory, profile_id):
+    meta = {"id": profile_id}
+    path = os.path.join(directory, f"{profile_id}.meta")
+    if os.path.exists(path):
+        with open(path) as f:
+            meta.update(line.rstrip("\n").split("=", 1) for line in f if "=" in line)
+    for key, cast in (("duration_seconds", float), ("samples", int), ("interval_seconds", float)):
+        if key in meta:
+            meta[key] = cast(meta[key])
+    return meta
+
+
+def list_profiles(directory):
+    """
+    Returns the metadata of every stored profile, newest first.
+    """
+    if not os.path.isdir(directory):
+        return []
+    ids = sorted((name[:-len(".folded")] for name in os.listdir(directory) if name.endswith(".folded")), reverse=True)
+    return [read_meta(directory, profile_id) for profile_id in ids]
+
+
+def profile_path(directory, profile_id):
+    """
+    Returns the folded-stack file of a profile, or None for an unknown or
+    malformed id (ids are validated so they can't escape `directory`).
+    """
+    if not PROFILE_ID_PATTERN.match(profile_id):
+        return None
+    path = os.path.join(directory, f"{profile_id}.folded")
+    return path if os.path.exists(path) else None
@@ -0,0 +1,117 @@
+"""
+Exponentially time-decayed user profiles.
+
+A profile is a sparse TF-IDF space vector that is updated in place on every
+watch event: the stored vector is rescaled by the decay since its last update
+and the new movie's row is added. Cost per event depends only on the number of
+terms involved, never on how long the user's history is.
+"""
+
+import io
+from datetime import datetime
+
+import numpy as np
+import scipy.sparse as sp
+
+# Terms whose weight falls below this fraction of the largest one are dropped,
+# which keeps long-lived profiles from accumulating negligible entries.
+PRUNE_RATIO = 1e-3
+
+
+def empty_profile(n_features):
+    return {
+        "vector": sp.csr_matrix((1, n_features), dtype=np.float64),
+        "updated_at": None,
+        "events": 0,
+    }
+
+
+def decay_factor(elapsed_seconds, half_life_days):
+    if half_life_days <= 0:
+        return 1.0
+    return 0.5 ** (max(elapsed_seconds, 0.0) / (half_life_days * 86400.0))
+
+
+def add_watch_event(profile, movie_vector, watched_at, half_life_days=90.0, max_events=200):
+    """
+    Folds one watch event into the profile in O(terms).
+
+    Parameters:
+        profile (dict): Profile to update, modified in place and returned.
+        movie_vector (sparse matrix): 1xV TF-IDF row of the watched movie.
+        watched_at (datetime): Time of the event.
+        half_life_days (float): Time after which an event counts half as much.
+        max_events (int): Cap on effective history length. Every new event also
+            scales older ones by (1 - 1/max_events), so the total weight of the
+            history never exceeds that of `max_events` fresh watches.
+    """
+    step = 1.0 - 1.0 / max_events if max_events > 0 else 1.0
+    updated_at = profile["updated_at"]
+
+    if updated_at is None or watched_at >= updated_at:
+        elapsed = (watched_at - updated_at).total_seconds() if updated_at else 0.0
+        vector = profile["vector"] * (decay_factor(elapsed, half_life_days) * step) + movie_vector
+        profile["updated_at"] = watched_at
+    else:
+        # Late event: age it relative to the profile instead of rescaling history
+        elapsed = (updated_at - watched_at).total_seconds()
+        vector = profile["vector"] + movie_vector * decay_factor(elapsed, half_life_days)
+
+    vector = sp.csr_matrix(vector)
+    if vector.nnz:
+        vector.data[vector.data < vector.data.max() * PRUNE_RATIO] = 0.0
+        vector.eliminate_zeros()
+    profile["vector"] = vector
+    profile["events"] += 1
+    return profile
+
+
+def build_profile(events, n_features, half_life_days=90.0, max_events=200):
+    """
+    Builds a profile from scratch out of (movie_vector, watched_at) pairs, in
+    chronological order. Only used to backfill users who predate stored profiles.
+    """
+    profile = empty_profile(n_features)
+    for movie_vector, watched_at in events:
+        add_watch_event(profile, movie_vector, watched_at, half_life_days, max_events)
+    return profile
+
+
+def profile_vector(profile):
+    """
+    Dense 1-D vector for scoring. A uniform decay since the last event does not
+    change cosine similarity, so the stored vector can be used as is.
+    """
+    if profile is None or profile["vector"].nnz == 0:
+        return None
+    return profile["vector"].toarray().ravel()
+
+
+def serialize_profile(profile, vocabulary=""):
+    """
+    `vocabulary` identifies the TF-IDF vocabulary the term indices refer to
+    (see catalog.vocabulary_id), so a profile can be rebuilt after a refit.
+    """
+    buffer = io.BytesIO()
+    vector = profile["vector"]
+    np.savez(
+        buffer,
+        indices=vector.indices.astype(np.int32),
+        data=vector.data.astype(np.float32),
+        events=np.int64(profile["events"]),
+        vocabulary=np.str_(vocabulary),
+    )
+    return buffer.getvalue()
+
+
+def deserialize_profile(blob, n_features, updated_at):
+    arrays = np.load(io.BytesIO(blob))
+    indices, data = arrays["indices"], arrays["data"].astype(np.float64)
+    vocabulary = str(arrays["vocabulary"]) if "vocabulary" in arrays.files else None
+    if len(indices) and indices.max() >= n_features:
+        # Built against a larger vocabulary, only usable after a rebuild
+        indices, data, vocabulary = indices[:0], data[:0], None
+    vector = sp.csr_matrix((data, indices, [0, len(indices)]), shape=(1, n_features))
+    if isinstance(updated_at, str):
+        updated_at = datetime.fromisoformat(updated_at)
+    return {"vector": vector, "updated_at": updated_at, "events": int(arrays["events"]), "vocabulary": vocabulary}
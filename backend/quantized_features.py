@@ -0,0 +1,222 @@
+"""
+Reduced-precision storage for the TF-IDF matrix and content similarities.
+
+A fitted TF-IDF matrix is float64 CSR: 8 bytes per weight plus a 4-byte
+column index. Each serving process holds one per catalog version, so
+FEATURE_PRECISION (see catalog.py) or `build_artifacts.py --precision` can
+store the weights with less precision:
+
+    float64   as fitted (the default)                      12 bytes / weight
+    float32   weights cast to float32                       8 bytes / weight
+    int8      `QuantizedMatrix`: int8 codes with one         5 bytes / weight
+              float32 scale per row, w = code * scale,
+              scale = max |w| of the row / 127
+
+The kernels below (`dot`, `cosine_to`, `product`, `mean_rows`) take the
+stored matrix as it is. float32 matrices are multiplied in float32 (the
+query is cast rather than the matrix), and int8 codes are widened to float32
+one block of rows at a time, so no full-precision copy of the catalog is
+ever made. Only small row selections are dequantized outright (`dequantize`).
+
+TF-IDF rows are L2-normalized, so the dot product with a profile divided by
+the profile's norm is their cosine similarity. benchmarks/bench_precision.py
+reports the memory saved and the top-k overlap with full precision.
+"""
+
+import numpy as np
+import scipy.sparse as sp
+
+PRECISIONS = ("float64", "float32", "int8")
+
+# Rows widened to float32 at a time by the int8 kernels
+BLOCK_ROWS = 8192
+
+# How far a stored score may be off the full-precision one, per precision
+SCORE_TOLERANCE = {"float64": 1e-6, "float32": 1e-5, "int8": 2e-2}
+
+
+class QuantizedMatrix:
+    """
+    int8 codes (CSR or dense) with one float32 scale per row. Row selection
+    works as on the codes; products go through the kernels of this module.
+    """
+
+    def __init__(self, codes, scales):
+        self.codes = codes
+        self.scales = scales
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    @property
+    def nnz(self):
+        return self.codes.nnz if sp.issparse(self.codes) else self.codes.size
+
+    def __getitem__(self, rows):
+        if np.isscalar(rows):
+            rows = [rows]
+        return QuantizedMatrix(self.codes[rows], self.scales[rows])
+
+
+def precision_of(matrix):
+    if isinstance(matrix, QuantizedMatrix):
+        return "int8"
+    return "float32" if matrix.dtype == np.float32 else "float64"
+
+
+def _row_max(matrix):
+    if sp.issparse(matrix):
+        return abs(matrix).max(axis=1).toarray().ravel()
+    return np.abs(matrix).max(axis=1)
+
+
+def quantize(matrix, precision):
+    """
+    Returns `matrix` (float CSR or dense) stored with `precision`, one of
+    PRECISIONS. Already quantized matrices are returned as they are.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"unknown feature precision {precision!r}, expected one of {PRECISIONS}")
+    if isinstance(matrix, QuantizedMatrix) or precision == precision_of(matrix):
+        return matrix
+    if precision != "int8":
+        return matrix.astype(np.float64 if precision == "float64" else np.float32)
+
+    scales = (_row_max(matrix) / 127).astype(np.float32)
+    inverse = np.divide(1.0, scales, out=np.zeros(len(scales)), where=scales > 0)
+    if sp.issparse(matrix):
+        matrix = sp.csr_matrix(matrix)
+        codes = matrix.copy()
+        codes.data = np.rint(matrix.data * np.repeat(inverse, np.diff(matrix.indptr))).astype(np.int8)
+    else:
+        # Block by block, so a dense N x N matrix is never copied at full precision
+        codes = np.empty(matrix.shape, dtype=np.int8)
+        for start in range(0, len(codes), BLOCK_ROWS):
+            rows = slice(start, start + BLOCK_ROWS)
+            codes[rows] = np.rint(matrix[rows] * inverse[rows, None])
+    return QuantizedMatrix(codes, scales)
+
+
+def dequantize(matrix):
+    """
+    float64 copy of `matrix`, meant for small row selections.
+    """
+    if not isinstance(matrix, QuantizedMatrix):
+        return matrix.astype(np.float64)
+    if sp.issparse(matrix.codes):
+        return sp.diags(matrix.scales.astype(np.float64)) @ matrix.codes.astype(np.float64)
+    return matrix.codes * matrix.scales[:, None].astype(np.float64)
+
+
+def stack_rows(top, bottom):
+    """
+    Rows of `top` followed by the float rows `bottom`, stored like `top`.
+    """
+    bottom = quantize(bottom, precision_of(top))
+    if isinstance(top, QuantizedMatrix):
+        return QuantizedMatrix(sp.vstack([top.codes, bottom.codes], format='csr'),
+                               np.concatenate([top.scales, bottom.scales]))
+    return sp.vstack([top, bottom], format='csr')
+
+
+def nbytes(matrix):
+    """
+    Bytes held by the stored weights, indices and scales.
+    """
+    if isinstance(matrix, QuantizedMatrix):
+        return nbytes(matrix.codes) + matrix.scales.nbytes
+    if sp.issparse(matrix):
+        return matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+    return matrix.nbytes
+
+
+def _blocks(matrix):
+    """
+    Yields (rows, float32 codes, scales) of a QuantizedMatrix, BLOCK_ROWS at
+    a time. Products of the codes are scaled per row afterwards.
+    """
+    codes, n_rows = matrix.codes, matrix.shape[0]
+    for start in range(0, n_rows, BLOCK_ROWS):
+        stop = min(start + BLOCK_ROWS, n_rows)
+        rows = slice(start, stop)
+        if sp.issparse(codes):
+            # Only the weights are copied; the block shares the column indices
+            first, last = codes.indptr[start], codes.indptr[stop]
+            block = sp.csr_matrix(
+                (codes.data[first:last].astype(np.float32), codes.indices[first:last],
+                 codes.indptr[start:stop + 1] - first),
+                shape=(stop - start, codes.shape[1])
+            )
+        else:
+            block = codes[rows].astype(np.float32)
+        yield rows, block, matrix.scales[rows]
+
+
+def dot(matrix, vector):
+    """
+    Dot product of every row of `matrix` with the dense `vector`, as float64.
+    """
+    if isinstance(matrix, QuantizedMatrix):
+        vector = np.asarray(vector, dtype=np.float32)
+        scores = np.empty(matrix.shape[0])
+        for rows, block, scales in _blocks(matrix):
+            scores[rows] = (block @ vector) * scales
+        return scores
+    return np.asarray(matrix @ np.asarray(vector, dtype=matrix.dtype), dtype=np.float64).ravel()
+
+
+def cosine_to(matrix, vector):
+    """
+    Cosine similarity of every (unit length or empty) row of `matrix` to the
+    dense `vector`; zeros for an empty vector.
+    """
+    norm = np.linalg.norm(vector)
+    return dot(matrix, vector) / norm if norm else np.zeros(matrix.shape[0])
+
+
+def product(matrix, other):
+    """
+    Dense float64 (rows x columns) product of `matrix` with the float sparse
+    or dense matrix `other`.
+    """
+    def dense(result):
+        return np.asarray(result.toarray() if sp.issparse(result) else result, dtype=np.float64)
+
+    if isinstance(matrix, QuantizedMatrix):
+        other = other.astype(np.float32)
+        scores = np.empty((matrix.shape[0], other.shape[1]))
+        for rows, block, scales in _blocks(matrix):
+            scores[rows] = dense(block @ other) * scales[:, None]
+        return scores
+    return dense(matrix @ other.astype(matrix.dtype))
+
+
+def mean_rows(matrix, rows):
+    """
+    Mean of the given rows of `matrix` as a dense float64 vector.
+    """
+    return np.asarray(dequantize(matrix[rows]).mean(axis=0)).ravel()
+
+
+def weighted_rows(weights, matrix):
+    """
+    `weights @ matrix` as float64 CSR, for a sparse `weights` matrix that
+    only touches a few rows (the averaging matrix of blend profiles).
+    """
+    weights = sp.csc_matrix(weights)
+    used = np.flatnonzero(np.diff(weights.indptr))
+    return sp.csr_matrix(weights[:, used] @ dequantize(matrix[used]))
+
+
+def columns(matrix):
+    """
+    Returns (CSC matrix of the stored weights with sorted indices, per-row
+    scales or None): the postings of text_index.TextIndex.
+    """
+    if isinstance(matrix, QuantizedMatrix):
+        postings, scales = sp.csc_matrix(matrix.codes), matrix.scales
+    else:
+        postings, scales = matrix.tocsc(), None
+    postings.sort_indices()
+    return postings, scales
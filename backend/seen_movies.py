@@ -0,0 +1,62 @@
+"""
+Per-user "already seen" bitsets for excluding movies from recommendations.
+
+Recommenders used to drop watched movies by lowercasing every catalog title
+and matching it against the history titles, which also drops every other
+movie that shares a watched title (remakes, re-releases). Instead each user
+keeps one bit per catalog position, resolved from the movie ids of their
+rows:
+
+    history      set on every watch
+    watchlist    set when a movie is added to a watchlist, rebuilt on
+                 removals (a movie may sit in several watchlists)
+
+A ranking then drops seen candidates with one vectorized bit test. Catalog
+positions stay valid across catalog versions (rows are only appended or
+replaced in place, see catalog.py), so a stored bitset only needs padding
+when the catalog grows.
+
+Bitsets are np.packbits arrays: bit i is the high-order-first bit i % 8 of
+byte i // 8.
+"""
+
+import numpy as np
+
+
+def empty_bits(n_movies):
+    return np.zeros((n_movies + 7) // 8, dtype=np.uint8)
+
+
+def add_positions(bits, positions):
+    positions = np.asarray(positions, dtype=np.int64)
+    np.bitwise_or.at(bits, positions >> 3, (0x80 >> (positions & 7)).astype(np.uint8))
+    return bits
+
+
+def build_bits(positions, n_movies):
+    return add_positions(empty_bits(n_movies), positions)
+
+
+def contains(bits, positions):
+    """
+    Boolean array: whether each of `positions` is set in `bits`.
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    return ((bits[positions >> 3] >> (7 - (positions & 7))) & 1).astype(bool)
+
+
+def count(bits):
+    return int(np.unpackbits(bits).sum())
+
+
+def from_bytes(blob, n_movies):
+    """
+    A stored bitset sized for a catalog of `n_movies`, or None when it was
+    built for a larger catalog (and so for another catalog altogether).
+    """
+    stored = np.frombuffer(blob or b"", dtype=np.uint8)
+    bits = empty_bits(n_movies)
+    if len(stored) > len(bits):
+        return None
+    bits[:len(stored)] = stored
+    return bits
@@ -0,0 +1,98 @@
+"""
+Single-flight execution of identical concurrent computations.
+
+When several requests need the same result at the same time (members opening
+a freshly shared blend, mood recommendations for users without history), the
+first one starts the computation and the others wait for it instead of
+starting their own. Nothing is kept once the computation finishes; caching
+results is up to the caller.
+
+Keys are canonical fingerprints of everything the result depends on, see
+`fingerprint`.
+"""
+
+import asyncio
+import hashlib
+
+import numpy as np
+
+import metrics
+
+SINGLEFLIGHT_CALLS = metrics.counter(
+    "singleflight_calls_total",
+    "Calls by group and whether they started a computation (leader) or joined one already running (shared).",
+    ("group", "result"),
+)
+
+
+class SingleFlight:
+    """
+    Runs at most one computation per key at a time. Must only be used from the
+    event loop thread.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._inflight = {}
+
+    def in_flight(self, key):
+        return key in self._inflight
+
+    async def do(self, key, compute):
+        """
+        Awaits `compute()` (a coroutine function), or the run of it that is
+        already in flight for `key`. The computation runs as its own task, so
+        it isn't cancelled when the caller that started it goes away while
+        others still wait for it.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            SINGLEFLIGHT_CALLS.inc(group=self.name, result="leader")
+            task = asyncio.ensure_future(compute())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            SINGLEFLIGHT_CALLS.inc(group=self.name, result="shared")
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark as retrieved even if every caller went away
+
+
+def _feed(digest, value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        digest.update(f"{type(value).__name__}:{value!r};".encode("utf-8"))
+    elif isinstance(value, bytes):
+        digest.update(b"bytes:%d;" % len(value) + value)
+    elif isinstance(value, np.ndarray):
+        digest.update(f"ndarray:{value.dtype.str}:{value.shape};".encode("utf-8"))
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, np.generic):
+        _feed(digest, value.item())
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"seq:{len(value)}[".encode("utf-8"))
+        for item in value:
+            _feed(digest, item)
+        digest.update(b"]")
+    elif isinstance(value, dict):
+        digest.update(f"dict:{len(value)}{{".encode("utf-8"))
+        for k in sorted(value, key=repr):
+            _feed(digest, k)
+            _feed(digest, value[k])
+        digest.update(b"}")
+    else:
+        raise TypeError(f"Cannot fingerprint {type(value).__name__}")
+
+
+def fingerprint(*parts):
+    """
+    Canonical digest of request parameters: None, numbers, strings, bytes,
+    NumPy arrays and (nested) lists, tuples and dicts. Dicts are order-
+    independent, lists and tuples are not.
+    """
+    digest = hashlib.sha1()
+    _feed(digest, parts)
+    return digest.hexdigest()
@@ -0,0 +1,110 @@
+"""
+Inverted index for descriptive (free text) queries.
+
+A descriptive query has a handful of terms, but scoring it with a dense
+cosine similarity touches every movie. This index keeps the TF-IDF matrix
+column-major, so each term's postings (movies containing it, with weights)
+are one slice, plus postings for the keyword and genre boosts. A query then
+runs max-score style:
+
+    essential lists     postings of the query terms and of the boosted
+                        keywords / genres: every movie in them is scored
+                        exactly, which sets the top-k threshold
+    non-essential part  the query-independent profile and rating terms,
+                        bounded per movie by  beta * max profile similarity
+                        + gamma * rating. Only movies whose bound reaches the
+                        threshold (found by binary search on the ratings) are
+                        scored; the rest can't make the top k
+
+so the work scales with the postings of the query terms rather than with the
+catalog size. Requires non-negative weights, which all callers use.
+
+TF-IDF rows are L2-normalized, so a dot product with a normalized query is
+the cosine similarity. Postings keep the catalog's stored precision (see
+quantized_features.py); int8 weights are scaled per movie as they are summed.
+"""
+
+import numpy as np
+
+import quantized_features
+
+
+class TextIndex:
+    """
+    Postings and score bounds of one catalog version.
+    """
+
+    def __init__(self, movies, tfidf_matrix, ratings):
+        self.n_movies = tfidf_matrix.shape[0]
+        self.postings, self.row_scales = quantized_features.columns(tfidf_matrix)
+        # Highest weight of each term in any movie, bounding profile similarities
+        self.term_max = self.weights(self.postings).max(axis=0).toarray().ravel()
+
+        self.keyword_postings = self._postings(
+            {kw.strip().lower() for kw in keywords.split(',')} if isinstance(keywords, str) else ()
+            for keywords in movies['Keywords']
+        )
+        self.genre_postings = self._postings(
+            {g.lower() for g in genres} if isinstance(genres, list) else ()
+            for genres in movies['Genres']
+        )
+
+        self.ratings = np.asarray(ratings, dtype=float)
+        self.rating_order = np.argsort(self.ratings, kind='stable')
+        self.sorted_ratings = self.ratings[self.rating_order]
+
+    @staticmethod
+    def _postings(values_per_movie):
+        rows = {}
+        for i, values in enumerate(values_per_movie):
+            for value in values:
+                rows.setdefault(value, []).append(i)
+        return {value: np.array(docs) for value, docs in rows.items()}
+
+    def weights(self, columns):
+        """
+        Float weights of a CSC selection of the postings.
+        """
+        if self.row_scales is None:
+            return columns
+        scaled = columns.astype(np.float32)
+        scaled.data *= self.row_scales[scaled.indices]
+        return scaled
+
+    def text_scores(self, query_vector):
+        """
+        Returns (movies, scores): the movies containing any term of the
+        sparse 1xV `query_vector` and their dot product with it.
+        """
+        terms, weights = query_vector.indices, query_vector.data
+        if len(terms) == 0:
+            return np.array([], dtype=np.int64), np.array([])
+        columns = self.weights(self.postings[:, terms])
+        contributions = columns.data * np.repeat(weights, np.diff(columns.indptr))
+        docs, slots = np.unique(columns.indices, return_inverse=True)
+        return docs, np.bincount(slots, weights=contributions, minlength=len(docs))
+
+    def matching(self, postings, values):
+        docs = [postings[v] for v in values if v in postings]
+        return np.unique(np.concatenate(docs)) if docs else np.array([], dtype=np.int64)
+
+    def keyword_matches(self, query_keywords):
+        return self.matching(self.keyword_postings, query_keywords)
+
+    def genre_matches(self, query_keywords):
+        return self.matching(self.genre_postings, query_keywords)
+
+    def profile_bound(self, profile_unit):
+        """
+        Upper bound of the cosine similarity of any movie to a unit-length
+        dense profile.
+        """
+        if profile_unit is None:
+            return 0.0
+        return min(1.0, float(np.dot(profile_unit, self.term_max)))
+
+    def rated_at_least(self, rating):
+        """
+        Movies with a rating of at least `rating`.
+        """
+        return self.rating_order[np.searchsorted(self.sorted_ratings, rating, side='left'):]
@@ -0,0 +1,106 @@
+"""
+Voice input: recording from the microphone and Whisper transcription.
+
+Whisper (and torch with it) and PyAudio are heavy imports that only voice
+search needs, and PyAudio fails to import on hosts without PortAudio. They
+are imported on first use here rather than by model.py, so processes serving
+only the other routes never load them, and this module itself imports as
+cheaply as the rest of the backend:
+
+    whisper   on the first transcription (`get_whisper_model`)
+    pyaudio   only by `record_until_enter`, the command line recorder
+
+main.py can also run transcriptions in a dedicated process pool
+(VOICE_WORKERS); the API process then never imports Whisper at all.
+`transcribe_voice` only takes picklable arguments (a file path or a sample
+array) for that reason. Transcripts go back to the recommenders of model.py,
+which are imported lazily too so that pool workers don't build a catalog.
+"""
+
+import importlib.util
+import os
+import threading
+import wave
+
+import metrics
+
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "medium")
+_whisper_model = None
+_whisper_lock = threading.Lock()
+
+
+def available():
+    """
+    Whether Whisper is installed, without importing it.
+    """
+    return importlib.util.find_spec("whisper") is not None
+
+
+def record_until_enter(output_filename="output.wav", sample_rate=44100, channels=1):
+    import pyaudio
+
+    chunk_size = 1024
+    audio_format = pyaudio.paInt16
+    frames = []
+    recording = True
+
+    def record_thread():
+        nonlocal recording
+        p = pyaudio.PyAudio()
+        stream = p.open(format=audio_format,
+                        channels=channels,
+                        rate=sample_rate,
+                        input=True,
+                        frames_per_buffer=chunk_size)
+        print("Recording... Press Enter to stop.")
+        while recording:
+            data = stream.read(chunk_size)
+            frames.append(data)
+        stream.stop_stream()
+        stream.close()
+        p.terminate()
+
+    t = threading.Thread(target=record_thread)
+    t.start()
+    input()  # Wait for Enter key
+    recording = False
+    t.join()
+
+    wf = wave.open(output_filename, 'wb')
+    wf.setnchannels(channels)
+    wf.setsampwidth(pyaudio.PyAudio().get_sample_size(audio_format))
+    wf.setframerate(sample_rate)
+    wf.writeframes(b''.join(frames))
+    wf.close()
+    print("Recording stopped and saved to", output_filename)
+
+
+def get_whisper_model():
+    """
+    Imports Whisper and loads the model on first use, and keeps it for later
+    requests. Also the initializer of main's voice worker processes.
+    """
+    global _whisper_model
+    with _whisper_lock:
+        if _whisper_model is None:
+            with metrics.timer("whisper_load"):
+                import whisper
+                _whisper_model = whisper.load_model(WHISPER_MODEL)
+    return _whisper_model
+
+
+def transcribe_voice(audio):
+    """
+    Transcribes an audio file path, or a float32 array of 16 kHz mono samples.
+    """
+    model = get_whisper_model()
+    with metrics.timer("whisper_inference"):
+        result = model.transcribe(audio)
+    return result['text']
+
+
+def handle_voice_search(audio_path, user_history_titles=None, top_n=5, profile_vector=None):
+    import model
+
+    user_query = transcribe_voice(audio_path)
+    return model.recommend_for_query(user_query, user_history_titles, top_n, profile_vector)
@@ -0,0 +1,93 @@
+"""
+Caches for voice search.
+
+Short phrases ("something happy", "like Inception") come up again and again,
+so voice results are cached in two layers:
+
+    transcripts        sha256 of the audio -> transcript            (skips Whisper)
+    recommendations    normalized transcript, profile version,
+                       top_n, catalog version -> recommendations    (skips scoring)
+
+Both are LRU caches bounded by entry count. Concurrent lookups of a key that
+is still being computed wait for that computation instead of starting their
+own (see singleflight.py).
+"""
+
+import hashlib
+import re
+from collections import OrderedDict
+
+import numpy as np
+
+import metrics
+from singleflight import SingleFlight
+
+
+class CoalescingLRUCache:
+    """
+    LRU cache of results of async computations. Must only be used from the
+    event loop thread.
+    """
+
+    def __init__(self, name, max_entries):
+        self.name = name
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._flight = SingleFlight(name)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_compute(self, key, compute):
+        """
+        Returns the cached value for `key`, or awaits `compute()` (a coroutine
+        function) to produce it. Failures are not cached.
+        """
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            metrics.cache_lookup(self.name, True)
+            return self._entries[key]
+        if self._flight.in_flight(key):
+            metrics.cache_coalesced(self.name)
+        else:
+            metrics.cache_lookup(self.name, False)
+
+        async def compute_and_store():
+            value = await compute()
+            self.put(key, value)
+            return value
+
+        return await self._flight.do(key, compute_and_store)
+
+
+def audio_key(audio_bytes):
+    return hashlib.sha256(audio_bytes).hexdigest()
+
+
+def normalize_transcript(transcript):
+    """
+    Lowercases and collapses whitespace, and strips surrounding punctuation
+    ("Something happy." and "something happy" are the same query). Inner
+    punctuation is kept, as movie titles contain it.
+    """
+    return re.sub(r"\s+", " ", transcript.lower()).strip(" .,!?;:\"'")
+
+
+def profile_version(user_history_titles, profile_vector, seen=None):
+    """
+    Digest of everything about the user that voice recommendations depend on.
+    """
+    digest = hashlib.sha1("\n".join(user_history_titles or []).encode("utf-8"))
+    if profile_vector is not None:
+        digest.update(np.ascontiguousarray(profile_vector, dtype=np.float64).tobytes())
+    if seen is not None:
+        digest.update(b"seen:" + seen.tobytes())
+    return digest.hexdigest()
@@ -0,0 +1,74 @@
+"""
+Incremental transcription of streamed voice queries.
+
+The client streams raw 16 kHz mono PCM16 (little-endian) audio in chunks of
+any size. The audio is kept in memory and re-transcribed whenever enough new
+audio has arrived: Whisper pads every input to a 30 second window, so
+transcribing the whole (short) query so far costs about the same as
+transcribing only the new part, and keeps words that straddle chunks intact.
+
+Each partial transcript is checked for a mood or a reference movie title, so
+recommendations can be sent as soon as one is spoken instead of after the
+upload finishes.
+"""
+
+import numpy as np
+
+SAMPLE_RATE = 16000  # what Whisper expects
+BYTES_PER_SAMPLE = 2
+
+
+class VoiceStream:
+    """
+    Audio buffer and partial-transcript state of one streamed voice query.
+    """
+
+    def __init__(self, interval_seconds=1.0, max_seconds=60.0):
+        self.interval_bytes = int(interval_seconds * SAMPLE_RATE) * BYTES_PER_SAMPLE
+        self.max_bytes = int(max_seconds * SAMPLE_RATE) * BYTES_PER_SAMPLE
+        self.buffer = bytearray()
+        self.transcribed_bytes = 0
+        self.transcript = ""
+        self.cues = (None, None)
+
+    @property
+    def seconds(self):
+        return len(self.buffer) / (SAMPLE_RATE * BYTES_PER_SAMPLE)
+
+    def add_chunk(self, data):
+        """
+        Appends a chunk of PCM16 audio. Raises ValueError once the query gets
+        longer than `max_seconds`.
+        """
+        if len(self.buffer) + len(data) > self.max_bytes:
+            raise ValueError(f"Voice query longer than {self.max_bytes / (SAMPLE_RATE * BYTES_PER_SAMPLE):g}s")
+        self.buffer.extend(data)
+
+    def untranscribed_bytes(self):
+        return len(self.buffer) - self.transcribed_bytes
+
+    def transcription_due(self):
+        return self.untranscribed_bytes() >= self.interval_bytes
+
+    def audio(self):
+        """
+        Returns the audio so far as float32 samples in [-1, 1], as Whisper takes them.
+        A trailing odd byte (half a sample) is left out until the rest arrives.
+        """
+        usable = len(self.buffer) - len(self.buffer) % BYTES_PER_SAMPLE
+        self.transcribed_bytes = usable
+        samples = np.frombuffer(bytes(self.buffer[:usable]), dtype='<i2')
+        return samples.astype(np.float32) / 32768.0
+
+    def update(self, transcript, cues):
+        """
+        Records a new transcript and its (mood, reference title) cues.
+
+        Returns:
+            bool: True if a cue was found that differs from the last one seen.
+        """
+        self.transcript = transcript
+        changed = any(cues) and cues != self.cues
+        if any(cues):
+            self.cues = cues
+        return changed